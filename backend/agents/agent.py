@@ -3,8 +3,8 @@ This file is the entry point for all agents.
 It imports all sub-agents and makes them available for use.
 """
 
-import os
-import subprocess
+import asyncio
+import threading
 import json
 from pathlib import Path
 from typing import Optional
@@ -13,18 +13,19 @@ from google.adk import Agent
 from google.adk.tools import FunctionTool
 from .sub_agents.time.agent import currentTimeAgent
 from .sub_agents.nano_banana.agent import nanoBananaAgent
+from .sub_agents.video_analysis.agent import videoAnalysisAgent, start_video_analysis_tool
+from . import inference
 
 # Get the project root directory (gemini3-hackhaton-sf)
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 UPLOADS_DIR = PROJECT_ROOT / "uploads"
-INFERENCE_SCRIPT = PROJECT_ROOT / "backend/agents/inference.py"
 
 
-def run_video_inference(video_filename: str) -> dict:
+async def run_video_inference(video_filename: str) -> dict:
     """Run the video inference analysis on an uploaded video file.
     
-    This tool executes the inference.py script to analyze a football play video
-    and predict the most likely plays based on pre-snap formations.
+    This tool runs the inference pipeline on a football play video and
+    predicts the most likely plays based on pre-snap formations.
     
     Args:
         video_filename: The filename of the uploaded video to analyze 
@@ -47,87 +48,24 @@ def run_video_inference(video_filename: str) -> dict:
             "message": f"Video file not found: {video_filename}",
             "searched_path": str(video_path)
         })
-    
-    if not INFERENCE_SCRIPT.exists():
+
+    # Same single-flight as /analyze: concurrent requests for the same clip share one run.
+    # If this invocation is cancelled we stop waiting; the run is cancelled once no caller is left.
+    abandon = threading.Event()
+    try:
+        combined = await asyncio.to_thread(inference.analyze_video, str(video_path), abandon)
+    except asyncio.CancelledError:
+        abandon.set()
+        raise
+    except inference.DeadlineExceeded:
         return json.dumps({
-            "status": "error", 
-            "message": f"Inference script not found at: {INFERENCE_SCRIPT}"
+            "status": "error",
+            "message": f"Inference timed out after {inference.ANALYSIS_DEADLINE_SEC:g} seconds"
         })
-    
-    try:
-        # Run the inference script
-        import sys
-        result = subprocess.run(
-            [sys.executable, str(INFERENCE_SCRIPT), str(video_path)],
-            capture_output=True,
-            text=True,
-            cwd=str(PROJECT_ROOT),
-            timeout=300,  # 5 minute timeout
-            env={**os.environ, "PYTHONUNBUFFERED": "1"}
-        )
-        
-        if result.returncode != 0:
-            return json.dumps({
-                "status": "error",
-                "message": "Inference script failed",
-                "stderr": result.stderr[:1000] if result.stderr else None,
-                "stdout": result.stdout[:1000] if result.stdout else None
-            })
-        
-        # Find the most recent output directory for this video
-        output_dir = PROJECT_ROOT / "backend" / "inference_outputs"
-        video_stem = video_path.stem
-        
-        # Find matching output directories
-        matching_dirs = sorted(
-            [d for d in output_dir.iterdir() if d.is_dir() and video_stem in d.name],
-            key=lambda x: x.stat().st_mtime,
-            reverse=True
-        )
-        
-        if not matching_dirs:
-            return json.dumps({
-                "status": "error",
-                "message": "No output directory found after inference",
-                "stdout": result.stdout[-500:] if result.stdout else None
-            })
-        
-        latest_output = matching_dirs[0]
-        
-        # Read the combined results
-        combined_file = latest_output / "combined_run.json"
-        if combined_file.exists():
-            with open(combined_file, 'r') as f:
-                combined_data = json.load(f)
-            
-            return json.dumps({
-                "status": "success",
-                "final_paragraph": combined_data.get("final_paragraph", ""),
-                "offense_defense": combined_data.get("stage1_offense_defense", {}),
-                "motion_detected": combined_data.get("stage2_motion_cv", {}).get("motion_detected", False),
-                "motion_timing": combined_data.get("stage2_motion_cv", {}).get("timing_guess", "unknown"),
-                "output_directory": str(latest_output)
-            })
-        else:
-            # Fallback: read the paragraph file directly
-            paragraph_file = latest_output / "final_paragraph.txt"
-            if paragraph_file.exists():
-                return json.dumps({
-                    "status": "success",
-                    "final_paragraph": paragraph_file.read_text(),
-                    "output_directory": str(latest_output)
-                })
-            else:
-                return json.dumps({
-                    "status": "error",
-                    "message": "Could not find output files",
-                    "output_directory": str(latest_output)
-                })
-                
-    except subprocess.TimeoutExpired:
+    except inference.AnalysisCancelled:
         return json.dumps({
             "status": "error",
-            "message": "Inference timed out after 5 minutes"
+            "message": "Inference cancelled"
         })
     except Exception as e:
         return json.dumps({
@@ -135,6 +73,16 @@ def run_video_inference(video_filename: str) -> dict:
             "message": f"Unexpected error: {str(e)}"
         })
 
+    meta = combined.get("meta", {})
+    return json.dumps({
+        "status": "success",
+        "final_paragraph": combined.get("final_paragraph", ""),
+        "offense_defense": combined.get("stage1_offense_defense", {}),
+        "motion_detected": combined.get("stage2_motion_cv", {}).get("motion_detected", False),
+        "motion_timing": combined.get("stage2_motion_cv", {}).get("timing_guess", "unknown"),
+        "output_directory": str(inference.run_output_dir(meta.get("video_name", video_path.stem), meta.get("run_id", "")))
+    })
+
 
 # Create the tools
 video_inference_tool = FunctionTool(func=run_video_inference)
@@ -162,12 +110,13 @@ root_agent = Agent(
 
 PIPELINE STEPS (MUST FOLLOW IN ORDER):
 1. Greet the user as "The Defensive CoordAInator" and request a play video.
-2. Once uploaded, run `run_video_inference` to get the technical analysis.
+2. Once uploaded, run `start_video_analysis` to stream the technical analysis to the coach.
+   If streaming is unavailable, fall back to `run_video_inference`.
 3. Present the analysis (formations, motion, predicted plays, insights).
 
 Be professional, concise, and ensure each step is completed before moving to the next.
 """,
-    sub_agents=[currentTimeAgent, nanoBananaAgent],
-    tools=[video_inference_tool, get_visuals_tool],
+    sub_agents=[currentTimeAgent, nanoBananaAgent, videoAnalysisAgent],
+    tools=[start_video_analysis_tool, video_inference_tool, get_visuals_tool],
     output_key="final_paragraph",
 )
\ No newline at end of file
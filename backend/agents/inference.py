@@ -1,21 +1,42 @@
+import io
 import os
 import sys
 import json
 import time
+import queue
 import random
+import uuid
+import hashlib
+import itertools
+import threading
 import subprocess
 import tempfile
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from datetime import datetime
-from typing import List, Dict, Any, Tuple
+from datetime import datetime, timezone
+from fractions import Fraction
+from typing import List, Dict, Any, Tuple, Iterator, Optional, Literal, Union
+from collections import Counter, deque
 
 import cv2
+import numpy as np
 import chromadb
 from chromadb.config import Settings
+from pydantic import BaseModel, Field, ValidationError
 
 from google import genai
 from google.genai import errors as genai_errors
+from google.genai import types
 
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional; spans are still written to combined_run.json
+    otel_trace = None
+
+try:
+    import av
+except ImportError:  # optional; video is then cut/decoded by ffmpeg subprocesses
+    av = None
 
 
 # ======================================================
@@ -26,23 +47,132 @@ FAST_MODEL = "gemini-2.5-flash-lite"
 FINAL_MODEL = "gemini-3-flash-preview"
 EMBED_MODEL = "text-embedding-004"
 
-# We will only send first 6 seconds to Gemini
+# Fixed clip window (used when the adaptive scan is off or finds no snap); caps the adaptive window's length
 CLIP_START_SEC = 0
 CLIP_DURATION_SEC = 6
 
+# Transcoding profile for the clip uploaded to Gemini, applied in the same ffmpeg pass as the cut.
+# The model samples video at a low fps internally, so source 1080p60 is mostly wasted bytes.
+# None = stream copy at source quality (old behavior). Compare with benchmarks/clip_profiles.py.
+TRANSCODE_PROFILES: Dict[str, Optional[Dict[str, Any]]] = {
+    "source": None,
+    "720p15": {"height": 720, "fps": 15, "codec": "libx264", "crf": 26, "maxrate": "2500k", "audio": False},
+    "720p10": {"height": 720, "fps": 10, "codec": "libx264", "crf": 28, "maxrate": "1500k", "audio": False},
+    "480p10": {"height": 480, "fps": 10, "codec": "libx264", "crf": 28, "maxrate": "800k", "audio": False},
+    "360p5": {"height": 360, "fps": 5, "codec": "libx264", "crf": 30, "maxrate": "400k", "audio": False},
+}
+# Default stays at source quality until clip_profiles.py shows a smaller profile keeps the answers
+CLIP_PROFILE = os.getenv("FIELDHOUSE_CLIP_PROFILE", "source")
+
+FRAME_JPEG_QUALITY = 95  # in-process decodes are encoded like ffmpeg -q:v 2 when uploaded
+
+# Video decoding: "ffmpeg" forks an ffmpeg process per operation; "pyav" (opt-in, needs the
+# optional `av` package from requirements-pyav.txt) demuxes/decodes in-process and falls back
+# to ffmpeg when a call fails.
+DECODE_BACKEND = os.getenv("FIELDHOUSE_DECODE_BACKEND", "ffmpeg")
+
 # Frame times within the clipped segment
 FRAME_TIMES_SEC = [0, 2, 4]
 
+# Adaptive clip window: scan the start of the upload for the set → snap phase
+# and send only that window (bounded by CLIP_DURATION_SEC) instead of 0-6s
+ADAPTIVE_WINDOW_ENABLED = os.getenv("FIELDHOUSE_ADAPTIVE_WINDOW", "1") != "0"
+ADAPTIVE_SCAN_SEC = 30
+ADAPTIVE_MIN_SEC = 3.0
+ADAPTIVE_PRE_SET_SEC = 0.5    # context kept before the offense gets set
+ADAPTIVE_POST_SNAP_SEC = 0.5  # a moment after the snap
+
+# Low-res scan used for window selection and live-feed segmentation
+SCAN_FPS = 5
+SCAN_SIZE = (320, 180)
+SET_MAX_RATIO = 0.01     # frame-to-frame motion below this counts as "set"
+SET_MIN_SEC = 1.0        # how long the offense must be set before a snap counts
+SNAP_MIN_RATIO = 0.035   # motion burst that ends the set phase
+FIELD_MIN_LINES = 4      # long straight lines (yard/hash lines) → field view, not crowd/graphics
+
 # CV motion thresholds
 MOTION_RATIO_THRESHOLD = 0.012
+MOTION_RATIO_GAP_SEC = 2.0  # pairwise ratios are reported per this gap (the 0/2/4s spacing)
 DIFF_THRESHOLD = 25
 BLUR_KERNEL = (7, 7)
+# Motion is scored on frames decoded at 1/N resolution (JPEG DCT scaling: 1, 2, 4 or 8).
+# 1 = legacy full-resolution path. Equivalence is checked in test_motion_fastpath.py.
+_motion_downsample = os.getenv("FIELDHOUSE_MOTION_DOWNSAMPLE", "2").strip()
+if _motion_downsample not in ("1", "2", "4", "8"):
+    raise ValueError(f"FIELDHOUSE_MOTION_DOWNSAMPLE must be 1, 2, 4 or 8 (JPEG DCT scale factors), "
+                     f"got {_motion_downsample!r}")
+MOTION_DOWNSAMPLE = int(_motion_downsample)
+
+# Sparse optical flow (Lucas-Kanade on tracked corners) summary of who moved where
+FLOW_ENABLED = os.getenv("FIELDHOUSE_OPTICAL_FLOW", "1") != "0"
+FLOW_WIDTH = 640                # corners are tracked on a pyramid level no wider than this
+FLOW_MAX_CORNERS = 300
+FLOW_MIN_DISP_FRAC = 0.006      # residual displacement (fraction of width) that counts as "moved"
+FLOW_FB_MAX_ERR_PX = 1.5        # forward-backward consistency check
+
+# Region-aware motion: undo camera pans (phase correlation) and ignore broadcast overlays
+REGION_MOTION_ENABLED = os.getenv("FIELDHOUSE_REGION_MOTION", "1") != "0"
+REGION_GRID = (3, 3)            # rows x cols of per-region ratios (top/mid/bottom x left/center/right)
+CAMERA_SHIFT_MIN_PX = 1.0       # smaller global shifts are left uncompensated
+CAMERA_MIN_RESPONSE = 0.1       # phase-correlation peak strength needed to trust a shift
+CAMERA_ESTIMATE_WIDTH = 320     # shift is estimated on a pyramid level no wider than this
+REGION_MOTION_WIDTH = 480       # compensated/masked ratios are computed on a pyramid level no wider than this
+OVERLAY_MIN_CLIPS = 8           # clips needed before a learned mask is trusted
+OVERLAY_MAX_STD = 6.0           # pixels this stable across different clips are overlay, not field
+OVERLAY_MAX_FRACTION = 0.15     # a "mask" bigger than this is the field itself; ignore it
+# Online learning rewrites overlay_model.npz on every run, so it is opt-in; learn_overlay_mask()
+# builds the model offline from a batch of frames instead.
+OVERLAY_LEARN_ENABLED = os.getenv("FIELDHOUSE_OVERLAY_LEARN", "0") == "1"
+
+# Tiered routing: accept the FAST_MODEL frame-level answer unless it is unsure
+CASCADE_ENABLED = os.getenv("FIELDHOUSE_CASCADE", "1") != "0"
+CASCADE_MIN_CONFIDENCE = float(os.getenv("FIELDHOUSE_CASCADE_MIN_CONFIDENCE", "0.75"))
+CASCADE_REQUIRE_RAG_AGREEMENT = os.getenv("FIELDHOUSE_CASCADE_REQUIRE_RAG_AGREEMENT", "1") != "0"  # top-1 must be a RAG candidate
+CASCADE_REQUIRE_KNOWN_SIDES = os.getenv("FIELDHOUSE_CASCADE_REQUIRE_KNOWN_SIDES", "1") != "0"      # escalate on unknown sides
 
 # Gemini retry/backoff
 MAX_API_RETRIES = 5
 BACKOFF_BASE_SEC = 0.6
 BACKOFF_MAX_SEC = 8.0
 
+# Per-model circuit breaker; an open breaker sends calls down the model's fallback chain
+MODEL_FALLBACKS = {
+    FINAL_MODEL: [m for m in os.getenv("FIELDHOUSE_FINAL_FALLBACKS", "gemini-2.5-flash").split(",") if m],
+    FAST_MODEL: [m for m in os.getenv("FIELDHOUSE_FAST_FALLBACKS", "gemini-2.5-flash").split(",") if m],
+}
+BREAKER_WINDOW = 20          # recent outcomes per model
+BREAKER_MIN_CALLS = 4        # don't judge a model on fewer samples than this
+BREAKER_FAILURE_RATE = 0.5   # share of 503s/timeouts in the window that opens the breaker
+BREAKER_OPEN_SEC = 30.0      # how long to stay open before letting one probe call through
+
+# Explicit context caching of the static system prompts
+CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE", "1") != "0"
+CONTEXT_CACHE_TTL_SEC = 3600
+CONTEXT_CACHE_REFRESH_MARGIN_SEC = 60
+CONTEXT_CACHE_RETRY_SEC = 600  # after a failed create (e.g. below min tokens), use plain prompts for a while
+
+# Per-stage tracing; spans always go into combined_run.json, OpenTelemetry export is opt-in
+TRACE_OTEL_ENABLED = os.getenv("FIELDHOUSE_OTEL", "0") != "0"
+
+# End-to-end deadline per analysis, and the most any single stage may take of what is left
+ANALYSIS_DEADLINE_SEC = float(os.getenv("FIELDHOUSE_DEADLINE_SEC", "240"))
+STAGE_BUDGET_SEC = {
+    "select_window": 30,
+    "cut": 45,
+    "extract_frames": 20,
+    "upload": 90,        # upload + ACTIVE polling, per file
+    "model_call": 60,    # per attempt, passed to the HTTP client as its timeout
+    "final_stream": 120,
+    "rag": 15,
+}
+CANCEL_POLL_SEC = 0.1  # how often blocking waits (ffmpeg, sleeps) look at the cancel flag
+
+# Stage-1 micro-batching: concurrent runs share one offense/defense request (batch scouting)
+STAGE1_BATCH_ENABLED = os.getenv("FIELDHOUSE_STAGE1_BATCH", "0") == "1"
+STAGE1_BATCH_WINDOW_SEC = float(os.getenv("FIELDHOUSE_STAGE1_BATCH_WINDOW_SEC", "0.25"))
+STAGE1_BATCH_MAX_ITEMS = int(os.getenv("FIELDHOUSE_STAGE1_BATCH_MAX", "8"))
+STAGE1_BATCH_MIN_REMAINING_SEC = 5.0  # runs with less time left make their own call instead of joining a batch
+
 # Upload ACTIVE polling (avoids FAILED_PRECONDITION)
 POLL_INTERVAL_SEC = 1.0
 MAX_WAIT_SEC = 90.0
@@ -54,6 +184,56 @@ OUTPUT_DIR = PROJECT_ROOT / "backend" / "inference_outputs"
 COLLECTION_NAME = "nfl_clips"
 TOP_K = 4
 
+# RAG ranking policy: "distance" keeps Chroma's nearest top_k; "mmr" over-fetches and picks
+# by maximal marginal relevance so near-duplicates (same drive) don't fill every slot
+RAG_RERANK = os.getenv("FIELDHOUSE_RAG_RERANK", "mmr")
+RAG_MMR_LAMBDA = float(os.getenv("FIELDHOUSE_RAG_MMR_LAMBDA", "0.6"))   # 1.0 = pure relevance
+RAG_FETCH_MULTIPLIER = int(os.getenv("FIELDHOUSE_RAG_FETCH_MULTIPLIER", "4"))
+
+# Learned broadcast-overlay model (see OverlayMaskLearner)
+OVERLAY_MASK_PATH = PROJECT_ROOT / "backend" / "overlay_model.npz"
+
+# Perceptual fingerprints: a re-encoded / re-captured copy of an analyzed play reuses its result
+FINGERPRINT_ENABLED = os.getenv("FIELDHOUSE_FINGERPRINT", "1") != "0"
+FINGERPRINT_MAX_BITS = int(os.getenv("FIELDHOUSE_FINGERPRINT_MAX_BITS", "6"))  # per 64-bit frame hash, worst frame
+FINGERPRINT_TTL_SEC = float(os.getenv("FIELDHOUSE_FINGERPRINT_TTL_SEC", str(7 * 24 * 3600)))  # stored results go stale
+FINGERPRINT_INDEX_PATH = PROJECT_ROOT / "backend" / "fingerprint_index.npz"
+
+# Example sources whose plays may confirm a cascade first pass: "text" is the curated Chroma
+# collection. "visual" (and written-back "run") examples carry the model's own past answers.
+RAG_VERIFIED_SOURCES = ("text",)
+
+# Visual RAG: frame-0 formation descriptors searched locally, merged with the Chroma text results
+VISUAL_RAG_ENABLED = os.getenv("FIELDHOUSE_VISUAL_RAG", "1") != "0"
+VISUAL_TOP_K = int(os.getenv("FIELDHOUSE_VISUAL_TOP_K", "2"))
+VISUAL_MIN_SIMILARITY = float(os.getenv("FIELDHOUSE_VISUAL_MIN_SIMILARITY", "0.7"))  # cosine; 1.0 = same layout
+VISUAL_INDEX_PATH = PROJECT_ROOT / "backend" / "visual_index.npz"
+FORMATION_WIDTH = 320           # descriptor is computed on a pyrDown copy this wide
+FORMATION_GRID = (6, 12)        # occupancy cells (rows, cols) around the players' centroid
+FORMATION_EDGE_WEIGHT = 0.3     # edge grid weight next to the player-blob grid (1.0)
+
+# Write-back: clean runs with an accepted answer are embedded and upserted into their own Chroma
+# collection (never the curated one) by a background thread, and retrieval reads up to
+# RAG_RUNS_TOP_K of them next to the curated hits. Their plays are unverified, so they never
+# count as cascade agreement (RAG_VERIFIED_SOURCES). Every queued run is appended to the spool
+# first and removed once it is in Chroma.
+RAG_WRITEBACK_ENABLED = os.getenv("FIELDHOUSE_RAG_WRITEBACK", "1") != "0"
+RAG_WRITEBACK_COLLECTION = os.getenv("FIELDHOUSE_RAG_WRITEBACK_COLLECTION", "nfl_clips_runs")
+RAG_RUNS_TOP_K = int(os.getenv("FIELDHOUSE_RAG_RUNS_TOP_K", "2"))
+RAG_WRITEBACK_QUEUE_MAX = int(os.getenv("FIELDHOUSE_RAG_WRITEBACK_QUEUE", "256"))
+RAG_WRITEBACK_BATCH = int(os.getenv("FIELDHOUSE_RAG_WRITEBACK_BATCH", "16"))   # runs per embed call + upsert
+RAG_WRITEBACK_LINGER_SEC = float(os.getenv("FIELDHOUSE_RAG_WRITEBACK_LINGER_SEC", "1.0"))
+RAG_WRITEBACK_RETRY_SEC = 5.0
+RAG_SPOOL_PATH = PROJECT_ROOT / "backend" / "rag_spool.jsonl"
+
+# Upload reuse: content hash -> Gemini file name (files expire server-side after ~48h)
+UPLOAD_REGISTRY_PATH = PROJECT_ROOT / "backend" / "upload_registry.json"
+UPLOAD_DEFAULT_TTL_SEC = 47 * 3600
+UPLOAD_EXPIRY_MARGIN_SEC = 10 * 60
+JANITOR_INTERVAL_SEC = 15 * 60
+ORPHAN_GRACE_SEC = 60 * 60  # never delete unregistered files younger than this (may be mid-upload)
+UPLOAD_DISPLAY_PREFIX = "fieldhouse-"  # orphan cleanup only ever touches files carrying this prefix
+
 
 # ======================================================
 # INPUT
@@ -106,14 +286,22 @@ Return STRICT JSON ONLY (no markdown, no extra text):
 }
 """
 
+OFF_DEF_BATCH_SUFFIX = r"""
+BATCH MODE:
+You are given several frames, each preceded by a line "ITEM <id>".
+Judge every frame independently with the rules above.
+Return STRICT JSON ONLY: {"items": [ {"item_id": "<id>", ...the fields above...}, ... ]}
+with exactly one entry per ITEM id.
+"""
+
 MASTER_PROMPT_WITH_RAG = r"""
 ROLE
 You are an expert NFL defensive coordinator with 15+ years of film-room experience.
 
 YOU ARE GIVEN
-- A short pre-snap video clip (first 6 seconds)
+- A short pre-snap video clip cut from the upload (its start/duration in the source and, when found, the snap time are in the CLIP WINDOW JSON)
 - OFFENSE/DEFENSE assignment JSON (GROUND TRUTH)
-- CV motion detection JSON (GROUND TRUTH)
+- CV motion detection JSON (GROUND TRUTH), including an optical_flow summary of which screen side moved, which way and how far
 - RAG retrieved past clip JSONs (examples) for schematic calibration only
 
 HARD RULES
@@ -136,6 +324,31 @@ Return exactly ONE paragraph and nothing else.
 """
 
 
+CASCADE_FIRST_PASS_PROMPT = r"""
+ROLE
+You are an expert NFL defensive coordinator making a quick first read from still frames.
+
+YOU ARE GIVEN
+- Three pre-snap frames (0s, 2s, 4s of the clip)
+- OFFENSE/DEFENSE assignment JSON (GROUND TRUTH)
+- CV motion detection JSON (GROUND TRUTH), including an optical_flow summary of which screen side moved, which way and how far
+- RAG PLAY CANDIDATES extracted from similar past clips (likely concepts)
+
+TASK
+- Rank the top 3 most likely play concepts (most → least likely). Prefer the RAG candidates.
+- Rate your confidence from 0.0 to 1.0 that the frames alone are enough to make this call.
+  Use a low value if the formation, shell or motion is hard to read from stills.
+- Write the coach-facing paragraph following the rules below.
+
+PARAGRAPH RULES
+- Exactly ONE paragraph. NO bullets, NO lists, NO headings, NO JSON, NO markdown.
+- Do NOT mention probabilities or percentages.
+- Analyze ONLY pre-snap info.
+- Mention offense/defense team names (or "unknown") + jersey colors, the offensive formation and motion,
+  the defensive front/shell, and the same ranked top 3 with a brief justification.
+"""
+
+
 # ======================================================
 # UTIL
 # ======================================================
@@ -143,24 +356,282 @@ Return exactly ONE paragraph and nothing else.
 def ensure_dirs():
     Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
 
+_ffmpeg_found = False
+
 def require_ffmpeg():
+    global _ffmpeg_found
+    if _ffmpeg_found:  # probed once per process, not once per analysis
+        return
     try:
         subprocess.run(["ffmpeg", "-version"], check=True,
                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     except Exception:
         raise RuntimeError("ffmpeg not installed. Run: brew install ffmpeg")
+    _ffmpeg_found = True
+
+def require_decoder():
+    """The PyAV backend needs no ffmpeg binary; anything else does."""
+    if not isinstance(get_decoder(), PyAVDecoder):
+        require_ffmpeg()
 
 def safe_slug(s: str) -> str:
     return "".join(c if c.isalnum() or c in ("-", "_") else "_" for c in s)
 
+def new_run_id() -> str:
+    """Timestamp plus a random suffix, so two runs started in the same second get their own dir."""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+def run_output_dir(video_name: str, run_id: str) -> Path:
+    return Path(OUTPUT_DIR) / f"{safe_slug(video_name)}__{run_id}"
+
 def write_json(path: Path, payload: Dict[str, Any]) -> None:
     path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
 
-def cut_subclip(input_video: str, out_video: str, start_sec: int, dur_sec: int) -> None:
+@contextmanager
+def atomic_write(path: Path, mode: str = "wb", **kwargs):
+    """
+    Yields a file object for a uniquely named temp file next to `path`, renamed
+    over `path` once the block succeeds; concurrent writers never share a temp file.
+    """
+    path = Path(path)
+    f = tempfile.NamedTemporaryFile(mode, dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False, **kwargs)
+    try:
+        with f:
+            yield f
+        os.replace(f.name, path)
+    except BaseException:
+        try:
+            os.unlink(f.name)
+        except OSError:
+            pass
+        raise
+
+
+# ======================================================
+# Tracing (wall/CPU time, bytes, tokens per stage)
+# ======================================================
+
+# Callbacks fed every finished span (e.g. the /metrics histograms); keep them cheap
+_span_observers: List[Any] = []
+
+def add_span_observer(fn) -> None:
+    _span_observers.append(fn)
+
+_child_cpu = threading.local()
+
+def _children_cpu_sec() -> float:
+    """
+    CPU time of the ffmpeg children this thread has reaped (see _MeasuredChild).
+    RUSAGE_CHILDREN would mix in every concurrent run's children.
+    """
+    return getattr(_child_cpu, "sec", 0.0)
+
+class RunTrace:
+    """
+    Spans for one pipeline run. Passed explicitly (like `usage`) rather than
+    kept in a thread-local, because the streaming generator can resume on a
+    different worker thread for every event.
+    """
+
+    def __init__(self, name: str = "analyze_video"):
+        self.spans: List[Dict[str, Any]] = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._otel_root = None
+        if TRACE_OTEL_ENABLED and otel_trace is not None:
+            self._otel_root = otel_trace.get_tracer("fieldhouse.inference").start_span(name)
+
+    @contextmanager
+    def span(self, name: str, cpu: bool = True, **attrs):
+        """
+        Times the block and yields the span dict so callers can add bytes/tokens.
+        `cpu=False` for blocks that yield to a consumer (thread CPU time is meaningless there).
+        ffmpeg children run from this thread inside the block are reported separately as child_cpu_ms.
+        """
+        rec: Dict[str, Any] = {"name": name, **attrs}
+        start_ns = time.time_ns()
+        wall0 = time.perf_counter()
+        cpu0 = time.thread_time()
+        child0 = _children_cpu_sec()
+        try:
+            yield rec
+        except BaseException as e:
+            rec["error"] = type(e).__name__
+            raise
+        finally:
+            rec["start_ms"] = round((wall0 - self._t0) * 1000.0, 2)
+            rec["wall_ms"] = round((time.perf_counter() - wall0) * 1000.0, 2)
+            if cpu:
+                rec["cpu_ms"] = round((time.thread_time() - cpu0) * 1000.0, 2)
+            child = _children_cpu_sec() - child0
+            if child > 0:
+                rec["child_cpu_ms"] = round(child * 1000.0, 2)
+            with self._lock:
+                self.spans.append(rec)
+            self._export(rec, start_ns)
+            for fn in _span_observers:
+                fn(rec)
+
+    def _export(self, rec: Dict[str, Any], start_ns: int) -> None:
+        if self._otel_root is None:
+            return
+        tracer = otel_trace.get_tracer("fieldhouse.inference")
+        ctx = otel_trace.set_span_in_context(self._otel_root)
+        sp = tracer.start_span(rec["name"], context=ctx, start_time=start_ns)
+        for k, v in rec.items():
+            if k != "name" and isinstance(v, (str, bool, int, float)):
+                sp.set_attribute(k, v)
+        sp.end(end_time=start_ns + int(rec["wall_ms"] * 1e6))
+
+    def finish(self) -> Dict[str, Any]:
+        """Closes the run and returns the report stored under meta["trace"]."""
+        by_stage: Dict[str, Dict[str, Any]] = {}
+        for s in self.spans:
+            agg = by_stage.setdefault(s["name"], {"count": 0, "wall_ms": 0.0, "cpu_ms": 0.0,
+                                                  "bytes_sent": 0, "tokens_in": 0, "tokens_out": 0})
+            agg["count"] += 1
+            agg["wall_ms"] = round(agg["wall_ms"] + s["wall_ms"], 2)
+            agg["cpu_ms"] = round(agg["cpu_ms"] + s.get("cpu_ms", 0.0) + s.get("child_cpu_ms", 0.0), 2)
+            for k in ("bytes_sent", "tokens_in", "tokens_out"):
+                agg[k] += s.get(k, 0)
+        if self._otel_root is not None:
+            self._otel_root.end()
+        return {
+            "total_wall_ms": round((time.perf_counter() - self._t0) * 1000.0, 2),
+            "otel_exported": self._otel_root is not None,
+            "by_stage": by_stage,
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+        }
+
+def trace_span(trace: Optional[RunTrace], name: str, cpu: bool = True, **attrs):
+    """trace.span(...) when tracing, otherwise a no-op that still hands back a dict."""
+    return trace.span(name, cpu=cpu, **attrs) if trace is not None else nullcontext({})
+
+def _text_bytes(contents: List[Any]) -> int:
+    return sum(len(c.encode("utf-8")) for c in contents if isinstance(c, str))
+
+
+# ======================================================
+# Deadlines and cancellation
+# ======================================================
+
+class AnalysisCancelled(RuntimeError):
+    pass
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class Deadline:
+    """
+    End-to-end budget plus a cancel flag for one analysis, threaded explicitly
+    (like `trace`) through every blocking call. Stages ask for a sub-budget,
+    which is the smaller of their STAGE_BUDGET_SEC and the time left overall.
+    Remote files uploaded under this deadline are remembered, so an abandoned
+    run can delete them.
+    """
+
+    def __init__(self, budget_sec: float = ANALYSIS_DEADLINE_SEC, cancel: Optional[threading.Event] = None):
+        self.budget_sec = budget_sec
+        self.expires_at = time.monotonic() + budget_sec
+        self.cancel = cancel or threading.Event()
+        self.fresh_uploads: List[Tuple[str, str]] = []  # (digest, remote name) uploaded, not yet registered
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self, stage: str = "") -> None:
+        if self.cancel.is_set():
+            raise AnalysisCancelled(f"analysis cancelled{f' during {stage}' if stage else ''}")
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"analysis deadline of {self.budget_sec:g}s exceeded{f' during {stage}' if stage else ''}")
+
+    def stage_budget(self, stage: str) -> float:
+        self.check(stage)
+        return min(self.remaining(), STAGE_BUDGET_SEC.get(stage, self.remaining()))
+
+    def sleep(self, seconds: float, stage: str = "") -> None:
+        """time.sleep that wakes up on cancel and refuses to outlive the deadline."""
+        if seconds >= self.remaining():
+            raise DeadlineExceeded(f"not enough budget left to wait {seconds:.1f}s{f' during {stage}' if stage else ''}")
+        self.cancel.wait(seconds)
+        self.check(stage)
+
+def deadline_check(deadline: Optional[Deadline], stage: str = "") -> None:
+    if deadline is not None:
+        deadline.check(stage)
+
+class _MeasuredChild:
+    """
+    An ffmpeg child reaped with os.wait4 on a helper thread, so its own CPU time is
+    known. finish() waits for it and adds that time to the calling thread's total.
+    """
+
+    def __init__(self, cmd: List[str], stdout: Any, **popen_kwargs):
+        self.proc = subprocess.Popen(cmd, stdout=stdout, stderr=subprocess.DEVNULL, **popen_kwargs)
+        self.cpu_sec = 0.0
+        self.exited = threading.Event()
+        threading.Thread(target=self._reap, name="ffmpeg-reaper", daemon=True).start()
+
+    def _reap(self) -> None:
+        try:
+            _, status, ru = os.wait4(self.proc.pid, 0)
+            self.proc.returncode = os.waitstatus_to_exitcode(status)
+            self.cpu_sec = ru.ru_utime + ru.ru_stime
+        except ChildProcessError:
+            pass  # reaped by Popen itself (kill() racing the exit); returncode is already set
+        finally:
+            self.exited.set()
+
+    def kill(self) -> None:
+        if not self.exited.is_set():
+            self.proc.kill()
+
+    def finish(self) -> int:
+        self.exited.wait()
+        _child_cpu.sec = _children_cpu_sec() + self.cpu_sec
+        return self.proc.returncode
+
+def run_ffmpeg(cmd: List[str], deadline: Optional[Deadline] = None, stage: str = "ffmpeg",
+               capture: bool = False) -> Optional[bytes]:
+    """
+    subprocess.run(check=True) for ffmpeg that kills the child on cancel or when the stage budget runs out.
+    With capture=True, returns the child's stdout (e.g. raw frames written to pipe:1).
+    """
+    budget_end = time.monotonic() + deadline.stage_budget(stage) if deadline is not None else None
+    child = _MeasuredChild(cmd, subprocess.PIPE if capture else subprocess.DEVNULL)
+    chunks: List[bytes] = []
+    reader = None
+    if capture:
+        # Drained on its own thread so a full pipe never stalls the child while we watch the deadline
+        reader = threading.Thread(target=lambda: chunks.append(child.proc.stdout.read()), daemon=True)
+        reader.start()
+    try:
+        while not child.exited.wait(CANCEL_POLL_SEC):
+            if deadline is not None:
+                deadline.check(stage)
+                if time.monotonic() >= budget_end:
+                    raise DeadlineExceeded(f"{stage} exceeded its {STAGE_BUDGET_SEC.get(stage)}s budget")
+    finally:
+        child.kill()
+        returncode = child.finish()
+        if reader is not None:
+            reader.join()
+            child.proc.stdout.close()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    return chunks[0] if capture else None
+
+def _ffmpeg_cut_subclip(input_video: str, out_video: str, start_sec: float, dur_sec: float,
+                        profile: Optional[Dict[str, Any]] = None, deadline: Optional["Deadline"] = None) -> None:
     """
     Creates a new video containing only [start_sec, start_sec+dur_sec).
-    Uses stream copy if possible; falls back to re-encode if needed.
+    With a transcoding profile, cuts and transcodes in a single ffmpeg pass.
+    Otherwise uses stream copy if possible; falls back to re-encode if needed.
     """
+    if profile:
+        transcode_subclip(input_video, out_video, start_sec, dur_sec, profile, deadline)
+        return
+
     # Try fast stream copy first (very fast)
     cmd_copy = [
         "ffmpeg", "-y",
@@ -170,9 +641,12 @@ def cut_subclip(input_video: str, out_video: str, start_sec: int, dur_sec: int)
         "-c", "copy",
         out_video
     ]
-    p = subprocess.run(cmd_copy, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    if p.returncode == 0 and Path(out_video).exists() and Path(out_video).stat().st_size > 0:
-        return
+    try:
+        run_ffmpeg(cmd_copy, deadline, "cut")
+        if Path(out_video).exists() and Path(out_video).stat().st_size > 0:
+            return
+    except subprocess.CalledProcessError:
+        pass
 
     # Fallback: re-encode (slower but reliable)
     cmd_reencode = [
@@ -187,48 +661,614 @@ def cut_subclip(input_video: str, out_video: str, start_sec: int, dur_sec: int)
         "-b:a", "128k",
         out_video
     ]
-    subprocess.run(cmd_reencode, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    run_ffmpeg(cmd_reencode, deadline, "cut")
 
-def extract_frames_at_times(video: str, out_dir: str, times_sec: List[int]) -> List[Path]:
+def transcode_subclip(input_video: str, out_video: str, start_sec: float, dur_sec: float,
+                      profile: Dict[str, Any], deadline: Optional["Deadline"] = None) -> None:
+    vf = f"fps={profile['fps']},scale=-2:'min({profile['height']},ih)'"
+    cmd = [
+        "ffmpeg", "-y",
+        "-ss", str(start_sec),
+        "-t", str(dur_sec),
+        "-i", input_video,
+        "-vf", vf,
+        "-c:v", profile.get("codec", "libx264"),
+        "-preset", "veryfast",
+        "-crf", str(profile.get("crf", 28)),
+        "-pix_fmt", "yuv420p",
+    ]
+    if profile.get("maxrate"):
+        cmd += ["-maxrate", profile["maxrate"], "-bufsize", profile["maxrate"]]
+    cmd += ["-c:a", "aac", "-b:a", "64k"] if profile.get("audio") else ["-an"]
+    cmd += ["-movflags", "+faststart", out_video]
+    run_ffmpeg(cmd, deadline, "cut")
+
+def extract_frames_at_times(video: str, out_dir: str, times_sec: List[float], offset_sec: float = 0,
+                            deadline: Optional["Deadline"] = None) -> List[Path]:
+    """Grabs one JPEG per time; `offset_sec` lets frames come from the source at full quality."""
     frames = []
     for t in times_sec:
         out = Path(out_dir) / f"frame_t{t}.jpg"
-        subprocess.run(
-            ["ffmpeg", "-y", "-ss", str(t), "-i", video, "-frames:v", "1", "-q:v", "2", str(out)],
-            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        run_ffmpeg(
+            ["ffmpeg", "-y", "-ss", str(offset_sec + t), "-i", video, "-frames:v", "1", "-q:v", "2", str(out)],
+            deadline, "extract_frames",
         )
         frames.append(out)
     return frames
 
+class InMemoryFrame:
+    """
+    One still kept in memory from decode to upload: the JPEG ffmpeg piped back
+    (never written to disk). CV stages decode it straight to gray at the resolution
+    they need, once per resolution, and share that buffer; the upload sends the
+    same bytes, so nothing is re-read or re-encoded.
+    Frames decoded in-process (PyAV) start from a BGR array instead and are
+    JPEG-encoded lazily, only if uploaded.
+    """
+
+    def __init__(self, t_sec: float, jpeg: Optional[bytes] = None, bgr: Optional[Any] = None):
+        self.t_sec = t_sec
+        self._jpeg = jpeg
+        self.bgr = bgr
+        self._gray: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def jpeg(self) -> bytes:
+        with self._lock:
+            if self._jpeg is None:
+                ok, buf = cv2.imencode(".jpg", self.bgr, [cv2.IMWRITE_JPEG_QUALITY, FRAME_JPEG_QUALITY])
+                if not ok:
+                    raise RuntimeError(f"Could not encode {self.name}")
+                self._jpeg = buf.tobytes()
+            return self._jpeg
+
+    @property
+    def name(self) -> str:
+        return f"frame_t{self.t_sec:g}.jpg"
+
+    def gray(self, downsample: int = MOTION_DOWNSAMPLE) -> Any:
+        """
+        Blurred grayscale at `downsample`, computed once per downsample. JPEG-backed
+        frames match _read_gray on the same file; BGR-backed frames are downscaled
+        with INTER_AREA instead of libjpeg's reduced decode, so they differ slightly.
+        """
+        with self._lock:
+            if downsample not in self._gray and self.bgr is not None:
+                gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+                if downsample == 1:
+                    self._gray[1] = cv2.GaussianBlur(gray, BLUR_KERNEL, 0)
+                else:
+                    h, w = gray.shape
+                    small = cv2.resize(gray, (w // downsample, h // downsample), interpolation=cv2.INTER_AREA)
+                    self._gray[downsample] = cv2.GaussianBlur(small, blur_kernel_for(downsample), 0)
+            if downsample not in self._gray:
+                buf = np.frombuffer(self._jpeg, dtype=np.uint8)  # view, no copy
+                if downsample == 1:
+                    img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+                    gray = None if img is None else cv2.GaussianBlur(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), BLUR_KERNEL, 0)
+                else:
+                    gray = cv2.imdecode(buf, _REDUCED_GRAY_FLAGS[downsample])
+                    gray = None if gray is None else cv2.GaussianBlur(gray, blur_kernel_for(downsample), 0)
+                if gray is None:
+                    raise RuntimeError(f"Could not decode {self.name}")
+                self._gray[downsample] = gray
+            return self._gray[downsample]
+
+def _ffmpeg_decode_frames(video: str, times_sec: List[float], offset_sec: float = 0,
+                          deadline: Optional["Deadline"] = None) -> List[InMemoryFrame]:
+    """Like extract_frames_at_times, but ffmpeg pipes each JPEG back instead of writing it to disk."""
+    frames = []
+    for t in times_sec:
+        jpeg = run_ffmpeg(
+            ["ffmpeg", "-v", "error", "-ss", str(offset_sec + t), "-i", video, "-frames:v", "1", "-q:v", "2",
+             "-f", "image2pipe", "-c:v", "mjpeg", "pipe:1"],
+            deadline, "extract_frames", capture=True,
+        )
+        if not jpeg:
+            raise RuntimeError(f"Could not decode frame at {offset_sec + t:g}s from {video}")
+        frames.append(InMemoryFrame(t, jpeg))
+    return frames
+
+
+# ======================================================
+# Decoding backends (ffmpeg subprocess / in-process PyAV)
+# ======================================================
+
+class FfmpegDecoder:
+    """Forks one ffmpeg process per cut / still / scan."""
+
+    name = "ffmpeg"
+
+    def cut(self, input_video: str, out_video: str, start_sec: float, dur_sec: float,
+            profile: Optional[Dict[str, Any]] = None, deadline: Optional[Deadline] = None) -> None:
+        require_ffmpeg()
+        _ffmpeg_cut_subclip(input_video, out_video, start_sec, dur_sec, profile, deadline)
+
+    def frames_at(self, video: str, times_sec: List[float], offset_sec: float = 0,
+                  deadline: Optional[Deadline] = None) -> List[InMemoryFrame]:
+        require_ffmpeg()
+        return _ffmpeg_decode_frames(video, times_sec, offset_sec, deadline)
+
+    def gray_frames(self, video: str, fps: float, size: Tuple[int, int],
+                    max_sec: Optional[float] = None, deadline: Optional[Deadline] = None) -> Iterator[Tuple[float, Any]]:
+        # ffmpeg's fps filter hands back every frame it decodes, so the caller's per-frame check suffices
+        require_ffmpeg()
+        return _ffmpeg_gray_frames(video, fps, size, max_sec)
+
+_PTS_EPS_SEC = 1e-3  # timestamp rounding slack when matching frames to sample ticks
+
+class PyAVDecoder:
+    """
+    Demuxes, seeks, packet-copies and decodes in this process with libav (PyAV),
+    so an analysis forks no ffmpeg at all. There is no child to kill, so the
+    deadline is checked between packets instead. Anything PyAV fails on is retried
+    once with FfmpegDecoder.
+    """
+
+    name = "pyav"
+
+    def __init__(self):
+        self.fallback = FfmpegDecoder()
+
+    @staticmethod
+    def _budget_check(deadline: Optional[Deadline], budget_end: Optional[float], stage: str) -> None:
+        if deadline is None:
+            return
+        deadline.check(stage)
+        if time.monotonic() >= budget_end:
+            raise DeadlineExceeded(f"{stage} exceeded its {STAGE_BUDGET_SEC.get(stage)}s budget")
+
+    @staticmethod
+    def _budget_end(deadline: Optional[Deadline], stage: str) -> Optional[float]:
+        return time.monotonic() + deadline.stage_budget(stage) if deadline is not None else None
+
+    def cut(self, input_video: str, out_video: str, start_sec: float, dur_sec: float,
+            profile: Optional[Dict[str, Any]] = None, deadline: Optional[Deadline] = None) -> None:
+        if profile and profile.get("audio"):
+            # Audio re-encoding is left to ffmpeg; every stock profile is video-only
+            return self.fallback.cut(input_video, out_video, start_sec, dur_sec, profile, deadline)
+        try:
+            if profile:
+                self._transcode(input_video, out_video, start_sec, dur_sec, profile, deadline)
+            else:
+                self._copy(input_video, out_video, start_sec, dur_sec, deadline)
+        except (DeadlineExceeded, AnalysisCancelled):
+            raise
+        except Exception as e:
+            print(f"⚠️  PyAV cut failed ({e}); retrying with ffmpeg")
+            self.fallback.cut(input_video, out_video, start_sec, dur_sec, profile, deadline)
+
+    def _copy(self, input_video: str, out_video: str, start_sec: float, dur_sec: float,
+              deadline: Optional[Deadline]) -> None:
+        """Packet copy from the keyframe at/before start_sec, like ffmpeg -ss ... -c copy."""
+        budget_end = self._budget_end(deadline, "cut")
+        with av.open(input_video) as src, av.open(out_video, "w") as dst:
+            vin = src.streams.video[0]
+            streams = [vin] + list(src.streams.audio[:1])
+            outs = {s.index: dst.add_stream_from_template(s) for s in streams}
+            src.seek(int(start_sec / vin.time_base) + (vin.start_time or 0), stream=vin, backward=True)
+            base: Dict[int, int] = {}
+            end_sec = start_sec + dur_sec
+            for packet in src.demux(streams):
+                self._budget_check(deadline, budget_end, "cut")
+                if packet.dts is None:
+                    continue
+                t = float((packet.pts if packet.pts is not None else packet.dts) * packet.time_base)
+                t -= float((packet.stream.start_time or 0) * packet.time_base)
+                if t >= end_sec:
+                    if packet.stream is vin:
+                        break
+                    continue
+                # Rebase so the cut starts at 0
+                offset = base.setdefault(packet.stream.index, packet.dts)
+                packet.dts -= offset
+                if packet.pts is not None:
+                    packet.pts -= offset
+                packet.stream = outs[packet.stream.index]
+                dst.mux(packet)
+
+    def _transcode(self, input_video: str, out_video: str, start_sec: float, dur_sec: float,
+                   profile: Dict[str, Any], deadline: Optional[Deadline]) -> None:
+        """Same output as transcode_subclip: fps, scale=-2:min(height,ih), x264 crf/maxrate, no audio, faststart."""
+        budget_end = self._budget_end(deadline, "cut")
+        fps = profile["fps"]
+        with av.open(input_video) as src, av.open(out_video, "w", options={"movflags": "+faststart"}) as dst:
+            vin = src.streams.video[0]
+            vin.thread_type = "AUTO"
+            height = min(profile["height"], vin.codec_context.height)
+            width = int(round(vin.codec_context.width * height / vin.codec_context.height / 2)) * 2
+            vout = dst.add_stream(profile.get("codec", "libx264"), rate=fps)
+            vout.width, vout.height, vout.pix_fmt = width, height, "yuv420p"
+            opts = {"preset": "veryfast", "crf": str(profile.get("crf", 28))}
+            if profile.get("maxrate"):
+                opts.update(maxrate=profile["maxrate"], bufsize=profile["maxrate"])
+            vout.options = opts
+
+            t0 = float((vin.start_time or 0) * vin.time_base)
+            src.seek(int(start_sec / vin.time_base) + (vin.start_time or 0), stream=vin, backward=True)
+            n = 0
+            for frame in src.decode(vin):
+                self._budget_check(deadline, budget_end, "cut")
+                t = frame.time - t0 - start_sec
+                if t >= dur_sec:
+                    break
+                if t < n / fps - _PTS_EPS_SEC:
+                    continue  # fps filter: first source frame at/after each output tick
+                out = frame.reformat(width=width, height=height, format="yuv420p")
+                out.pts = n
+                out.time_base = Fraction(1, fps)
+                n += 1
+                for packet in vout.encode(out):
+                    dst.mux(packet)
+            for packet in vout.encode(None):
+                dst.mux(packet)
+
+    def frames_at(self, video: str, times_sec: List[float], offset_sec: float = 0,
+                  deadline: Optional[Deadline] = None) -> List[InMemoryFrame]:
+        """One seek, then decode forward; each still is the first frame at/after its time (as with ffmpeg -ss)."""
+        budget_end = self._budget_end(deadline, "extract_frames")
+        try:
+            frames: List[InMemoryFrame] = []
+            with av.open(video) as c:
+                s = c.streams.video[0]
+                s.thread_type = "AUTO"
+                t0 = float((s.start_time or 0) * s.time_base)
+                wanted = sorted(times_sec)
+                c.seek(int((offset_sec + wanted[0]) / s.time_base) + (s.start_time or 0), stream=s, backward=True)
+                for frame in c.decode(s):
+                    self._budget_check(deadline, budget_end, "extract_frames")
+                    while wanted and frame.time - t0 >= offset_sec + wanted[0] - _PTS_EPS_SEC:
+                        frames.append(InMemoryFrame(wanted.pop(0), bgr=frame.to_ndarray(format="bgr24")))
+                    if not wanted:
+                        break
+            if len(frames) != len(times_sec):
+                raise RuntimeError(f"Could not decode frames at {times_sec}s (+{offset_sec:g}s) from {video}")
+            return frames
+        except (DeadlineExceeded, AnalysisCancelled):
+            raise
+        except Exception as e:
+            print(f"⚠️  PyAV decode failed ({e}); retrying with ffmpeg")
+            return self.fallback.frames_at(video, times_sec, offset_sec, deadline)
+
+    def gray_frames(self, video: str, fps: float, size: Tuple[int, int],
+                    max_sec: Optional[float] = None, deadline: Optional[Deadline] = None) -> Iterator[Tuple[float, Any]]:
+        """
+        Same contract as the ffmpeg scan: (t_sec, gray) at `fps`, scaled to `size`.
+        Frames skipped to hit `fps` are never seen by the caller, so the deadline
+        is checked here on every decoded frame.
+        """
+        w, h = size
+        budget_end = self._budget_end(deadline, "select_window")
+        try:
+            c = av.open(video)
+        except Exception as e:
+            print(f"⚠️  PyAV could not open {video} ({e}); scanning with ffmpeg")
+            yield from self.fallback.gray_frames(video, fps, size, max_sec, deadline)
+            return
+        with c:
+            s = c.streams.video[0]
+            s.thread_type = "AUTO"
+            t0 = None
+            idx = 0
+            for frame in c.decode(s):
+                self._budget_check(deadline, budget_end, "select_window")
+                if frame.time is None:
+                    continue
+                t0 = frame.time if t0 is None else t0
+                t = frame.time - t0
+                if max_sec is not None and t >= max_sec:
+                    break
+                if t < idx / fps - _PTS_EPS_SEC:
+                    continue
+                yield idx / fps, frame.to_ndarray(format="gray", width=w, height=h)
+                idx += 1
+
+_decoders: Dict[str, Any] = {}
+
+def get_decoder() -> Any:
+    name = "pyav" if DECODE_BACKEND == "pyav" and av is not None else "ffmpeg"
+    if name not in _decoders:
+        _decoders[name] = PyAVDecoder() if name == "pyav" else FfmpegDecoder()
+    return _decoders[name]
+
+def cut_subclip(input_video: str, out_video: str, start_sec: float, dur_sec: float,
+                profile: Optional[Dict[str, Any]] = None, deadline: Optional[Deadline] = None) -> None:
+    """
+    Creates a new video containing only [start_sec, start_sec+dur_sec).
+    With a transcoding profile, cuts and transcodes in a single pass; otherwise packet copy.
+    """
+    get_decoder().cut(input_video, out_video, start_sec, dur_sec, profile, deadline)
+
+def decode_frames_at_times(video: str, times_sec: List[float], offset_sec: float = 0,
+                           deadline: Optional[Deadline] = None) -> List[InMemoryFrame]:
+    return get_decoder().frames_at(video, times_sec, offset_sec, deadline)
+
+def iter_gray_frames(
+    video: str,
+    fps: float = SCAN_FPS,
+    size: Tuple[int, int] = SCAN_SIZE,
+    max_sec: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
+) -> Iterator[Tuple[float, Any]]:
+    """Yields (t_sec, gray_frame) from a single decode, one frame in memory at a time."""
+    return get_decoder().gray_frames(video, fps, size, max_sec, deadline)
+
 
 # ======================================================
 # Gemini helpers
 # ======================================================
 
-def call_model_with_backoff(model_name: str, contents: List[Any]) -> str:
+def _is_overloaded(err: Exception) -> bool:
+    msg = str(err).lower()
+    return "503" in msg or "unavailable" in msg or "overloaded" in msg
+
+def _backoff_sleep(model_name: str, attempt: int, delay: float, deadline: Optional[Deadline] = None) -> float:
+    jitter = random.uniform(0.0, 0.35 * delay)
+    sleep_for = min(BACKOFF_MAX_SEC, delay + jitter)
+    print(f"⚠️  {model_name} overloaded (503). Retry {attempt+1}/{MAX_API_RETRIES} in {sleep_for:.2f}s...")
+    incr_counter("gemini_503")
+    incr_counter("gemini_retries")
+    if deadline is not None:
+        deadline.sleep(sleep_for, f"{model_name} backoff")
+    else:
+        time.sleep(sleep_for)
+    return min(BACKOFF_MAX_SEC, delay * 1.7)
+
+class CircuitBreaker:
+    """
+    Tracks one model's recent outcomes.
+    closed → open when the failure rate over the last BREAKER_WINDOW calls reaches
+    BREAKER_FAILURE_RATE; open → half_open after BREAKER_OPEN_SEC, which lets exactly
+    one probe call through; the probe's outcome closes the breaker or re-opens it.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.state = "closed"
+        self.outcomes: deque = deque(maxlen=BREAKER_WINDOW)
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= BREAKER_OPEN_SEC:
+                self.state = "half_open"
+                self.probing = False
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def available(self) -> bool:
+        """Like allow() but without claiming the half-open probe."""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self.opened_at >= BREAKER_OPEN_SEC
+            return self.state == "closed" or not self.probing
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if self.state == "half_open":
+                self.probing = False
+                if ok:
+                    print(f"✅ {self.model_name} recovered; circuit closed")
+                    self.state = "closed"
+                    self.outcomes.clear()
+                else:
+                    self._open()
+                return
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if (self.state == "closed" and len(self.outcomes) >= BREAKER_MIN_CALLS
+                    and failures / len(self.outcomes) >= BREAKER_FAILURE_RATE):
+                self._open()
+
+    def release(self) -> None:
+        """Gives the half-open probe back without an outcome (the call was cancelled or abandoned)."""
+        with self._lock:
+            if self.state == "half_open":
+                self.probing = False
+
+    def _open(self) -> None:
+        print(f"🔌 {self.model_name} circuit open for {BREAKER_OPEN_SEC:.0f}s")
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        incr_counter("breaker_opened")
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(model_name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker(model_name)
+        return _breakers[model_name]
+
+def breaker_states() -> Dict[str, str]:
+    with _breakers_lock:
+        return {m: b.state for m, b in _breakers.items()}
+
+def model_chain(model_name: str) -> List[str]:
+    return [model_name] + [m for m in MODEL_FALLBACKS.get(model_name, []) if m != model_name]
+
+def pick_model(model_name: str) -> str:
+    """First model in the chain whose breaker lets a call through; the last fallback if none does."""
+    chain = model_chain(model_name)
+    for m in chain:
+        if get_breaker(m).allow():
+            if m != model_name:
+                incr_counter("model_fallbacks")
+            return m
+    return chain[-1]
+
+def _can_fail_over(model_name: str, failed: str) -> bool:
+    return any(get_breaker(m).available() for m in model_chain(model_name) if m != failed)
+
+def _note_served(usage: Optional[Dict[str, Any]], requested: str, served: str) -> None:
+    if usage is not None:
+        usage["served"].append({"requested": requested, "served": served})
+
+def served_model(usage: Dict[str, Any], requested: str) -> str:
+    """Model that actually answered the latest call made for `requested`."""
+    for entry in reversed(usage["served"]):
+        if entry["requested"] == requested:
+            return entry["served"]
+    return requested
+
+def _is_cache_miss(err: Exception) -> bool:
+    msg = str(err).lower()
+    return "cached" in msg and ("not found" in msg or "expired" in msg or "permission" in msg)
+
+def call_model_with_backoff(
+    model_name: str,
+    contents: List[Any],
+    system_instruction: Optional[str] = None,
+    usage: Optional[Dict[str, Any]] = None,
+    extra_config: Optional[Dict[str, Any]] = None,
+    trace: Optional[RunTrace] = None,
+    deadline: Optional[Deadline] = None,
+) -> str:
     delay = BACKOFF_BASE_SEC
     last_err = None
     cli = get_client()
 
     for attempt in range(MAX_API_RETRIES):
+        extra = _with_timeout(extra_config, deadline, "model_call")
+        model = pick_model(model_name)
+        breaker = get_breaker(model)
+        config = build_generate_config(model, system_instruction, extra)
         try:
-            resp = cli.models.generate_content(model=model_name, contents=contents)
+            with trace_span(trace, "gemini.generate", model=model, attempt=attempt + 1,
+                            bytes_sent=_text_bytes(contents)) as sp:
+                resp = cli.models.generate_content(model=model, contents=contents, config=config)
+                record_usage(usage, model, resp)
+                sp["tokens_in"], sp["tokens_cached"], sp["tokens_out"] = _usage_counts(resp)
+            breaker.record(True)
+            _note_served(usage, model_name, model)
             txt = getattr(resp, "text", None)
             return (txt or "").strip()
         except genai_errors.ServerError as e:
             last_err = e
-            msg = str(e).lower()
-            if "503" in msg or "unavailable" in msg or "overloaded" in msg:
-                jitter = random.uniform(0.0, 0.35 * delay)
-                sleep_for = min(BACKOFF_MAX_SEC, delay + jitter)
-                print(f"⚠️  {model_name} overloaded (503). Retry {attempt+1}/{MAX_API_RETRIES} in {sleep_for:.2f}s...")
-                time.sleep(sleep_for)
-                delay = min(BACKOFF_MAX_SEC, delay * 1.7)
+            if _is_overloaded(e):
+                breaker.record(False)
+                if breaker.state == "open" and _can_fail_over(model_name, model):
+                    incr_counter("gemini_503")
+                    continue  # fail over right away instead of sleeping on a model that is down
+                delay = _backoff_sleep(model, attempt, delay, deadline)
                 continue
+            breaker.record(False)  # a 500/502/504 is the model failing too, not a bad request
+            raise
+        except genai_errors.ClientError as e:
+            last_err = e
+            breaker.record(True)  # the model answered; the request was the problem
+            if system_instruction and _is_cache_miss(e):
+                invalidate_context_cache(model, system_instruction)
+                incr_counter("gemini_retries")
+                continue
+            raise
+        except Exception:
+            breaker.record(False)  # timeouts / connection errors
             raise
 
     raise RuntimeError(f"Model call failed after retries. Last error: {last_err}")
 
+def _with_timeout(extra_config: Optional[Dict[str, Any]], deadline: Optional[Deadline], stage: str) -> Optional[Dict[str, Any]]:
+    """Adds an HTTP timeout (the stage's sub-budget) to a generate config."""
+    if deadline is None:
+        return extra_config
+    timeout_ms = int(deadline.stage_budget(stage) * 1000)
+    return {**(extra_config or {}), "http_options": types.HttpOptions(timeout=max(1000, timeout_ms))}
+
+def call_model_stream_with_backoff(
+    model_name: str,
+    contents: List[Any],
+    system_instruction: Optional[str] = None,
+    usage: Optional[Dict[str, Any]] = None,
+    trace: Optional[RunTrace] = None,
+    deadline: Optional[Deadline] = None,
+) -> Iterator[str]:
+    """
+    Streams text chunks from generate_content_stream.
+    Retries on 503 only until the first chunk arrives; after that a failure
+    is raised because the caller has already consumed partial output.
+    """
+    delay = BACKOFF_BASE_SEC
+    last_err = None
+    cli = get_client()
+
+    for attempt in range(MAX_API_RETRIES):
+        extra = _with_timeout(None, deadline, "final_stream")
+        model = pick_model(model_name)
+        breaker = get_breaker(model)
+        probe = breaker.state == "half_open"
+        config = build_generate_config(model, system_instruction, extra)
+        started = False
+        recorded = False
+        last_chunk = None
+
+        def note(ok: bool) -> None:
+            nonlocal recorded
+            recorded = True
+            breaker.record(ok)
+
+        try:
+            with trace_span(trace, "gemini.stream", cpu=False, model=model, attempt=attempt + 1,
+                            bytes_sent=_text_bytes(contents)) as sp:
+                t0 = time.perf_counter()
+                for chunk in cli.models.generate_content_stream(model=model, contents=contents, config=config):
+                    last_chunk = chunk
+                    deadline_check(deadline, "final_stream")
+                    txt = getattr(chunk, "text", None)
+                    if txt:
+                        if not started:
+                            sp["ttft_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+                            note(True)
+                            _note_served(usage, model_name, model)
+                        started = True
+                        yield txt
+                # usage_metadata is complete on the final chunk
+                record_usage(usage, model, last_chunk)
+                sp["tokens_in"], sp["tokens_cached"], sp["tokens_out"] = _usage_counts(last_chunk)
+            return
+        except genai_errors.ServerError as e:
+            last_err = e
+            if not started and _is_overloaded(e):
+                note(False)
+                if breaker.state == "open" and _can_fail_over(model_name, model):
+                    incr_counter("gemini_503")
+                    continue
+                delay = _backoff_sleep(model, attempt, delay, deadline)
+                continue
+            if not started:
+                note(False)
+            raise
+        except genai_errors.ClientError as e:
+            last_err = e
+            if not started:
+                note(True)
+            if not started and system_instruction and _is_cache_miss(e):
+                invalidate_context_cache(model, system_instruction)
+                incr_counter("gemini_retries")
+                continue
+            raise
+        except (AnalysisCancelled, DeadlineExceeded, GeneratorExit):
+            raise
+        except Exception:
+            if not started:
+                note(False)
+            raise
+        finally:
+            # Cancelled, deadline hit or generator closed before any outcome: free the probe
+            if probe and not recorded:
+                breaker.release()
+
+    raise RuntimeError(f"Model stream failed after retries. Last error: {last_err}")
+
 def parse_json_loose(text: str) -> Dict[str, Any]:
     if not text:
         raise ValueError("Empty model output")
@@ -241,29 +1281,343 @@ def parse_json_loose(text: str) -> Dict[str, Any]:
             raise ValueError("No JSON object found in model output")
         return json.loads(t[s:e+1])
 
-def generate_json(model_name: str, contents: List[Any], attempts: int = 2) -> Dict[str, Any]:
-    last_err = None
-    for _ in range(attempts):
+# ======================================================
+# Structured output (stage 1)
+# ======================================================
+
+Side = Literal["left", "right", "unknown"]
+
+class OffDefAssignment(BaseModel):
+    offense_side: Side
+    defense_side: Side
+    offense_team: str = Field(description="Team name only if clearly visible, else unknown")
+    defense_team: str = Field(description="Team name only if clearly visible, else unknown")
+    offense_jersey_color: str
+    defense_jersey_color: str
+    confidence: Literal["high", "medium", "low"]
+    reasoning: str
+
+    @classmethod
+    def unknown(cls, reason: str) -> "OffDefAssignment":
+        return cls(
+            offense_side="unknown",
+            defense_side="unknown",
+            offense_team="unknown",
+            defense_team="unknown",
+            offense_jersey_color="unknown",
+            defense_jersey_color="unknown",
+            confidence="low",
+            reasoning=reason,
+        )
+
+# Process-wide counters (parse failures, fallbacks, ...); read via get_counters()
+_counters: Counter = Counter()
+_counters_lock = threading.Lock()
+
+def incr_counter(name: str, value: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += value
+
+def get_counters() -> Dict[str, int]:
+    with _counters_lock:
+        return dict(_counters)
+
+def generate_structured(
+    model_name: str,
+    contents: List[Any],
+    schema: type,
+    system_instruction: Optional[str] = None,
+    usage: Optional[Dict[str, Any]] = None,
+    trace: Optional[RunTrace] = None,
+    deadline: Optional[Deadline] = None,
+) -> BaseModel:
+    """
+    Single schema-constrained call (response_mime_type + response_schema).
+    Raises ValueError if the output does not validate; there is no retry call.
+    """
+    raw = call_model_with_backoff(
+        model_name, contents, system_instruction, usage,
+        extra_config={"response_mime_type": "application/json", "response_schema": schema},
+        trace=trace, deadline=deadline,
+    )
+    incr_counter("structured_calls")
+    try:
+        return schema.model_validate_json(raw)
+    except ValidationError as e:
+        incr_counter("structured_parse_failures")
+        raise ValueError(f"{schema.__name__} validation failed: {e.error_count()} errors") from e
+
+def parse_failure_rate() -> float:
+    c = get_counters()
+    calls = c.get("structured_calls", 0)
+    return c.get("structured_parse_failures", 0) / calls if calls else 0.0
+
+
+# ======================================================
+# Context caching + token usage
+# ======================================================
+
+_context_cache_lock = threading.Lock()   # guards the two dicts below, never held across a network call
+_context_caches: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_context_cache_key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+def _prompt_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def _fresh_context_cache(key: Tuple[str, str], now: float) -> Optional[Dict[str, Any]]:
+    with _context_cache_lock:
+        entry = _context_caches.get(key)
+    if entry and entry["expires_at"] - CONTEXT_CACHE_REFRESH_MARGIN_SEC > now:
+        return entry
+    return None
+
+def get_context_cache(model_name: str, system_instruction: str) -> Optional[str]:
+    """
+    Returns the name of an explicit cached content holding this system
+    instruction for this model, creating or refreshing it near TTL expiry.
+    Returns None when caching is disabled or unavailable (e.g. prompt below
+    the model's minimum cacheable size); callers then send the prompt inline.
+    Creation is serialized per (model, prompt), so concurrent callers for one
+    prompt share a single caches.create while other prompts are not held up.
+    """
+    if not CONTEXT_CACHE_ENABLED:
+        return None
+
+    key = (model_name, _prompt_key(system_instruction))
+    entry = _fresh_context_cache(key, time.time())
+    if entry:
+        return entry["name"]
+
+    with _context_cache_lock:
+        key_lock = _context_cache_key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        now = time.time()
+        entry = _fresh_context_cache(key, now)  # another caller may have created it while we waited
+        if entry:
+            return entry["name"]
         try:
-            raw = call_model_with_backoff(model_name, contents)
-            return parse_json_loose(raw)
+            cache = get_client().caches.create(
+                model=model_name,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction,
+                    display_name=f"fieldhouse-{key[1]}",
+                    ttl=f"{CONTEXT_CACHE_TTL_SEC}s",
+                ),
+            )
+            expire = getattr(cache, "expire_time", None)
+            expires_at = expire.timestamp() if isinstance(expire, datetime) else now + CONTEXT_CACHE_TTL_SEC
+            entry = {"name": cache.name, "expires_at": expires_at}
         except Exception as e:
-            last_err = e
-            contents = contents + ["Return ONLY valid JSON. No markdown. No extra text. No trailing commas."]
-    raise RuntimeError(f"Failed to get JSON from {model_name}. Last error: {last_err}")
+            print(f"⚠️  Context cache unavailable for {model_name}; sending prompt inline ({str(e)[:120]})")
+            entry = {"name": None, "expires_at": now + CONTEXT_CACHE_RETRY_SEC}
+        with _context_cache_lock:
+            _context_caches[key] = entry
+        return entry["name"]
+
+def invalidate_context_cache(model_name: str, system_instruction: str) -> None:
+    with _context_cache_lock:
+        _context_caches.pop((model_name, _prompt_key(system_instruction)), None)
+
+def build_generate_config(
+    model_name: str,
+    system_instruction: Optional[str],
+    extra_config: Optional[Dict[str, Any]] = None,
+) -> Optional[types.GenerateContentConfig]:
+    extra = dict(extra_config or {})
+    if not system_instruction:
+        return types.GenerateContentConfig(**extra) if extra else None
+    cache_name = get_context_cache(model_name, system_instruction)
+    if cache_name:
+        return types.GenerateContentConfig(cached_content=cache_name, **extra)
+    return types.GenerateContentConfig(system_instruction=system_instruction, **extra)
+
+def new_usage_report() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "input_tokens": 0,
+        "cached_input_tokens": 0,
+        "uncached_input_tokens": 0,
+        "output_tokens": 0,
+        "by_model": {},
+        "served": [],  # {"requested", "served"} per successful call; differs when a breaker failed over
+    }
+
+def _usage_counts(resp: Any) -> Tuple[int, int, int]:
+    """(prompt, cached, output) token counts; zeros when the response has no usage_metadata."""
+    meta = getattr(resp, "usage_metadata", None)
+    if meta is None:
+        return 0, 0, 0
+    return (
+        getattr(meta, "prompt_token_count", None) or 0,
+        getattr(meta, "cached_content_token_count", None) or 0,
+        getattr(meta, "candidates_token_count", None) or 0,
+    )
+
+def record_usage(usage: Optional[Dict[str, Any]], model_name: str, resp: Any) -> None:
+    if usage is None or getattr(resp, "usage_metadata", None) is None:
+        return
+    prompt, cached, output = _usage_counts(resp)
+
+    for bucket in (usage, usage["by_model"].setdefault(model_name, {
+        "calls": 0, "input_tokens": 0, "cached_input_tokens": 0, "uncached_input_tokens": 0, "output_tokens": 0
+    })):
+        bucket["calls"] += 1
+        bucket["input_tokens"] += prompt
+        bucket["cached_input_tokens"] += cached
+        bucket["uncached_input_tokens"] += prompt - cached
+        bucket["output_tokens"] += output
+
+
+def merge_usage(dst: Optional[Dict[str, Any]], src: Dict[str, Any], share: int = 1) -> None:
+    """Adds 1/share of src's token counts to dst (a shared batch call split across its runs)."""
+    if dst is None:
+        return
+    keys = ("input_tokens", "cached_input_tokens", "uncached_input_tokens", "output_tokens")
+    for model_name, counts in src["by_model"].items():
+        for bucket in (dst, dst["by_model"].setdefault(model_name, {
+            "calls": 0, "input_tokens": 0, "cached_input_tokens": 0, "uncached_input_tokens": 0, "output_tokens": 0
+        })):
+            bucket["calls"] += counts["calls"]
+            for k in keys:
+                bucket[k] += counts[k] // share
+    dst["served"].extend(src["served"])
+
+
+# ======================================================
+# Stage-1 micro-batching
+# ======================================================
+
+class OffDefBatchItem(OffDefAssignment):
+    item_id: str
+
+class OffDefBatch(BaseModel):
+    items: List[OffDefBatchItem]
+
+class _Stage1Item:
+    def __init__(self, item_id: str, frame_file: Any, usage: Optional[Dict[str, Any]], deadline: Optional[Deadline]):
+        self.item_id = item_id
+        self.frame_file = frame_file
+        self.usage = usage
+        self.deadline = deadline
+        self.result: Optional[OffDefAssignment] = None
+        self.batch_size = 0
+        self.done = threading.Event()
+
+class Stage1Batcher:
+    """
+    Collects stage-1 frames from concurrent runs for up to `window_sec` (or until
+    `max_items` are waiting) and sends them as one request that returns a JSON array
+    keyed by item id. Results are scattered back to the waiting runs. A failed batch
+    call, or an item missing from / malformed in the answer, falls back to the normal
+    per-item call made by the run that owns it.
+    """
+
+    def __init__(self, window_sec: float = STAGE1_BATCH_WINDOW_SEC, max_items: int = STAGE1_BATCH_MAX_ITEMS):
+        self.window_sec = window_sec
+        self.max_items = max_items
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._pending: List[_Stage1Item] = []
+        self._timer: Optional[threading.Timer] = None
+
+    def submit(self, frame_file: Any, usage: Optional[Dict[str, Any]] = None,
+               trace: Optional[RunTrace] = None, deadline: Optional[Deadline] = None) -> OffDefAssignment:
+        item = _Stage1Item(f"i{next(self._ids)}", frame_file, usage, deadline)
+        flush_now: List[_Stage1Item] = []
+        with self._lock:
+            self._pending.append(item)
+            if len(self._pending) >= self.max_items:
+                flush_now, self._pending = self._pending, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window_sec, self._flush_pending)
+                self._timer.daemon = True
+                self._timer.start()
+
+        with trace_span(trace, "stage1.batch", cpu=False) as sp:
+            if flush_now:
+                self._send(flush_now)
+            while not item.done.wait(CANCEL_POLL_SEC):
+                deadline_check(deadline, "stage1 batch")
+            sp["batch_size"] = item.batch_size
+
+        if item.result is not None:
+            return item.result
+        if item.batch_size > 1:
+            incr_counter("stage1_batch_fallbacks")
+        return generate_structured(
+            FAST_MODEL, [frame_file], OffDefAssignment,
+            system_instruction=OFF_DEF_PROMPT, usage=usage, trace=trace, deadline=deadline,
+        )
+
+    def _flush_pending(self) -> None:
+        with self._lock:
+            items, self._pending = self._pending, []
+            self._timer = None
+        if items:
+            self._send(items)
+
+    def _send(self, items: List[_Stage1Item]) -> None:
+        # A run about to expire would cut the batch short for everyone else; it makes its own call
+        batched = [it for it in items
+                   if it.deadline is None or it.deadline.remaining() >= STAGE1_BATCH_MIN_REMAINING_SEC]
+        for it in items:
+            it.batch_size = 1
+        for it in batched:
+            it.batch_size = len(batched)
+        try:
+            if len(batched) <= 1:
+                return  # nothing to share; the owner makes its usual call
+            contents: List[Any] = []
+            for it in batched:
+                contents += [f"ITEM {it.item_id}", it.frame_file]
+            # The batch runs as long as the roomiest run needs; a run whose own deadline passes
+            # stops waiting on its own, and one run's cancel doesn't stop the others
+            budgets = [it.deadline.remaining() for it in batched if it.deadline is not None]
+            batch_deadline = Deadline(max(budgets)) if budgets and len(budgets) == len(batched) else None
+            batch_usage = new_usage_report()
+            batch = generate_structured(
+                FAST_MODEL, contents, OffDefBatch,
+                system_instruction=OFF_DEF_PROMPT + OFF_DEF_BATCH_SUFFIX, usage=batch_usage, deadline=batch_deadline,
+            )
+            incr_counter("stage1_batches")
+            by_id = {b.item_id: b for b in batch.items}
+            for it in batched:
+                if it.item_id in by_id:
+                    it.result = OffDefAssignment(**by_id[it.item_id].model_dump(exclude={"item_id"}))
+                merge_usage(it.usage, batch_usage, len(batched))
+        except Exception as e:
+            print(f"⚠️  Stage-1 batch of {len(batched)} failed, falling back to per-item calls: {str(e)[:200]}")
+        finally:
+            for it in items:
+                it.done.set()
+
+_stage1_batcher = Stage1Batcher()
+
+def offense_defense(frame_file: Any, usage: Optional[Dict[str, Any]] = None,
+                    trace: Optional[RunTrace] = None, deadline: Optional[Deadline] = None) -> OffDefAssignment:
+    if STAGE1_BATCH_ENABLED:
+        return _stage1_batcher.submit(frame_file, usage=usage, trace=trace, deadline=deadline)
+    return generate_structured(
+        FAST_MODEL, [frame_file], OffDefAssignment,
+        system_instruction=OFF_DEF_PROMPT, usage=usage, trace=trace, deadline=deadline,
+    )
 
 
 # ======================================================
 # Upload ACTIVE polling
 # ======================================================
 
-def wait_until_active(file_obj) -> object:
+def wait_until_active(file_obj, deadline: Optional[Deadline] = None) -> object:
     file_name = getattr(file_obj, "name", None) or getattr(file_obj, "id", None) or str(file_obj)
     start = time.time()
+    max_wait = MAX_WAIT_SEC if deadline is None else min(MAX_WAIT_SEC, deadline.stage_budget("upload"))
 
     while True:
-        if time.time() - start > MAX_WAIT_SEC:
-            raise RuntimeError(f"Timed out waiting for file ACTIVE: {file_name}")
+        if time.time() - start > max_wait:
+            raise DeadlineExceeded(f"Timed out waiting for file ACTIVE: {file_name}")
 
         cur = get_client().files.get(name=file_name)
         state = getattr(cur, "state", None)
@@ -274,47 +1628,273 @@ def wait_until_active(file_obj) -> object:
         if "FAILED" in state_str:
             raise RuntimeError(f"Upload FAILED: {file_name} state={state_str}")
 
-        time.sleep(POLL_INTERVAL_SEC)
-
-def upload_and_wait(path: str):
-    f = get_client().files.upload(file=path)
-    return wait_until_active(f)
+        if deadline is not None:
+            deadline.sleep(POLL_INTERVAL_SEC, "upload")
+        else:
+            time.sleep(POLL_INTERVAL_SEC)
+
+def upload_and_wait(path: Union[str, InMemoryFrame], trace: Optional[RunTrace] = None,
+                    deadline: Optional[Deadline] = None):
+    """Uploads a file on disk, or an InMemoryFrame's JPEG bytes, and waits until it is ACTIVE."""
+    deadline_check(deadline, "upload")
+    name = path.name if isinstance(path, InMemoryFrame) else Path(path).name
+    with trace_span(trace, "upload", file=name) as sp:
+        data = path.jpeg if isinstance(path, InMemoryFrame) else None
+        digest = hashlib.sha256(data).hexdigest() if data is not None else file_sha256(path)
+        cached = lookup_registered_upload(digest)
+        sp["reused"] = cached is not None
+        if cached is not None:
+            sp["bytes_sent"] = 0
+            return cached
+
+        display_name = UPLOAD_DISPLAY_PREFIX + name
+        if data is not None:
+            sp["bytes_sent"] = len(data)
+            f = get_client().files.upload(file=io.BytesIO(data),
+                                          config={"mime_type": "image/jpeg", "display_name": display_name})
+        else:
+            sp["bytes_sent"] = Path(path).stat().st_size
+            f = get_client().files.upload(file=path, config={"display_name": display_name})
+        if deadline is not None:
+            deadline.fresh_uploads.append((digest, f.name))
+        with trace_span(trace, "upload.active_wait", file=name):
+            active = wait_until_active(f, deadline)
+        register_upload(digest, active, name if data is not None else path)
+        if deadline is not None:
+            # Other runs can reuse it from now on; expiring it is the janitor's job
+            deadline.fresh_uploads.remove((digest, f.name))
+        return active
 
 
 # ======================================================
-# CV motion
+# Upload registry (reuse uploads across runs)
 # ======================================================
 
-def _read_gray(path: Path) -> Any:
-    img = cv2.imread(str(path))
-    if img is None:
-        raise RuntimeError(f"Could not read frame: {path}")
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray = cv2.GaussianBlur(gray, BLUR_KERNEL, 0)
-    return gray
+_registry_lock = threading.Lock()
 
-def motion_score_between(a_gray, b_gray) -> float:
-    diff = cv2.absdiff(a_gray, b_gray)
-    _, thr = cv2.threshold(diff, DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)
-    return float(cv2.countNonZero(thr)) / float(thr.size)
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
-def detect_motion_cv(frame_paths: List[Path]) -> Dict[str, Any]:
-    g0 = _read_gray(frame_paths[0])
-    g2 = _read_gray(frame_paths[1])
-    g4 = _read_gray(frame_paths[2])
+def _load_registry() -> Dict[str, Dict[str, Any]]:
+    try:
+        return json.loads(Path(UPLOAD_REGISTRY_PATH).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_registry(reg: Dict[str, Dict[str, Any]]) -> None:
+    with atomic_write(UPLOAD_REGISTRY_PATH, "w", encoding="utf-8") as f:
+        f.write(json.dumps(reg, indent=2))
+
+def _expiry_ts(file_obj) -> float:
+    exp = getattr(file_obj, "expiration_time", None)
+    if isinstance(exp, datetime):
+        if exp.tzinfo is None:
+            exp = exp.replace(tzinfo=timezone.utc)
+        return exp.timestamp()
+    return time.time() + UPLOAD_DEFAULT_TTL_SEC
+
+def lookup_registered_upload(digest: str):
+    """
+    Returns the ACTIVE remote file for this content hash, or None.
+    Stale or missing entries are dropped so the caller re-uploads.
+    """
+    with _registry_lock:
+        entry = _load_registry().get(digest)
+    if not entry or entry["expires_at"] - UPLOAD_EXPIRY_MARGIN_SEC <= time.time():
+        return None
 
-    r02 = motion_score_between(g0, g2)
-    r24 = motion_score_between(g2, g4)
+    try:
+        cur = get_client().files.get(name=entry["name"])
+    except Exception:
+        cur = None
+    state_str = str(getattr(cur, "state", "")).upper()
+    if cur is not None and "ACTIVE" in state_str:
+        print(f"♻️  Reusing upload {entry['name']} for {Path(entry['source']).name}")
+        return cur
+
+    with _registry_lock:
+        reg = _load_registry()
+        reg.pop(digest, None)
+        _save_registry(reg)
+    return None
+
+def register_upload(digest: str, file_obj, source_path: str) -> None:
+    with _registry_lock:
+        reg = _load_registry()
+        reg[digest] = {
+            "name": file_obj.name,
+            "expires_at": _expiry_ts(file_obj),
+            "source": str(source_path),
+            "uploaded_at": time.time(),
+        }
+        _save_registry(reg)
+
+def discard_fresh_uploads(deadline: Deadline) -> int:
+    """
+    Deletes the remote files an abandoned run uploaded but never registered.
+    Registered uploads are left alone: a concurrent run may already be using
+    one via lookup_registered_upload, and cleanup_uploads expires them.
+    """
+    removed = 0
+    for _, name in deadline.fresh_uploads:
+        try:
+            get_client().files.delete(name=name)
+            removed += 1
+        except Exception:
+            pass  # the janitor reclaims it as an orphan later
+    deadline.fresh_uploads.clear()
+    return removed
+
+def cleanup_uploads(delete_orphans: bool = False) -> Dict[str, int]:
+    """
+    Deletes expired registry entries (and their remote files) and, optionally,
+    remote files that no registry entry points at. Orphans are only deleted when
+    their display_name carries UPLOAD_DISPLAY_PREFIX, so files other tools put
+    in the same project are left alone.
+    """
+    cli = get_client()
+    now = time.time()
+    removed_expired = removed_orphans = 0
+
+    with _registry_lock:
+        reg = _load_registry()
+        for digest, entry in list(reg.items()):
+            if entry["expires_at"] - UPLOAD_EXPIRY_MARGIN_SEC <= now:
+                try:
+                    cli.files.delete(name=entry["name"])
+                except Exception:
+                    pass  # already gone server-side
+                reg.pop(digest)
+                removed_expired += 1
+        _save_registry(reg)
+        known = {e["name"] for e in reg.values()}
+
+    if delete_orphans:
+        for f in cli.files.list():
+            created = getattr(f, "create_time", None)
+            if isinstance(created, datetime) and now - created.timestamp() < ORPHAN_GRACE_SEC:
+                continue
+            if f.name not in known and (getattr(f, "display_name", None) or "").startswith(UPLOAD_DISPLAY_PREFIX):
+                try:
+                    cli.files.delete(name=f.name)
+                    removed_orphans += 1
+                except Exception:
+                    pass
+
+    return {"expired": removed_expired, "orphans": removed_orphans}
+
+def start_upload_janitor(interval_sec: float = JANITOR_INTERVAL_SEC) -> threading.Thread:
+    def loop():
+        while True:
+            try:
+                res = cleanup_uploads(delete_orphans=True)
+                if res["expired"] or res["orphans"]:
+                    print(f"🧹 Upload janitor removed {res['expired']} expired, {res['orphans']} orphaned files")
+            except Exception as e:
+                print(f"⚠️  Upload janitor failed: {e}")
+            time.sleep(interval_sec)
+
+    t = threading.Thread(target=loop, name="upload-janitor", daemon=True)
+    t.start()
+    return t
+
+
+# ======================================================
+# CV motion
+# ======================================================
+
+_REDUCED_GRAY_FLAGS = {
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+def blur_kernel_for(downsample: int) -> Tuple[int, int]:
+    # Keep the blur's footprint on the scene roughly constant as resolution drops
+    k = max(3, (BLUR_KERNEL[0] // downsample) | 1)
+    return (k, k)
+
+def _read_gray(path: Union[Path, InMemoryFrame], downsample: int = MOTION_DOWNSAMPLE) -> Any:
+    if isinstance(path, InMemoryFrame):
+        return path.gray(downsample)
+    if downsample == 1:
+        img = cv2.imread(str(path))
+        if img is None:
+            raise RuntimeError(f"Could not read frame: {path}")
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, BLUR_KERNEL, 0)
+        return gray
+
+    # Decoder downsamples + converts to gray directly (no full-res BGR buffer)
+    gray = cv2.imread(str(path), _REDUCED_GRAY_FLAGS[downsample])
+    if gray is None:
+        raise RuntimeError(f"Could not read frame: {path}")
+    return cv2.GaussianBlur(gray, blur_kernel_for(downsample), 0)
+
+def motion_score_between(a_gray, b_gray, scratch: Optional[Any] = None) -> float:
+    # absdiff → threshold → count in place in one buffer; pass `scratch` to reuse it across pairs
+    buf = scratch if scratch is not None else np.empty_like(a_gray)
+    cv2.absdiff(a_gray, b_gray, dst=buf)
+    cv2.threshold(buf, DIFF_THRESHOLD, 255, cv2.THRESH_BINARY, dst=buf)
+    return float(cv2.countNonZero(buf)) / float(buf.size)
+
+def detect_motion_cv(frame_paths: List[Union[Path, InMemoryFrame]],
+                     frame_times: List[float] = FRAME_TIMES_SEC, downsample: int = MOTION_DOWNSAMPLE, region_aware: bool = REGION_MOTION_ENABLED,
+                     overlay_mask: Optional[Any] = None) -> Dict[str, Any]:
+    # Ratio keys stay "t0_to_t2"/"t2_to_t4" (first/second pair) so stored RAG docs keep matching.
+    # Short windows space the frames closer than 2s, so each pair's ratios are scaled to a
+    # MOTION_RATIO_GAP_SEC gap; that keeps them comparable across windows and with the threshold.
+    gaps = (frame_times[1] - frame_times[0], frame_times[2] - frame_times[1])
+    scale02, scale24 = (MOTION_RATIO_GAP_SEC / g if g > 0 else 1.0 for g in gaps)
+
+    def per_gap(ratio: float, scale: float) -> float:
+        return min(1.0, ratio * scale)
+
+    g0 = _read_gray(frame_paths[0], downsample)
+    g2 = _read_gray(frame_paths[1], downsample)
+    g4 = _read_gray(frame_paths[2], downsample)
+
+    scratch = np.empty_like(g0)
+    raw02 = per_gap(motion_score_between(g0, g2, scratch), scale02)
+    raw24 = per_gap(motion_score_between(g2, g4, scratch), scale24)
+
+    region_info = None
+    if region_aware:
+        s0, s2, s4 = (_pyr_down_to(g, REGION_MOTION_WIDTH) for g in (g0, g2, g4))
+        mask = overlay_mask if overlay_mask is not None else load_overlay_mask(s0.shape)
+        if mask is not None and mask.shape != s0.shape:
+            mask = cv2.resize(mask, (s0.shape[1], s0.shape[0]), interpolation=cv2.INTER_NEAREST)
+        m02 = compensated_motion(s0, s2, mask)
+        m24 = compensated_motion(s2, s4, mask)
+        r02, r24 = per_gap(m02["ratio"], scale02), per_gap(m24["ratio"], scale24)
+        region_info = {
+            "raw_pairwise_motion_ratio": {"t0_to_t2": round(raw02, 6), "t2_to_t4": round(raw24, 6)},
+            "camera_shift_px": {"t0_to_t2": m02["camera_shift_px"], "t2_to_t4": m24["camera_shift_px"]},
+            "region_motion_ratio": {
+                "t0_to_t2": {k: round(per_gap(v, scale02), 6) for k, v in m02["regions"].items()},
+                "t2_to_t4": {k: round(per_gap(v, scale24), 6) for k, v in m24["regions"].items()},
+            },
+            "overlay_mask_fraction": round(float(np.count_nonzero(mask)) / mask.size, 4) if mask is not None else 0.0,
+            "compensation_ms": round(m02["elapsed_ms"] + m24["elapsed_ms"], 2),
+        }
+    else:
+        r02, r24 = raw02, raw24
 
     motion_detected = (r02 > MOTION_RATIO_THRESHOLD) or (r24 > MOTION_RATIO_THRESHOLD)
 
+    a, b, c = (f"{t:g}" for t in frame_times)
     timing = "none"
     if motion_detected:
-        timing = "early_to_mid (0->2s)" if r02 >= r24 else "mid_to_late (2->4s)"
+        timing = f"early_to_mid ({a}->{b}s)" if r02 >= r24 else f"mid_to_late ({b}->{c}s)"
 
-    return {
-        "frame_times_sec": FRAME_TIMES_SEC,
-        "method": "opencv_absdiff_threshold",
+    out = {
+        "frame_times_sec": list(frame_times),
+        "method": "opencv_absdiff_threshold" + ("_camera_compensated_masked" if region_aware else ""),
+        "downsample": downsample,
         "thresholds": {
             "motion_ratio_threshold": MOTION_RATIO_THRESHOLD,
             "diff_threshold": DIFF_THRESHOLD
@@ -323,25 +1903,574 @@ def detect_motion_cv(frame_paths: List[Path]) -> Dict[str, Any]:
             "t0_to_t2": round(r02, 6),
             "t2_to_t4": round(r24, 6)
         },
+        "ratio_gap_sec": MOTION_RATIO_GAP_SEC,
         "motion_detected": bool(motion_detected),
         "timing_guess": timing
     }
+    if region_info:
+        out.update(region_info)
+    return out
+
+
+# ======================================================
+# Optical flow summary (sparse Lucas-Kanade)
+# ======================================================
+
+_LK_PARAMS = dict(
+    winSize=(21, 21),
+    maxLevel=3,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03),
+)
+
+def _direction(dx: float, dy: float) -> str:
+    if abs(dx) >= abs(dy):
+        return "right" if dx > 0 else "left"
+    return "down" if dy > 0 else "up"
+
+def _track_pair(a_gray, b_gray) -> Tuple[Any, Any]:
+    """Returns (start_points, displacement) for corners tracked a→b that pass a forward-backward check."""
+    pts = cv2.goodFeaturesToTrack(a_gray, maxCorners=FLOW_MAX_CORNERS, qualityLevel=0.01, minDistance=7)
+    if pts is None:
+        return np.empty((0, 2), np.float32), np.empty((0, 2), np.float32)
+    fwd, st1, _ = cv2.calcOpticalFlowPyrLK(a_gray, b_gray, pts, None, **_LK_PARAMS)
+    back, st2, _ = cv2.calcOpticalFlowPyrLK(b_gray, a_gray, fwd, None, **_LK_PARAMS)
+    fb_err = np.linalg.norm((pts - back).reshape(-1, 2), axis=1)
+    ok = (st1.ravel() == 1) & (st2.ravel() == 1) & (fb_err < FLOW_FB_MAX_ERR_PX)
+    p0 = pts.reshape(-1, 2)[ok]
+    return p0, fwd.reshape(-1, 2)[ok] - p0
+
+def _summarize_flow(p0, disp, width: int, height: int) -> Dict[str, Any]:
+    if len(p0) == 0:
+        return {"tracked_points": 0, "moving_points": 0, "camera_shift_frac": [0.0, 0.0], "sides": {}, "regions": {}}
+
+    # Median displacement ≈ camera pan; what is left over is player motion
+    camera = np.median(disp, axis=0)
+    resid = (disp - camera) / float(width)
+    mag = np.linalg.norm(resid, axis=1)
+    moving = mag >= FLOW_MIN_DISP_FRAC
+
+    def group(sel) -> Dict[str, Any]:
+        m = sel & moving
+        if not m.any():
+            return {"moving": 0, "share": 0.0}
+        mean = resid[m].mean(axis=0)
+        return {
+            "moving": int(m.sum()),
+            "share": round(float(m.sum()) / max(1, int(sel.sum())), 3),
+            "direction": _direction(float(mean[0]), float(mean[1])),
+            "magnitude": round(float(mag[m].mean()), 4),
+        }
+
+    x, y = p0[:, 0], p0[:, 1]
+    return {
+        "tracked_points": int(len(p0)),
+        "moving_points": int(moving.sum()),
+        "camera_shift_frac": [round(float(camera[0]) / width, 4), round(float(camera[1]) / width, 4)],
+        "sides": {"left": group(x < width / 2), "right": group(x >= width / 2)},
+        "regions": {
+            "left": group(x < width / 3),
+            "center": group((x >= width / 3) & (x < 2 * width / 3)),
+            "right": group(x >= 2 * width / 3),
+            "top": group(y < height / 3),
+            "bottom": group(y >= 2 * height / 3),
+        },
+    }
+
+def optical_flow_summary(frame_paths: List[Union[Path, InMemoryFrame]],
+                         downsample: int = MOTION_DOWNSAMPLE) -> Dict[str, Any]:
+    """
+    Tracks corners across the sampled frames and summarizes which screen side
+    and region moved, in which direction and how far (fraction of frame width).
+    """
+    started = time.perf_counter()
+    grays = [_pyr_down_to(_read_gray(p, downsample), FLOW_WIDTH) for p in frame_paths[:3]]
+    h, w = grays[0].shape
+    pairs = {}
+    for key, (a, b) in zip(("t0_to_t2", "t2_to_t4"), ((grays[0], grays[1]), (grays[1], grays[2]))):
+        p0, disp = _track_pair(a, b)
+        pairs[key] = _summarize_flow(p0, disp, w, h)
+
+    # Dominant mover across both pairs: the side with the most moving points
+    best = None
+    for key, summ in pairs.items():
+        for side, g in summ["sides"].items():
+            if g["moving"] and (best is None or g["moving"] > best["moving_points"]):
+                best = {"pair": key, "side": side, "direction": g["direction"],
+                        "magnitude": g["magnitude"], "moving_points": g["moving"]}
+
+    return {
+        "method": "lucas_kanade_sparse",
+        "pairs": pairs,
+        "dominant": best,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 2),
+    }
+
+def describe_flow(flow: Optional[Dict[str, Any]], off_def: Dict[str, Any]) -> str:
+    """One-line text for the RAG query, naming offense/defense instead of screen sides when known."""
+    if not flow or not flow.get("dominant"):
+        return "no tracked player movement"
+    unit_by_side = {off_def.get("offense_side"): "offense", off_def.get("defense_side"): "defense"}
+    parts = []
+    for key, summ in flow["pairs"].items():
+        for side, g in summ["sides"].items():
+            if g["moving"]:
+                who = unit_by_side.get(side, f"{side} side")
+                parts.append(f"{key}: {who} moved {g['direction']} (mag {g['magnitude']}, share {g['share']})")
+    return "; ".join(parts) or "no tracked player movement"
+
+
+# ======================================================
+# Region-aware motion (camera compensation + overlay mask)
+# ======================================================
+
+def _pyr_down_to(gray, max_width: int):
+    while gray.shape[1] > max_width:
+        gray = cv2.pyrDown(gray)
+    return gray
+
+def estimate_camera_shift(a_gray, b_gray) -> Tuple[float, float, float]:
+    """Global (dx, dy) of b relative to a via phase correlation on a <=CAMERA_ESTIMATE_WIDTH copy."""
+    small_a = _pyr_down_to(a_gray, CAMERA_ESTIMATE_WIDTH)
+    small_b = _pyr_down_to(b_gray, CAMERA_ESTIMATE_WIDTH)
+    scale = a_gray.shape[1] / small_a.shape[1]
+    (dx, dy), response = cv2.phaseCorrelate(small_a.astype(np.float32), small_b.astype(np.float32))
+    return dx * scale, dy * scale, response
+
+def _masked_motion(a_gray, b_gray, valid) -> Tuple[Any, float]:
+    thr = cv2.absdiff(a_gray, b_gray)
+    cv2.threshold(thr, DIFF_THRESHOLD, 255, cv2.THRESH_BINARY, dst=thr)
+    cv2.bitwise_and(thr, valid, dst=thr)
+    denom = cv2.countNonZero(valid)
+    return thr, (float(cv2.countNonZero(thr)) / denom if denom else 0.0)
+
+def compensated_motion(a_gray, b_gray, overlay_mask: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Motion ratio after aligning b onto a (undoing a camera pan) and dropping
+    overlay pixels; also returns per-region ratios over REGION_GRID.
+    The alignment is only kept when it explains the change (lowers the ratio),
+    so players moving together are not mistaken for a pan.
+    """
+    started = time.perf_counter()
+    h, w = a_gray.shape
+    valid = np.full((h, w), 255, np.uint8)
+    if overlay_mask is not None:
+        valid[overlay_mask > 0] = 0
+    thr, ratio = _masked_motion(a_gray, b_gray, valid)
+
+    dx, dy, response = estimate_camera_shift(a_gray, b_gray)
+    compensated = False
+    if (dx * dx + dy * dy) ** 0.5 >= CAMERA_SHIFT_MIN_PX and response >= CAMERA_MIN_RESPONSE:
+        shift_back = np.float32([[1, 0, -dx], [0, 1, -dy]])
+        b_aligned = cv2.warpAffine(b_gray, shift_back, (w, h), flags=cv2.INTER_LINEAR, borderValue=0)
+        # Pixels shifted in from outside the frame carry no information
+        valid_aligned = cv2.warpAffine(valid, shift_back, (w, h), flags=cv2.INTER_NEAREST, borderValue=0)
+        thr_aligned, ratio_aligned = _masked_motion(a_gray, b_aligned, valid_aligned)
+        if ratio_aligned < ratio:
+            thr, ratio, valid, compensated = thr_aligned, ratio_aligned, valid_aligned, True
+
+    rows, cols = REGION_GRID
+    regions = {}
+    for r in range(rows):
+        for c in range(cols):
+            ys, xs = slice(r * h // rows, (r + 1) * h // rows), slice(c * w // cols, (c + 1) * w // cols)
+            denom = cv2.countNonZero(valid[ys, xs])
+            regions[f"r{r}c{c}"] = round(cv2.countNonZero(thr[ys, xs]) / denom, 6) if denom else 0.0
+
+    return {
+        "ratio": ratio,
+        "camera_shift_px": [round(dx, 2), round(dy, 2)] if compensated else [0.0, 0.0],
+        "regions": regions,
+        "elapsed_ms": (time.perf_counter() - started) * 1000.0,
+    }
+
+class OverlayMaskLearner:
+    """
+    Learns broadcast overlays (score bug, network logo) from one frame per clip:
+    across different plays the field content changes but overlay pixels do not,
+    so low per-pixel std over many clips marks the overlay.
+    """
+
+    def __init__(self, n: int = 0, mean: Optional[Any] = None, m2: Optional[Any] = None):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def add(self, gray) -> None:
+        # Model is kept at SCAN_SIZE so clips of any resolution accumulate together
+        x = cv2.resize(gray, SCAN_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+        if self.mean is None or self.mean.shape != x.shape:
+            self.n, self.mean, self.m2 = 0, np.zeros_like(x), np.zeros_like(x)
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def mask(self) -> Optional[Any]:
+        if self.n < OVERLAY_MIN_CLIPS:
+            return None
+        std = np.sqrt(self.m2 / (self.n - 1))
+        m = (std < OVERLAY_MAX_STD).astype(np.uint8) * 255
+        m = cv2.morphologyEx(m, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+        m = cv2.dilate(m, np.ones((5, 5), np.uint8))
+        if np.count_nonzero(m) / m.size > OVERLAY_MAX_FRACTION:
+            return None
+        return m
+
+    def save(self, path: Path) -> None:
+        with atomic_write(path) as f:
+            np.savez_compressed(f, n=self.n, mean=self.mean, m2=self.m2)
+
+    @classmethod
+    def load(cls, path: Path) -> "OverlayMaskLearner":
+        try:
+            with np.load(path) as data:
+                return cls(int(data["n"]), data["mean"], data["m2"])
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return cls()
+
+_overlay_lock = threading.Lock()
+_overlay_mask_cache: Dict[str, Any] = {"mtime": None, "mask": None}
+
+def load_overlay_mask(shape: Tuple[int, int]) -> Optional[Any]:
+    path = Path(OVERLAY_MASK_PATH)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    with _overlay_lock:
+        if _overlay_mask_cache["mtime"] != mtime:
+            _overlay_mask_cache.update(mtime=mtime, mask=OverlayMaskLearner.load(path).mask())
+        mask = _overlay_mask_cache["mask"]
+    if mask is None:
+        return None
+    if mask.shape != tuple(shape):
+        mask = cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+    return mask
+
+def update_overlay_model(frame_path: Union[Path, InMemoryFrame], downsample: int = MOTION_DOWNSAMPLE) -> None:
+    """Adds this clip's first frame to the persisted overlay model."""
+    gray = _read_gray(frame_path, downsample)
+    with _overlay_lock:
+        learner = OverlayMaskLearner.load(Path(OVERLAY_MASK_PATH))
+        learner.add(gray)
+        learner.save(Path(OVERLAY_MASK_PATH))
+
+def learn_overlay_mask(frame_paths: List[Path], downsample: int = MOTION_DOWNSAMPLE) -> Optional[Any]:
+    """Builds an overlay mask from a batch of frames (one per clip) and persists the model."""
+    learner = OverlayMaskLearner()
+    for p in frame_paths:
+        learner.add(_read_gray(p, downsample))
+    with _overlay_lock:
+        learner.save(Path(OVERLAY_MASK_PATH))
+    return learner.mask()
+
+
+# ======================================================
+# Low-res scan (field view, set → snap detection)
+# ======================================================
+
+def _ffmpeg_gray_frames(
+    video: str,
+    fps: float = SCAN_FPS,
+    size: Tuple[int, int] = SCAN_SIZE,
+    max_sec: Optional[float] = None,
+) -> Iterator[Tuple[float, Any]]:
+    """Yields (t_sec, gray_frame) from a single ffmpeg decode, one frame in memory at a time."""
+    w, h = size
+    frame_bytes = w * h
+    cmd = ["ffmpeg", "-v", "error"]
+    if max_sec is not None:
+        cmd += ["-t", str(max_sec)]
+    cmd += [
+        "-i", video,
+        "-vf", f"fps={fps},scale={w}:{h},format=gray",
+        "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1",
+    ]
+    child = _MeasuredChild(cmd, subprocess.PIPE, bufsize=frame_bytes * 4)
+    try:
+        idx = 0
+        while True:
+            buf = child.proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            yield idx / fps, np.frombuffer(buf, dtype=np.uint8).reshape(h, w)
+            idx += 1
+    finally:
+        child.proc.stdout.close()
+        child.kill()
+        child.finish()
+
+def count_field_lines(gray) -> int:
+    edges = cv2.Canny(gray, 60, 160)
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=40,
+                            minLineLength=gray.shape[1] // 4, maxLineGap=8)
+    return 0 if lines is None else len(lines)
+
+class SnapTracker:
+    """
+    Set → snap state machine over consecutive frame-to-frame motion ratios.
+    update() returns True on the frame where a snap ends a long enough set phase;
+    `set_start` then holds the time the offense got set.
+    """
+
+    def __init__(self, set_max_ratio: float = SET_MAX_RATIO, set_min_sec: float = SET_MIN_SEC,
+                 snap_min_ratio: float = SNAP_MIN_RATIO):
+        self.set_max_ratio = set_max_ratio
+        self.set_min_sec = set_min_sec
+        self.snap_min_ratio = snap_min_ratio
+        self.still_since: Optional[float] = None
+        self.set_start: Optional[float] = None
+
+    def reset(self) -> None:
+        self.still_since = None
+
+    def update(self, t: float, ratio: float, field_visible: bool = True) -> bool:
+        if ratio <= self.set_max_ratio and field_visible:
+            if self.still_since is None:
+                self.still_since = t
+            return False
+        snap = (
+            self.still_since is not None
+            and t - self.still_since >= self.set_min_sec
+            and ratio >= self.snap_min_ratio
+        )
+        if snap:
+            self.set_start = self.still_since
+        self.still_since = None
+        return snap
+
+def probe_duration_sec(video: str) -> Optional[float]:
+    cap = cv2.VideoCapture(video)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        n = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return float(n / fps) if fps and n else None
+    finally:
+        cap.release()
+
+def select_clip_window(video: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """
+    Scores the first ADAPTIVE_SCAN_SEC of the video (motion energy + field
+    lines) and returns the set → snap window to send. Falls back to the fixed
+    CLIP_START_SEC/CLIP_DURATION_SEC window when no snap is found.
+    """
+    scored = []  # (t, motion_ratio, field_lines); bounded by the scan length
+    prev = None
+    scratch = None
+    budget_end = time.monotonic() + deadline.stage_budget("select_window") if deadline else None
+    for t, gray in iter_gray_frames(video, max_sec=ADAPTIVE_SCAN_SEC, deadline=deadline):
+        if deadline is not None:
+            # Leaving the loop closes the generator, which kills the decoding ffmpeg
+            deadline.check("select_window")
+            if time.monotonic() >= budget_end:
+                raise DeadlineExceeded(f"select_window exceeded its {STAGE_BUDGET_SEC['select_window']}s budget")
+        blurred = cv2.GaussianBlur(gray, BLUR_KERNEL, 0)
+        if prev is not None:
+            scratch = np.empty_like(gray) if scratch is None else scratch
+            scored.append((t, motion_score_between(prev, blurred, scratch), count_field_lines(gray)))
+        prev = blurred
+
+    # Only gate on field lines if the footage shows them at all
+    use_field = any(lines >= FIELD_MIN_LINES for _, _, lines in scored)
+    tracker = SnapTracker()
+    for t, ratio, lines in scored:
+        if tracker.update(t, ratio, lines >= FIELD_MIN_LINES or not use_field):
+            end = t + ADAPTIVE_POST_SNAP_SEC
+            start = max(0.0, tracker.set_start - ADAPTIVE_PRE_SET_SEC, end - CLIP_DURATION_SEC)
+            start = max(0.0, min(start, end - ADAPTIVE_MIN_SEC))
+            return {
+                "method": "adaptive_set_snap",
+                "start": round(start, 2),
+                "duration": round(end - start, 2),
+                "set_start_sec": round(tracker.set_start, 2),
+                "snap_sec": round(t, 2),
+                "field_gate": use_field,
+            }
+
+    return {
+        "method": "fixed",
+        "start": CLIP_START_SEC,
+        "duration": CLIP_DURATION_SEC,
+        "reason": "no set/snap phase found in scan",
+        "field_gate": use_field,
+    }
+
+def frame_times_for_window(duration: float) -> List[float]:
+    if duration > FRAME_TIMES_SEC[-1]:
+        return list(FRAME_TIMES_SEC)
+    # Short window: spread the three frames evenly over it
+    return [0, round(duration / 3, 2), round(2 * duration / 3, 2)]
+
+
+# ======================================================
+# Visual RAG (formation descriptors)
+# ======================================================
+
+_BLOB_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9))
+_THIN_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+def _grid_vector(mask, weight: float) -> Any:
+    g = cv2.resize(mask, (FORMATION_GRID[1], FORMATION_GRID[0]), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    g -= g.mean()
+    norm = float(np.linalg.norm(g))
+    return g * (weight / norm) if norm else g
+
+def formation_descriptor(frame: Union[Path, InMemoryFrame]) -> Any:
+    """
+    Compact pre-snap layout of one frame, as a unit float32 vector: player-blob
+    and edge occupancy on a coarse grid. The grid is centered on the blobs'
+    centroid, so a camera pan moves the layout only a fraction of a cell.
+    """
+    small = _pyr_down_to(_read_gray(frame), FORMATION_WIDTH)
+    # Players: small blobs brighter or darker than their surroundings; yard lines are too thin to survive the open
+    blobs = cv2.add(cv2.morphologyEx(small, cv2.MORPH_TOPHAT, _BLOB_KERNEL),
+                    cv2.morphologyEx(small, cv2.MORPH_BLACKHAT, _BLOB_KERNEL))
+    _, blobs = cv2.threshold(blobs, 30, 255, cv2.THRESH_BINARY)
+    blobs = cv2.morphologyEx(blobs, cv2.MORPH_OPEN, _THIN_KERNEL)
+    edges = cv2.Canny(small, 60, 160)
+
+    h, w = small.shape
+    m = cv2.moments(blobs, binaryImage=True)
+    cx, cy = (int(m["m10"] / m["m00"]), int(m["m01"] / m["m00"])) if m["m00"] else (w // 2, h // 2)
+    hw, hh = int(w * 0.3), int(h * 0.25)
+
+    def crop(mask):
+        padded = cv2.copyMakeBorder(mask, hh, hh, hw, hw, cv2.BORDER_CONSTANT, value=0)
+        return padded[cy:cy + 2 * hh, cx:cx + 2 * hw]
+
+    v = np.concatenate([_grid_vector(crop(blobs), 1.0), _grid_vector(crop(edges), FORMATION_EDGE_WEIGHT)])
+    norm = float(np.linalg.norm(v))
+    return (v / norm if norm else v).astype(np.float32)
+
+class VisualIndex:
+    """
+    Formation descriptors of analyzed clips in one contiguous float32 (N, D)
+    array, plus the RAG example each row stands for. Rows are unit vectors, so
+    a search is one matrix-vector product and an argpartition.
+    """
+
+    def __init__(self, vectors: Optional[Any] = None, entries: Optional[List[Dict[str, Any]]] = None):
+        self.vectors = vectors if vectors is not None else np.zeros((0, 2 * FORMATION_GRID[0] * FORMATION_GRID[1]), dtype=np.float32)
+        self.entries = entries or []
+
+    def search(self, descriptor: Any, top_k: int = VISUAL_TOP_K, min_similarity: float = VISUAL_MIN_SIMILARITY,
+               exclude_digest: Optional[str] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Up to top_k (entry, cosine similarity) pairs at or above min_similarity,
+        most similar first. Rows from the clip with `exclude_digest` never match:
+        a clip's own earlier run is not an example for it.
+        """
+        if top_k < 1 or not len(self.entries) or self.vectors.shape[1] != len(descriptor):
+            return []
+        sims = self.vectors @ descriptor
+        if exclude_digest:
+            sims[[e["metadata"].get("video_sha256") == exclude_digest for e in self.entries]] = -np.inf
+        k = min(top_k, len(sims))
+        best = np.argpartition(-sims, k - 1)[:k]
+        best = best[np.argsort(-sims[best])]
+        return [(self.entries[i], float(sims[i])) for i in best if sims[i] >= min_similarity]
+
+    def add(self, descriptor: Any, entry: Dict[str, Any]) -> None:
+        self.vectors = np.ascontiguousarray(np.vstack([self.vectors, descriptor[None, :].astype(np.float32)]))
+        self.entries.append(entry)
+
+    def save(self, path: Path) -> None:
+        with atomic_write(path) as f:
+            np.savez(f, vectors=self.vectors, entries=np.array(json.dumps(self.entries)))
+
+    @classmethod
+    def load(cls, path: Path) -> "VisualIndex":
+        try:
+            with np.load(path) as data:
+                return cls(data["vectors"], json.loads(str(data["entries"])))
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return cls()
+
+_visual_lock = threading.Lock()
+_visual_index_cache: Dict[str, Any] = {"key": None, "index": None}
+
+def load_visual_index() -> VisualIndex:
+    """The on-disk index, re-read only when the file changes."""
+    path = Path(VISUAL_INDEX_PATH)
+    try:
+        key = (str(path), path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return VisualIndex()
+    with _visual_lock:
+        if _visual_index_cache["key"] != key:
+            _visual_index_cache.update(key=key, index=VisualIndex.load(path))
+        return _visual_index_cache["index"]
+
+def run_rag_document(combined: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A finished run as a RAG example: id, JSON document in a shape
+    extract_play_candidates_from_rag reads, and flat metadata Chroma accepts.
+    """
+    meta = combined["meta"]
+    off_def = combined["stage1_offense_defense"]
+    motion_cv = combined["stage2_motion_cv"]
+    doc = {
+        "clip": meta["video_name"],
+        "run_id": meta["run_id"],
+        "offense_defense": {k: off_def.get(k) for k in
+                            ("offense_side", "defense_side", "offense_jersey_color", "defense_jersey_color")},
+        "motion": {k: motion_cv.get(k) for k in ("motion_detected", "timing_guess", "pairwise_motion_ratio")},
+        "play_predictions": [{"play": p} for p in run_labels(combined)],
+        "final_paragraph": combined["final_paragraph"],
+    }
+    return {
+        "id": f"{safe_slug(meta['video_name'])}__{meta['run_id']}",
+        "document": json.dumps(doc),
+        "metadata": {"video": Path(meta["input_video"]).name, "video_sha256": meta.get("video_sha256", ""),
+                     "run_id": meta["run_id"], "source": "fieldhouse_run"},
+    }
+
+def run_labels(combined: Dict[str, Any]) -> List[str]:
+    """
+    Ranked plays a run answered with: the FAST_MODEL first pass, and only when
+    routing accepted it (an escalated run's first pass was rejected; the final
+    paragraph has no structured plays). These are model output, not verified
+    labels.
+    """
+    routing = combined["meta"].get("routing") or {}
+    if routing.get("use_final_model", True):
+        return []
+    return list(routing.get("first_pass_ranked_plays") or [])
+
+def indexable_run(combined: Dict[str, Any]) -> bool:
+    """
+    Clean runs with an accepted answer may become similarity examples; degraded or
+    unlabeled runs never do. Their plays are unverified, so routing does not count
+    them as RAG agreement (see RAG_VERIFIED_SOURCES).
+    """
+    return not combined["meta"].get("degraded") and bool(run_labels(combined))
+
+def add_visual_example(descriptor: Any, combined: Dict[str, Any]) -> None:
+    with _visual_lock:
+        index = VisualIndex.load(Path(VISUAL_INDEX_PATH))
+        index.add(descriptor, run_rag_document(combined))
+        index.save(Path(VISUAL_INDEX_PATH))
+
+def retrieve_visual_examples(descriptor: Any, top_k: int = VISUAL_TOP_K,
+                             exclude_digest: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Past runs of other clips whose frame-0 formation looks like this one, shaped like the Chroma results."""
+    return [{**entry, "distance": round(1.0 - sim, 4), "source": "visual"}
+            for entry, sim in load_visual_index().search(descriptor, top_k, exclude_digest=exclude_digest)]
 
 
 # ======================================================
 # Chroma RAG
 # ======================================================
 
-def get_collection():
+def get_collection(name: Optional[str] = None):
     db = chromadb.PersistentClient(
         path=CHROMA_DIR,
         settings=Settings(anonymized_telemetry=False),
     )
     # get_or_create avoids crashing if name mismatch
-    return db.get_or_create_collection(COLLECTION_NAME)
+    return db.get_or_create_collection(name or COLLECTION_NAME)
 
-def embed_query_text(text: str) -> List[float]:
-    res = get_client().models.embed_content(model=EMBED_MODEL, contents=text)
+def embed_query_text(text: str, timeout_sec: Optional[float] = None) -> List[float]:
+    config = types.EmbedContentConfig(http_options=types.HttpOptions(timeout=int(timeout_sec * 1000))) if timeout_sec else None
+    res = get_client().models.embed_content(model=EMBED_MODEL, contents=text, config=config)
 
     # SDK variants
     if hasattr(res, "embeddings") and res.embeddings:
@@ -363,12 +2492,89 @@ def build_rag_query(off_def: Dict[str, Any], motion_cv: Dict[str, Any]) -> str:
         f"offense_color={off_def.get('offense_jersey_color')}, defense_color={off_def.get('defense_jersey_color')}\n"
         f"motion_detected={motion_cv.get('motion_detected')}, timing={motion_cv.get('timing_guess')}\n"
         f"motion_ratios={motion_cv.get('pairwise_motion_ratio')}\n"
+        f"player_flow={describe_flow(motion_cv.get('optical_flow'), off_def)}\n"
     )
 
-def retrieve_rag_examples(off_def: Dict[str, Any], motion_cv: Dict[str, Any], top_k: int = TOP_K) -> List[Dict[str, Any]]:
+def mmr_select(query: Any, embeddings: Any, k: int, lam: float) -> List[int]:
+    """
+    Maximal marginal relevance: repeatedly takes the candidate with the best
+    lam * sim(query) - (1 - lam) * max sim(already taken), on cosine similarity.
+    All pairwise similarities come from one matrix product up front.
+    """
+    e = np.asarray(embeddings, dtype=np.float32)
+    e = e / np.maximum(np.linalg.norm(e, axis=1, keepdims=True), 1e-12)
+    q = np.asarray(query, dtype=np.float32)
+    relevance = e @ (q / max(float(np.linalg.norm(q)), 1e-12))
+    pairwise = e @ e.T
+
+    picked = [int(np.argmax(relevance))]
+    redundancy = pairwise[picked[0]].copy()
+    for _ in range(min(k, len(e)) - 1):
+        score = lam * relevance - (1.0 - lam) * redundancy
+        score[picked] = -np.inf
+        i = int(np.argmax(score))
+        picked.append(i)
+        np.maximum(redundancy, pairwise[i], out=redundancy)
+    return picked
+
+def rank_rag_results(query: Any, embeddings: Any, top_k: int, policy: Optional[str] = None) -> List[int]:
+    """Indices of the fetched results (in Chroma's distance order) to keep, best first."""
+    policy = policy or RAG_RERANK
+    if policy == "mmr" and len(embeddings) > top_k:
+        return mmr_select(query, embeddings, top_k, RAG_MMR_LAMBDA)
+    return list(range(min(top_k, len(embeddings))))  # "distance"
+
+def _chroma_examples(col: Any, qemb: List[float], top_k: int, source: str,
+                     exclude_digest: Optional[str], trace: Optional[RunTrace]) -> List[Dict[str, Any]]:
+    """One collection's top_k, reranked per RAG_RERANK, without hits from the clip being analyzed."""
+    rerank = RAG_RERANK == "mmr"
+    fetch_k = top_k * RAG_FETCH_MULTIPLIER if rerank or exclude_digest else top_k
+    with trace_span(trace, "rag.chroma_query" if source == "text" else f"rag.{source}_query", top_k=top_k, fetched=fetch_k):
+        res = col.query(
+            query_embeddings=[qemb],
+            n_results=fetch_k,
+            include=["documents", "metadatas", "distances"] + (["embeddings"] if rerank else [])
+        )
+
+    ids = res.get("ids", [[]])[0]                 # IDs are ALWAYS returned
+    docs = res.get("documents", [[]])[0]
+    metas = res.get("metadatas", [[]])[0]
+    dists = res.get("distances", [[]])[0]
+    embs = (res.get("embeddings") or [None])[0] if rerank else None
+
+    # A clip's own earlier runs are not examples for it
+    keep = [i for i in range(len(ids)) if not exclude_digest or (metas[i] or {}).get("video_sha256") != exclude_digest]
+    with trace_span(trace, "rag.rerank", policy=RAG_RERANK, candidates=len(keep)):
+        if embs is not None:
+            order = [keep[j] for j in rank_rag_results(qemb, [embs[i] for i in keep], top_k)]
+        else:
+            order = keep[:top_k]
+
+    return [{
+        "id": ids[i],
+        "distance": dists[i],
+        "metadata": metas[i],
+        "document": docs[i],  # stored JSON string
+        "source": source,
+    } for i in order]
+
+def retrieve_rag_examples(off_def: Dict[str, Any], motion_cv: Dict[str, Any], top_k: int = TOP_K,
+                          trace: Optional[RunTrace] = None, deadline: Optional[Deadline] = None,
+                          descriptor: Optional[Any] = None, exclude_digest: Optional[str] = None
+                          ) -> List[Dict[str, Any]]:
+    """
+    The curated collection's top_k by text-summary embedding, up to RAG_RUNS_TOP_K
+    written-back runs, then (when a formation descriptor is given) past runs of
+    other clips that look alike but were not already returned; `exclude_digest`
+    is this clip's sha256 and drops its own runs from every path.
+    Each example says which path found it ("text", "run", "visual");
+    rag.embed / rag.chroma_query / rag.run_query / rag.visual_query spans time each path.
+    """
+    deadline_check(deadline, "rag")
     col = get_collection()
     qtext = build_rag_query(off_def, motion_cv)
-    qemb = embed_query_text(qtext)
+    with trace_span(trace, "rag.embed", model=EMBED_MODEL, bytes_sent=len(qtext.encode("utf-8"))):
+        qemb = embed_query_text(qtext, deadline.stage_budget("rag") if deadline else None)
 
     # res = col.query(
     #     query_embeddings=[qemb],
@@ -382,132 +2588,965 @@ def retrieve_rag_examples(off_def: Dict[str, Any], motion_cv: Dict[str, Any], to
     # dists = res.get("distances", [[]])[0]
 
 
-    res = col.query(
-    query_embeddings=[qemb],
-    n_results=top_k,
-    include=["documents", "metadatas", "distances"]
-)
+    deadline_check(deadline, "rag")
+    out = _chroma_examples(col, qemb, top_k, "text", exclude_digest, trace)
+    if RAG_RUNS_TOP_K > 0:
+        # Written-back runs live in their own collection; a few of them join the curated hits
+        deadline_check(deadline, "rag")
+        seen = {ex["id"] for ex in out}
+        runs = _chroma_examples(get_collection(RAG_WRITEBACK_COLLECTION), qemb, RAG_RUNS_TOP_K, "run",
+                                exclude_digest, trace)
+        out += [ex for ex in runs if ex["id"] not in seen]
+
+    if descriptor is not None:
+        with trace_span(trace, "rag.visual_query", top_k=VISUAL_TOP_K) as sp:
+            seen = {ex["id"] for ex in out}
+            visual = [ex for ex in retrieve_visual_examples(descriptor, exclude_digest=exclude_digest)
+                      if ex["id"] not in seen]
+            sp["hits"] = len(visual)
+        out += visual
+    return out
 
-    ids = res.get("ids", [[]])[0]                 # IDs are ALWAYS returned
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
-    dists = res.get("distances", [[]])[0]
 
-    out = []
-    for i in range(len(ids)):
-        out.append({
-            "id": ids[i],
-            "distance": dists[i],
-            "metadata": metas[i],
-            "document": docs[i],  # stored JSON string
+# ======================================================
+# RAG write-back (background indexer)
+# ======================================================
+
+def embed_texts(texts: List[str], timeout_sec: Optional[float] = None) -> List[List[float]]:
+    """One embed_content call for a batch of texts, vectors in input order."""
+    config = types.EmbedContentConfig(http_options=types.HttpOptions(timeout=int(timeout_sec * 1000))) if timeout_sec else None
+    res = get_client().models.embed_content(model=EMBED_MODEL, contents=texts, config=config)
+    embs = getattr(res, "embeddings", None) or []
+    if len(embs) != len(texts):
+        raise RuntimeError(f"Expected {len(texts)} embeddings, got {len(embs)}")
+    return [list(e.values) for e in embs]
+
+class RagIndexer:
+    """
+    Moves finished runs into the Chroma collection off the request path.
+
+    submit() appends the run's RAG document to a JSONL spool and puts it on a
+    bounded queue; nothing else happens on the caller's thread. A daemon worker
+    takes up to `batch_size` runs (waiting at most `linger_sec` for a batch to
+    fill), embeds them in one call, upserts them in one call and then drops them
+    from the spool. Ids are stable, so replaying an item is harmless:
+    - On start, whatever the spool still holds (a crash, a failed batch) is queued again.
+    - When the queue is full, the run stays in the spool only; the worker reloads
+      the spool once it has drained the queue.
+    Freshness is the seconds from submit() until the run is queryable.
+    """
+
+    def __init__(self, max_queue: int = RAG_WRITEBACK_QUEUE_MAX, batch_size: int = RAG_WRITEBACK_BATCH,
+                 linger_sec: float = RAG_WRITEBACK_LINGER_SEC):
+        self.batch_size = batch_size
+        self.linger_sec = linger_sec
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()          # spool file + bookkeeping below
+        self._queued_ids: set = set()
+        self._spooled = 0
+        self._reload = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"indexed": 0, "last_freshness_sec": None, "max_freshness_sec": 0.0}
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="rag-indexer", daemon=True)
+            self._reload = True  # pick up what a previous process left in the spool
+        self._thread.start()
+
+    def submit(self, combined: Dict[str, Any]) -> None:
+        meta = combined["meta"]
+        item = {
+            **run_rag_document(combined),
+            "embed_text": build_rag_query(combined["stage1_offense_defense"], combined["stage2_motion_cv"]),
+            "queued_at": time.time(),
+        }
+        with self._lock:
+            with open(RAG_SPOOL_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(item) + "\n")
+            self._spooled += 1
+            self._enqueue(item)
+        self.start()
+        print(f"📥 Queued {meta['video_name']} for the RAG index")
+
+    def pending(self) -> int:
+        """Runs submitted (or left by a previous process) that are not in Chroma yet."""
+        return self._spooled
+
+    def _enqueue(self, item: Dict[str, Any]) -> None:
+        # Caller holds self._lock
+        if item["id"] in self._queued_ids:
+            return
+        try:
+            self._queue.put_nowait(item)
+            self._queued_ids.add(item["id"])
+        except queue.Full:
+            incr_counter("rag_writeback_overflow")
+            self._reload = True
+
+    def _read_spool(self) -> List[Dict[str, Any]]:
+        try:
+            lines = Path(RAG_SPOOL_PATH).read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return []
+        items = []
+        for line in lines:
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                continue  # torn last line from a crash mid-write
+        return items
+
+    def _reload_spool(self) -> None:
+        with self._lock:
+            self._reload = False
+            items = self._read_spool()
+            self._spooled = len(items)
+            for item in items:
+                self._enqueue(item)
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch = [self._queue.get()]
+        until = time.monotonic() + self.linger_sec
+        while len(batch) < self.batch_size:
+            left = until - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=left))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            if self._reload and self._queue.empty():
+                self._reload_spool()
+            batch = self._take_batch()
+            try:
+                self._index(batch)
+            except Exception as e:
+                incr_counter("rag_writeback_failures")
+                print(f"⚠️  RAG write-back of {len(batch)} runs failed, kept in spool: {str(e)[:200]}")
+                with self._lock:
+                    self._queued_ids.difference_update(it["id"] for it in batch)
+                    self._reload = True
+                time.sleep(RAG_WRITEBACK_RETRY_SEC)
+
+    def _index(self, batch: List[Dict[str, Any]]) -> None:
+        embeddings = embed_texts([it["embed_text"] for it in batch])
+        get_collection(RAG_WRITEBACK_COLLECTION).upsert(
+            ids=[it["id"] for it in batch],
+            documents=[it["document"] for it in batch],
+            metadatas=[it["metadata"] for it in batch],
+            embeddings=embeddings,
+        )
+        now = time.time()
+        done = {it["id"] for it in batch}
+        with self._lock:
+            keep = [it for it in self._read_spool() if it["id"] not in done]
+            with atomic_write(RAG_SPOOL_PATH, "w", encoding="utf-8") as f:
+                f.write("".join(json.dumps(it) + "\n" for it in keep))
+            self._spooled = len(keep)
+            self._queued_ids -= done
+            freshness = max(now - it["queued_at"] for it in batch)
+            self.stats["indexed"] += len(batch)
+            self.stats["last_freshness_sec"] = round(freshness, 3)
+            self.stats["max_freshness_sec"] = round(max(self.stats["max_freshness_sec"], freshness), 3)
+        incr_counter("rag_writeback_indexed", len(batch))
+
+_rag_indexer = RagIndexer()
+
+def start_rag_indexer() -> None:
+    """Starts the write-back worker now, so runs a previous process left in the spool are indexed."""
+    _rag_indexer.start()
+
+def rag_indexer_stats() -> Dict[str, Any]:
+    return {**_rag_indexer.stats, "pending": _rag_indexer.pending()}
+
+
+# ======================================================
+# RAG play candidate extraction
+# ======================================================
+
+def _as_str(x: Any) -> str:
+    return str(x).strip()
+
+def parse_doc_json_maybe(doc: Any) -> Optional[Dict[str, Any]]:
+    """
+    docs are usually stored as JSON strings. Try to parse safely.
+    """
+    if doc is None:
+        return None
+    if isinstance(doc, dict):
+        return doc
+    if not isinstance(doc, str):
+        return None
+    s = doc.strip()
+    if not s:
+        return None
+    try:
+        return json.loads(s)
+    except Exception:
+        # Try extracting {...}
+        a, b = s.find("{"), s.rfind("}")
+        if a != -1 and b != -1 and b > a:
+            try:
+                return json.loads(s[a:b+1])
+            except Exception:
+                return None
+        return None
+
+def normalize_play_name(name: str) -> str:
+    name = name.strip()
+    name = " ".join(name.split())
+    return name
+
+def extract_play_candidates_from_rag(examples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Pulls potential play concepts out of stored JSONs.
+    Looks for:
+      - stage3_prediction.play_predictions[].play
+      - stage3_prediction.play_call
+      - play_call
+      - play_predictions[].play
+    Returns a de-duped list + a per-example breakdown for debugging.
+    """
+    candidates: List[str] = []
+    by_example: List[Dict[str, Any]] = []
+
+    verified: List[str] = []
+
+    for ex in examples:
+        doc = ex.get("document")
+        parsed = parse_doc_json_maybe(doc)
+        found: List[str] = []
+
+        if parsed:
+            # Common shapes you might have stored
+            # 1) combined_run.json style
+            for key in ["stage3_prediction", "stage3_prediction_json", "prediction", "final", "stage3"]:
+                if isinstance(parsed.get(key), dict):
+                    parsed = parsed[key]
+                    break
+
+            # Try play_predictions
+            pp = parsed.get("play_predictions")
+            if isinstance(pp, list):
+                for item in pp:
+                    if isinstance(item, dict) and item.get("play"):
+                        found.append(normalize_play_name(_as_str(item["play"])))
+
+            # Try play_call
+            if parsed.get("play_call"):
+                found.append(normalize_play_name(_as_str(parsed["play_call"])))
+
+            # Also handle nested in "stage3_prediction" if doc was full combined
+            if isinstance(parsed.get("stage3_prediction"), dict):
+                inner = parsed["stage3_prediction"]
+                if isinstance(inner.get("play_predictions"), list):
+                    for item in inner["play_predictions"]:
+                        if isinstance(item, dict) and item.get("play"):
+                            found.append(normalize_play_name(_as_str(item["play"])))
+                if inner.get("play_call"):
+                    found.append(normalize_play_name(_as_str(inner["play_call"])))
+
+        # De-dupe within example
+        found = [f for f in found if f]
+        found_unique = list(dict.fromkeys(found))
+
+        if found_unique:
+            candidates.extend(found_unique)
+            if ex.get("source", "text") in RAG_VERIFIED_SOURCES:
+                verified.extend(found_unique)
+
+        by_example.append({
+            "id": ex.get("id"),
+            "source": ex.get("source", "text"),
+            "distance": ex.get("distance"),
+            "found_play_candidates": found_unique
         })
-    return out
+
+    # Global de-dupe preserving order
+    candidates = [c for c in candidates if c]
+    unique_candidates = list(dict.fromkeys(candidates))
+
+    # If empty, at least provide a generic fallback list
+    used_fallback = not unique_candidates
+    if used_fallback:
+        unique_candidates = ["inside zone", "outside zone", "quick game", "play action", "dropback pass"]
+
+    return {
+        "unique_play_candidates": unique_candidates,
+        # Only curated examples may confirm a first pass; past runs' plays are the model's own guesses
+        "verified_play_candidates": list(dict.fromkeys(verified)),
+        "used_fallback": used_fallback,
+        "by_example": by_example
+    }
+
+
+# ======================================================
+# Tiered routing (cascade)
+# ======================================================
+
+class CascadeFirstPass(BaseModel):
+    ranked_plays: List[str] = Field(description="Top 3 play concepts, most likely first")
+    confidence: float = Field(ge=0.0, le=1.0)
+    paragraph: str
+
+def _play_key(name: str) -> str:
+    return normalize_play_name(name).lower()
+
+def route_final_stage(first_pass: CascadeFirstPass, rag_candidates: List[str], off_def: Dict[str, Any],
+                      rag_fallback: bool = False) -> Dict[str, Any]:
+    """
+    Decides whether the FAST_MODEL first pass is good enough or the
+    video-level FINAL_MODEL call is needed. Returns the decision + reasons.
+    `rag_candidates` must come from verified (curated) examples only, or the
+    model's past answers would vouch for its next ones.
+    """
+    reasons = []
+    if first_pass.confidence < CASCADE_MIN_CONFIDENCE:
+        reasons.append(f"confidence {first_pass.confidence:.2f} < {CASCADE_MIN_CONFIDENCE}")
+    if len(first_pass.ranked_plays) < 3:
+        reasons.append("fewer than 3 ranked plays")
+    if CASCADE_REQUIRE_RAG_AGREEMENT and rag_fallback:
+        # The generic list would make the agreement check pass trivially
+        reasons.append("no RAG play candidates (generic fallback list)")
+    elif CASCADE_REQUIRE_RAG_AGREEMENT and first_pass.ranked_plays:
+        known = {_play_key(c) for c in rag_candidates}
+        if _play_key(first_pass.ranked_plays[0]) not in known:
+            reasons.append("top play not among verified RAG candidates")
+    if CASCADE_REQUIRE_KNOWN_SIDES and "unknown" in (off_def.get("offense_side"), off_def.get("defense_side")):
+        reasons.append("offense/defense sides unknown")
+
+    return {
+        "use_final_model": bool(reasons),
+        "reasons": reasons,
+        "first_pass_confidence": first_pass.confidence,
+        "first_pass_ranked_plays": first_pass.ranked_plays,
+        "thresholds": {
+            "min_confidence": CASCADE_MIN_CONFIDENCE,
+            "require_rag_agreement": CASCADE_REQUIRE_RAG_AGREEMENT,
+            "require_known_sides": CASCADE_REQUIRE_KNOWN_SIDES,
+        },
+    }
+
+
+# ======================================================
+# Single-flight (coalesce concurrent analyses of the same clip)
+# ======================================================
+
+_digest_cache: Dict[Tuple[str, int, int], str] = {}
+
+def file_digest_cached(path: str) -> str:
+    """file_sha256, memoized on (path, size, mtime) so hot clips are hashed once."""
+    st = os.stat(path)
+    key = (str(path), st.st_size, st.st_mtime_ns)
+    digest = _digest_cache.get(key)
+    if digest is None:
+        digest = file_sha256(path)
+        _digest_cache[key] = digest
+    return digest
+
+def analysis_config_fingerprint() -> str:
+    """Everything that changes the answer for the same bytes; part of the single-flight key."""
+    cfg = {
+        "models": [FAST_MODEL, FINAL_MODEL, EMBED_MODEL],
+        "clip": [CLIP_PROFILE, ADAPTIVE_WINDOW_ENABLED, CLIP_START_SEC, CLIP_DURATION_SEC],
+        "cv": [MOTION_DOWNSAMPLE, MOTION_RATIO_GAP_SEC, REGION_MOTION_ENABLED, FLOW_ENABLED],
+        "cascade": [CASCADE_ENABLED, CASCADE_MIN_CONFIDENCE, CASCADE_REQUIRE_RAG_AGREEMENT, CASCADE_REQUIRE_KNOWN_SIDES],
+        "rag": [CHROMA_DIR, COLLECTION_NAME, TOP_K, RAG_RUNS_TOP_K, VISUAL_TOP_K if VISUAL_RAG_ENABLED else 0,
+                RAG_RERANK, RAG_MMR_LAMBDA, RAG_FETCH_MULTIPLIER],
+        "prompts": [_prompt_key(p) for p in (OFF_DEF_PROMPT, MASTER_PROMPT_WITH_RAG, CASCADE_FIRST_PASS_PROMPT)],
+    }
+    return hashlib.sha256(json.dumps(cfg, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+def analysis_key(video_path: str, kind: str = "pipeline", window: Optional[Dict[str, Any]] = None) -> str:
+    key = f"{kind}:{file_digest_cached(video_path)}:{analysis_config_fingerprint()}"
+    return f"{key}:{window['start']:g}+{window['duration']:g}" if window else key
+
+class _Flight:
+    def __init__(self, key: str):
+        self.key = key
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.refs = 0
+        self.cancel = threading.Event()
+        self.cond = threading.Condition()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+class SingleFlight:
+    """
+    In-flight deduplication: the first caller for a key starts `work(cancel_event)`
+    (a generator of events) on a background thread; concurrent callers with the same
+    key subscribe to the same run and get every event from the start.
+    Each subscriber holds a reference; when the last one leaves before the run
+    finishes, the cancel event is set and the run stops at its next check.
+    Finished runs are forgotten, so this never serves stale results.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def _join(self, key: str, work) -> _Flight:
+        with self._lock:
+            fl = self._flights.get(key)
+            leader = fl is None
+            if leader:
+                fl = self._flights[key] = _Flight(key)
+            else:
+                incr_counter("single_flight_coalesced")
+            fl.refs += 1
+        if leader:
+            threading.Thread(target=self._run, args=(fl, work), daemon=True, name=f"flight-{key[-8:]}").start()
+        return fl
+
+    def _run(self, fl: _Flight, work) -> None:
+        error = None
+        try:
+            for event in work(fl.cancel):
+                fl.publish(event)
+        except BaseException as e:
+            error = e
+        finally:
+            with self._lock:
+                if self._flights.get(fl.key) is fl:
+                    del self._flights[fl.key]
+            fl.finish(error)
+
+    def _release(self, fl: _Flight) -> None:
+        with self._lock:
+            fl.refs -= 1
+            if fl.refs == 0 and not fl.done:
+                # Nobody is waiting any more; stop the work and let the next caller start fresh
+                fl.cancel.set()
+                if self._flights.get(fl.key) is fl:
+                    del self._flights[fl.key]
+
+    def subscribe(self, key: str, work, abandon: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the run's events. Setting `abandon` (e.g. on client disconnect)
+        makes this subscriber stop waiting and drop its reference, even while
+        another thread is blocked inside the generator.
+        """
+        fl = self._join(key, work)
+        seen = 0
+        try:
+            while True:
+                with fl.cond:
+                    while seen >= len(fl.events) and not fl.done:
+                        if abandon is not None and abandon.is_set():
+                            raise AnalysisCancelled("caller went away")
+                        fl.cond.wait(CANCEL_POLL_SEC if abandon is not None else None)
+                    batch = fl.events[seen:]
+                    seen = len(fl.events)
+                    done, error = fl.done, fl.error
+                yield from batch
+                if done:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            self._release(fl)
+
+    def run(self, key: str, work, abandon: Optional[threading.Event] = None) -> Any:
+        """Blocking form for work that yields a single {"type": "done", "result": ...} event."""
+        result = None
+        for event in self.subscribe(key, work, abandon):
+            if event["type"] == "done":
+                result = event["result"]
+        return result
+
+_pipeline_flights = SingleFlight()
+
+
+# ======================================================
+# Perceptual fingerprints (near-duplicate clips)
+# ======================================================
+
+def phash64(gray) -> np.uint64:
+    """DCT perceptual hash: the 8x8 lowest frequencies against their median (DC excluded)."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = np.packbits(low > np.median(low[1:]))
+    return bits.view(">u8")[0].astype(np.uint64)
+
+def video_fingerprint(frames: List[Union[Path, InMemoryFrame]]) -> Any:
+    """One 64-bit pHash per sampled frame, from the gray buffers CV motion already decoded."""
+    return np.array([phash64(_read_gray(f)) for f in frames], dtype=np.uint64)
+
+def hamming_bits(codes: Any, fingerprint: Any) -> Any:
+    """Per-frame Hamming distances between each row of `codes` (N, F) and `fingerprint` (F,)."""
+    x = np.ascontiguousarray(codes ^ fingerprint)
+    return np.unpackbits(x.view(np.uint8), axis=1).reshape(len(x), -1, 64).sum(axis=2)
+
+class FingerprintIndex:
+    """
+    Bit-packed pHashes of analyzed clips (uint64 per sampled frame) plus where
+    each result lives, searched by brute-force Hamming distance. Thousands of
+    clips fit in tens of KB and one search is a single vectorized XOR/popcount.
+    """
+
+    def __init__(self, codes: Optional[Any] = None, entries: Optional[List[Dict[str, Any]]] = None):
+        self.codes = codes if codes is not None else np.zeros((0, len(FRAME_TIMES_SEC)), dtype=np.uint64)
+        self.entries = entries or []
+
+    def search(self, fingerprint: Any, config: str, max_bits: int = FINGERPRINT_MAX_BITS,
+               ttl_sec: Optional[float] = None) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Closest unexpired entry analyzed under the same config whose worst frame is within max_bits."""
+        if not len(self.entries) or self.codes.shape[1] != len(fingerprint):
+            return None
+        worst = hamming_bits(self.codes, fingerprint).max(axis=1)
+        oldest = time.time() - (FINGERPRINT_TTL_SEC if ttl_sec is None else ttl_sec)
+        worst[[e["config"] != config or e.get("added_at", 0) < oldest for e in self.entries]] = 65
+        i = int(np.argmin(worst))
+        return (self.entries[i], int(worst[i])) if worst[i] <= max_bits else None
+
+    def add(self, fingerprint: Any, entry: Dict[str, Any], ttl_sec: Optional[float] = None) -> None:
+        # Expired entries are dropped on write so the index stays small
+        oldest = time.time() - (FINGERPRINT_TTL_SEC if ttl_sec is None else ttl_sec)
+        keep = [i for i, e in enumerate(self.entries) if e.get("added_at", 0) >= oldest]
+        self.codes = np.vstack([self.codes[keep], fingerprint[None, :]])
+        self.entries = [self.entries[i] for i in keep] + [entry]
+
+    def save(self, path: Path) -> None:
+        with atomic_write(path) as f:
+            np.savez(f, codes=self.codes, entries=np.array(json.dumps(self.entries)))
+
+    @classmethod
+    def load(cls, path: Path) -> "FingerprintIndex":
+        try:
+            with np.load(path) as data:
+                return cls(data["codes"], json.loads(str(data["entries"])))
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return cls()
+
+_fingerprint_lock = threading.Lock()
+_fingerprint_index_cache: Dict[str, Any] = {"key": None, "index": None}
+
+def _load_fingerprint_index() -> FingerprintIndex:
+    """The on-disk index, re-read only when the file changes."""
+    path = Path(FINGERPRINT_INDEX_PATH)
+    try:
+        key = (str(path), path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return FingerprintIndex()
+    with _fingerprint_lock:
+        if _fingerprint_index_cache["key"] != key:
+            _fingerprint_index_cache.update(key=key, index=FingerprintIndex.load(path))
+        return _fingerprint_index_cache["index"]
+
+def lookup_fingerprint(fingerprint: Any) -> Optional[Dict[str, Any]]:
+    """
+    Stored result of a near-duplicate clip analyzed under the current config, or None.
+    Entries whose combined_run.json is gone are skipped (the caller runs the pipeline).
+    """
+    hit = _load_fingerprint_index().search(fingerprint, analysis_config_fingerprint())
+    if hit is None:
+        return None
+    entry, bits = hit
+    try:
+        stored = json.loads(Path(entry["result"]).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if stored.get("meta", {}).get("degraded"):
+        return None
+    return {"entry": entry, "max_hamming_bits": bits, "result": stored}
+
+def add_fingerprint(fingerprint: Any, result_path: Path, video: Path) -> None:
+    entry = {"config": analysis_config_fingerprint(), "result": str(result_path), "video": str(video),
+             "added_at": time.time()}
+    with _fingerprint_lock:
+        index = FingerprintIndex.load(Path(FINGERPRINT_INDEX_PATH))
+        index.add(fingerprint, entry)
+        index.save(Path(FINGERPRINT_INDEX_PATH))
 
 
 # ======================================================
 # MAIN
 # ======================================================
 
-def analyze_video(input_video_path: str):
+def _stage_event(stage: str, data: Any) -> Dict[str, Any]:
+    return {"type": "stage", "stage": stage, "data": data}
+
+def _clip_window_context(window: Dict[str, Any]) -> Dict[str, Any]:
+    """Where the clip sits in the upload; the snap time is relative to the clip start."""
+    ctx = {"start_sec": window["start"], "duration_sec": window["duration"], "method": window["method"]}
+    if "snap_sec" in window:
+        ctx["snap_sec_in_clip"] = round(window["snap_sec"] - window["start"], 2)
+    return ctx
+
+def _clip_selection_report(input_video: Path, clipped_path: Path, uploaded_frames: List[InMemoryFrame],
+                           window: Dict[str, Any], routing: Dict[str, Any]) -> Dict[str, Any]:
+    frame_bytes = sum(len(f.jpeg) for f in uploaded_frames)
+    clip_bytes = clipped_path.stat().st_size
+    video_sent = routing["use_final_model"]
+
+    # What the old fixed 0-6s cut + 3 frames would have sent, clip size estimated from the source's average bitrate
+    total_sec = probe_duration_sec(str(input_video))
+    fixed_sec = min(CLIP_DURATION_SEC, total_sec) if total_sec else CLIP_DURATION_SEC
+    fixed_bytes = int(input_video.stat().st_size * fixed_sec / total_sec) + frame_bytes if total_sec else None
+
+    return {
+        "window": window,
+        "sent": {
+            "video_sec": window["duration"] if video_sent else 0,
+            "clip_bytes": clip_bytes if video_sent else 0,
+            "frame_bytes": frame_bytes,
+            "bytes": frame_bytes + (clip_bytes if video_sent else 0),
+        },
+        "fixed_window_estimate": {
+            "video_sec": fixed_sec,
+            "bytes": fixed_bytes,
+        },
+    }
+
+def analyze_video_stream(input_video_path: str, abandon: Optional[threading.Event] = None,
+                         window: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Runs the pipeline and yields events as soon as each piece is ready:
+      {"type": "stage", "stage": <name>, "data": ...}   after each stage finishes
+      {"type": "final_delta", "text": <chunk>}          while the final paragraph streams
+      {"type": "done", "result": <combined>}            once everything is saved
+    Concurrent calls for the same clip bytes and config share one run (single-flight).
+    Set `abandon` when the caller goes away; the run is cancelled once no caller is left.
+    A caller that already knows the play's window ({"method", "start", "duration"})
+    passes it as `window` and the adaptive scan is skipped.
+    """
+    input_video = Path(input_video_path).expanduser().resolve()
+    if not input_video.exists():
+        raise RuntimeError(f"Video not found: {input_video}")
+    key = analysis_key(str(input_video), window=window)
+    yield from _pipeline_flights.subscribe(key, lambda cancel: _counted_pipeline(str(input_video), cancel, window), abandon)
+
+def _counted_pipeline(input_video_path: str, cancel: threading.Event,
+                      window: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    incr_counter("analyses_in_flight")
+    try:
+        yield from _run_pipeline(input_video_path, cancel, window)
+    finally:
+        incr_counter("analyses_in_flight", -1)
+
+def _run_pipeline(input_video_path: str, cancel: Optional[threading.Event] = None,
+                  window: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    deadline = Deadline(ANALYSIS_DEADLINE_SEC, cancel)
+    try:
+        yield from _pipeline_stages(input_video_path, deadline, window)
+    except (AnalysisCancelled, DeadlineExceeded, GeneratorExit) as e:
+        removed = discard_fresh_uploads(deadline)
+        incr_counter("analyses_cancelled" if isinstance(e, (AnalysisCancelled, GeneratorExit)) else "analyses_deadline_exceeded")
+        print(f"🛑 {type(e).__name__}: {e} (deleted {removed} fresh uploads)")
+        raise
+
+def _reuse_matched_result(match: Dict[str, Any], input_video: Path, clipped_path: Path, window: Dict[str, Any],
+                          out_base: Path, run_id: str, trace: RunTrace, deadline: Deadline) -> Iterator[Dict[str, Any]]:
+    """
+    Replays a near-duplicate's stored result as this run's events and combined_run.json.
+    The analysis is the matched run's; the meta describing the clip (digest, window) is this one's.
+    """
+    stored = match["result"]
+    source = {"run": match["entry"]["result"], "video": match["entry"]["video"],
+              "max_hamming_bits": match["max_hamming_bits"], "threshold_bits": FINGERPRINT_MAX_BITS}
+    print(f"🧬 Near-duplicate of {Path(source['video']).name} "
+          f"({source['max_hamming_bits']} bits ≤ {FINGERPRINT_MAX_BITS}); reusing its result")
+    yield _stage_event("fingerprint_match", source)
+    for stage in ("stage2_motion_cv", "stage1_offense_defense", "rag_examples"):
+        yield _stage_event(stage, stored[stage])
+    yield _stage_event("rag_play_candidates", stored["rag_play_candidates"])
+    yield {"type": "final_delta", "text": stored["final_paragraph"]}
+
+    combined = {**stored, "meta": {
+        **stored["meta"],
+        "input_video": str(input_video),
+        "clipped_video_sent_to_gemini": None,
+        "clip_window_sec": {"start": window["start"], "duration": window["duration"]},
+        "clip_selection": _clip_selection_report(input_video, clipped_path, [], window, {"use_final_model": False}),
+        "video_name": input_video.stem,
+        "video_sha256": file_digest_cached(str(input_video)),
+        "run_id": run_id,
+        "matched_run_id": stored["meta"].get("run_id"),
+        "fingerprint_match": source,
+        "token_usage": new_usage_report(),
+        "trace": trace.finish(),
+        "deadline": {"budget_sec": deadline.budget_sec, "remaining_sec": round(deadline.remaining(), 2)},
+    }}
+    (out_base / "final_paragraph.txt").write_text(stored["final_paragraph"], encoding="utf-8")
+    write_json(out_base / "combined_run.json", combined)
+    print(f"\n✅ Saved to: {out_base}\n")
+    yield {"type": "done", "result": combined}
+
+def _pipeline_stages(input_video_path: str, deadline: Deadline,
+                     window: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
     ensure_dirs()
-    require_ffmpeg()
+    require_decoder()
 
     input_video = Path(input_video_path).expanduser().resolve()
     if not input_video.exists():
         raise RuntimeError(f"Video not found: {input_video}")
 
     video_name = input_video.stem
-    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_base = Path(OUTPUT_DIR) / f"{safe_slug(video_name)}__{run_id}"
+    run_id = new_run_id()
+    out_base = run_output_dir(video_name, run_id)
     out_base.mkdir(parents=True, exist_ok=True)
+    usage = new_usage_report()
+    trace = RunTrace()
 
     with tempfile.TemporaryDirectory() as tmp:
-        # 1) Cut first 6 seconds into a temp clip
-        clipped_path = Path(tmp) / f"{video_name}_first{CLIP_DURATION_SEC}s.mp4"
-        cut_subclip(str(input_video), str(clipped_path), CLIP_START_SEC, CLIP_DURATION_SEC)
-
-        # 2) Extract frames from the clipped segment
-        print("🎞 Extracting frames from first 6 seconds (0s,2s,4s)")
-        frame_paths = extract_frames_at_times(str(clipped_path), tmp, FRAME_TIMES_SEC)
+        # 1) Pick the informative window (set → snap) and cut it into a temp clip
+        with trace.span("select_window"):
+            if window is not None:
+                pass  # picked by the caller (live feed snap detection); no second scan
+            elif ADAPTIVE_WINDOW_ENABLED:
+                window = select_clip_window(str(input_video), deadline)
+            else:
+                window = {"method": "fixed", "start": CLIP_START_SEC, "duration": CLIP_DURATION_SEC}
+        print(f"✂️  Clip window {window['start']}s + {window['duration']}s ({window['method']})")
+        clipped_path = Path(tmp) / f"{video_name}_{window['start']:g}s_{window['duration']:g}s_{CLIP_PROFILE}.mp4"
+        with trace.span("cut", profile=CLIP_PROFILE) as sp:
+            cut_subclip(str(input_video), str(clipped_path), window["start"], window["duration"],
+                        TRANSCODE_PROFILES[CLIP_PROFILE], deadline)
+            sp["bytes_out"] = clipped_path.stat().st_size
+
+        deadline.check()
+
+        # 2) Decode frames for the window (from the source, so stills keep full quality); they stay in memory
+        frame_times = frame_times_for_window(window["duration"])
+        print(f"🎞 Decoding frames at {frame_times}s")
+        with trace.span("extract_frames", frames=len(frame_times)):
+            frames = decode_frames_at_times(str(input_video), frame_times, offset_sec=window["start"],
+                                            deadline=deadline)
+
+        # 2b) Near-duplicate of a clip already analyzed (re-encode, phone capture)? Reuse its result
+        fingerprint = None
+        if FINGERPRINT_ENABLED:
+            with trace.span("fingerprint") as sp:
+                fingerprint = video_fingerprint(frames)
+                match = lookup_fingerprint(fingerprint)
+                sp["matched"] = match is not None
+            if match is not None:
+                yield from _reuse_matched_result(match, input_video, clipped_path, window, out_base, run_id,
+                                                 trace, deadline)
+                return
 
         # 3) CV motion (fast, local)
         print("⚡ CV motion")
-        motion_cv = detect_motion_cv(frame_paths)
+        with trace.span("cv_motion"):
+            motion_cv = detect_motion_cv(frames, frame_times)
+            if REGION_MOTION_ENABLED and OVERLAY_LEARN_ENABLED:
+                update_overlay_model(frames[0])
+        if FLOW_ENABLED:
+            with trace.span("optical_flow"):
+                motion_cv["optical_flow"] = optical_flow_summary(frames)
+            print(f"⚡ Optical flow in {motion_cv['optical_flow']['elapsed_ms']:.0f} ms")
         write_json(out_base / "stage2_motion_cv.json", motion_cv)
+        yield _stage_event("stage2_motion_cv", motion_cv)
+
+        deadline.check()
 
-        # 4) Upload frames + clipped video (ONLY the 6s clip gets sent)
-        print("⏳ Uploading 3 frames + 6s video clip")
-        frame_files = [upload_and_wait(str(p)) for p in frame_paths]
-        video_file = upload_and_wait(str(clipped_path))
+        # 4) Upload the stage-1 frame (the other two only if the cascade needs them, the clip only
+        #    if the final model is needed)
+        print("⏳ Uploading frame")
+        frame_files = [upload_and_wait(frames[0], trace=trace, deadline=deadline)]
+
+        deadline.check()
 
         # 5) Stage 1: Offense vs Defense (fast model)
         print("⚡ Offense vs Defense")
+        degraded: List[str] = []  # fallbacks taken; a degraded result is never reused or indexed
         try:
-            off_def = generate_json(FAST_MODEL, [frame_files[0], OFF_DEF_PROMPT], attempts=2)
+            off_def = offense_defense(frame_files[0], usage=usage, trace=trace, deadline=deadline).model_dump()
+        except (AnalysisCancelled, DeadlineExceeded):
+            raise
         except Exception as e:
-            off_def = {
-                "offense_side": "unknown",
-                "defense_side": "unknown",
-                "offense_team": "unknown",
-                "defense_team": "unknown",
-                "offense_jersey_color": "unknown",
-                "defense_jersey_color": "unknown",
-                "confidence": "low",
-                "reasoning": f"fallback_due_to_error: {str(e)[:200]}"
-            }
+            incr_counter("stage1_fallbacks")
+            off_def = OffDefAssignment.unknown(f"fallback_due_to_error: {str(e)[:200]}").model_dump()
+            degraded.append("stage1 fallback")
         write_json(out_base / "stage1_offense_defense.json", off_def)
+        yield _stage_event("stage1_offense_defense", off_def)
 
-        # 6) RAG
+        deadline.check()
+
+        # 6) RAG: text summary through Chroma, frame-0 formation through the local visual index
         print("📚 RAG lookup")
-        examples = retrieve_rag_examples(off_def, motion_cv, top_k=TOP_K)
-        write_json(out_base / "rag_examples.json", {"top_k": TOP_K, "examples": examples})
-
-        # 7) Final prediction (one paragraph) — uses ONLY first 6 seconds video
-        print("🧠 Final inference (one paragraph, top 3 plays, no probabilities)")
-        final_text = call_model_with_backoff(
-            FINAL_MODEL,
-            [
-                video_file,
-                "OFFENSE/DEFENSE ASSIGNMENT JSON (GROUND TRUTH):\n" + json.dumps(off_def),
-                "CV MOTION JSON (GROUND TRUTH):\n" + json.dumps(motion_cv),
-                "RAG EXAMPLES (stored JSON strings):\n" + json.dumps(examples),
-                MASTER_PROMPT_WITH_RAG
-            ]
-        ).strip()
+        descriptor = None
+        if VISUAL_RAG_ENABLED:
+            with trace.span("rag.descriptor"):
+                descriptor = formation_descriptor(frames[0])
+        examples = retrieve_rag_examples(off_def, motion_cv, top_k=TOP_K, trace=trace, deadline=deadline,
+                                         descriptor=descriptor, exclude_digest=file_digest_cached(str(input_video)))
+        write_json(out_base / "rag_examples.json", {"top_k": TOP_K, "rerank": RAG_RERANK, "examples": examples})
+        yield _stage_event("rag_examples", examples)
+
+        rag_play_bundle = extract_play_candidates_from_rag(examples)
+        if rag_play_bundle["used_fallback"]:
+            degraded.append("no RAG play candidates")
+        write_json(out_base / "rag_play_candidates.json", rag_play_bundle)
+        yield _stage_event("rag_play_candidates", rag_play_bundle["unique_play_candidates"])
+
+        deadline.check()
+
+        # 7) Cascade: cheap frame-level first pass, escalate only when unsure
+        routing = {"cascade_enabled": CASCADE_ENABLED, "use_final_model": True, "reasons": ["cascade disabled"]}
+        first_pass = None
+        if CASCADE_ENABLED:
+            print("⚡ Cascade first pass (frames + CV + RAG candidates)")
+            try:
+                frame_files += [upload_and_wait(f, trace=trace, deadline=deadline) for f in frames[1:]]
+                first_pass = generate_structured(
+                    FAST_MODEL,
+                    frame_files + [
+                        "OFFENSE/DEFENSE ASSIGNMENT JSON (GROUND TRUTH):\n" + json.dumps(off_def),
+                        "CV MOTION JSON (GROUND TRUTH):\n" + json.dumps(motion_cv),
+                        "RAG PLAY CANDIDATES:\n" + json.dumps(rag_play_bundle["unique_play_candidates"]),
+                    ],
+                    CascadeFirstPass,
+                    system_instruction=CASCADE_FIRST_PASS_PROMPT,
+                    usage=usage,
+                    trace=trace,
+                    deadline=deadline,
+                )
+                route = route_final_stage(first_pass, rag_play_bundle["verified_play_candidates"], off_def,
+                                          rag_fallback=rag_play_bundle["used_fallback"])
+                routing = {"cascade_enabled": True, **route}
+            except (AnalysisCancelled, DeadlineExceeded):
+                raise
+            except Exception as e:
+                incr_counter("cascade_first_pass_failures")
+                routing = {"cascade_enabled": True, "use_final_model": True, "reasons": [f"first pass failed: {str(e)[:200]}"]}
+                degraded.append("cascade first pass failed")
+            decision = "FINAL_MODEL" if routing["use_final_model"] else "FAST_MODEL answer"
+            print(f"🔀 Routing → {decision} ({'; '.join(routing['reasons']) or 'confident, candidates agree'})")
+        routing["served_by"] = FINAL_MODEL if routing["use_final_model"] else served_model(usage, FAST_MODEL)
+        yield _stage_event("routing", routing)
+
+        deadline.check()
+
+        if routing["use_final_model"]:
+            # 8) Final prediction (one paragraph) — uses ONLY the selected window of the video
+            print(f"⏳ Uploading {window['duration']:g}s video clip (from {window['start']:g}s)")
+            video_file = upload_and_wait(str(clipped_path), trace=trace, deadline=deadline)
+            print("🧠 Final inference (one paragraph, top 3 plays, no probabilities)")
+            chunks: List[str] = []
+            for chunk in call_model_stream_with_backoff(
+                FINAL_MODEL,
+                [
+                    video_file,
+                    "CLIP WINDOW JSON:\n" + json.dumps(_clip_window_context(window)),
+                    "OFFENSE/DEFENSE ASSIGNMENT JSON (GROUND TRUTH):\n" + json.dumps(off_def),
+                    "CV MOTION JSON (GROUND TRUTH):\n" + json.dumps(motion_cv),
+                    "RAG EXAMPLES (stored JSON strings):\n" + json.dumps(examples),
+                ],
+                system_instruction=MASTER_PROMPT_WITH_RAG,
+                usage=usage,
+                trace=trace,
+                deadline=deadline,
+            ):
+                deadline.check()
+                chunks.append(chunk)
+                yield {"type": "final_delta", "text": chunk}
+            final_text = "".join(chunks).strip()
+            routing["served_by"] = served_model(usage, FINAL_MODEL)
+        else:
+            final_text = first_pass.paragraph.strip()
+            yield {"type": "final_delta", "text": final_text}
+
+        clip_selection = _clip_selection_report(input_video, clipped_path, frames[:len(frame_files)], window, routing)
+        print(f"📦 Sent {clip_selection['sent']['bytes']} bytes / {clip_selection['sent']['video_sec']}s video "
+              f"(fixed 0-{CLIP_DURATION_SEC}s window ≈ {clip_selection['fixed_window_estimate']['bytes']} bytes)")
 
         # Enforce single paragraph
         final_one_paragraph = " ".join(final_text.split())
         (out_base / "final_paragraph.txt").write_text(final_one_paragraph, encoding="utf-8")
+        trace_report = trace.finish()
 
         combined = {
             "meta": {
                 "input_video": str(input_video),
                 "clipped_video_sent_to_gemini": str(clipped_path),
-                "clip_window_sec": {"start": CLIP_START_SEC, "duration": CLIP_DURATION_SEC},
+                "clip_window_sec": {"start": window["start"], "duration": window["duration"]},
+                "clip_selection": clip_selection,
+                "clip_profile": {"name": CLIP_PROFILE, "settings": TRANSCODE_PROFILES[CLIP_PROFILE]},
                 "video_name": video_name,
+                "video_sha256": file_digest_cached(str(input_video)),
                 "run_id": run_id,
                 "models": {
                     "fast_model_offdef": FAST_MODEL,
                     "final_model": FINAL_MODEL,
-                    "embed_model": EMBED_MODEL
+                    "embed_model": EMBED_MODEL,
+                    "served": usage["served"],
+                    "breakers": breaker_states()
                 },
+                "routing": routing,
+                "degraded": degraded,
                 "chroma": {
                     "dir": CHROMA_DIR,
                     "collection": COLLECTION_NAME,
-                    "top_k": TOP_K
-                }
+                    "top_k": TOP_K,
+                    "rerank": {"policy": RAG_RERANK, "mmr_lambda": RAG_MMR_LAMBDA,
+                               "fetch_multiplier": RAG_FETCH_MULTIPLIER}
+                },
+                "visual_rag": {
+                    "enabled": VISUAL_RAG_ENABLED,
+                    "top_k": VISUAL_TOP_K,
+                    "min_similarity": VISUAL_MIN_SIMILARITY
+                },
+                "token_usage": usage,
+                "stage1_parse_failure_rate": round(parse_failure_rate(), 4),
+                "trace": trace_report,
+                "deadline": {"budget_sec": deadline.budget_sec, "remaining_sec": round(deadline.remaining(), 2)}
             },
             "stage1_offense_defense": off_def,
             "stage2_motion_cv": motion_cv,
             "rag_examples": examples,
+            "rag_play_candidates": rag_play_bundle["unique_play_candidates"],
             "final_paragraph": final_one_paragraph
         }
         write_json(out_base / "combined_run.json", combined)
+        if fingerprint is not None and not degraded:  # a degraded answer must not be replayed
+            add_fingerprint(fingerprint, out_base / "combined_run.json", input_video)
+        if descriptor is not None and indexable_run(combined):
+            add_visual_example(descriptor, combined)
+        if RAG_WRITEBACK_ENABLED and indexable_run(combined):
+            try:
+                _rag_indexer.submit(combined)
+            except OSError as e:
+                print(f"⚠️  Run not queued for the RAG index: {e}")
 
         print("\n✅ FINAL OUTPUT\n")
         print(final_one_paragraph)
+        slowest = sorted(trace_report["by_stage"].items(), key=lambda kv: -kv[1]["wall_ms"])[:4]
+        print("⏱️  " + ", ".join(f"{name} {agg['wall_ms']:.0f}ms" for name, agg in slowest)
+              + f" (total {trace_report['total_wall_ms']:.0f}ms)")
+        print(f"🪙 Input tokens: {usage['input_tokens']} ({usage['cached_input_tokens']} cached, {usage['uncached_input_tokens']} uncached)")
         print(f"\n✅ Saved to: {out_base}\n")
-        return combined
+        yield {"type": "done", "result": combined}
+
+def analyze_video(input_video_path: str, abandon: Optional[threading.Event] = None,
+                  window: Optional[Dict[str, Any]] = None):
+    combined = None
+    for event in analyze_video_stream(input_video_path, abandon, window):
+        if event["type"] == "done":
+            combined = event["result"]
+    return combined
 
 def main():
     video_path = sys.argv[1] if len(sys.argv) > 1 else None
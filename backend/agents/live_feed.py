@@ -0,0 +1,217 @@
+"""
+Live-feed mode: find snaps in a full-length broadcast video and analyze the
+pre-snap window of each play.
+
+The video is decoded once, as a small grayscale stream piped out of ffmpeg.
+Scene cuts and snaps are detected from frame-to-frame motion ratios, and
+each pre-snap window is queued into the regular analysis pipeline while
+decoding continues. Only the previous frame, a short motion history and a
+bounded job queue are kept, so memory does not grow with video length.
+
+Usage: python live_feed.py <broadcast_video>
+"""
+
+import sys
+import time
+import queue
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Iterator
+
+import cv2
+import numpy as np
+
+try:
+    from . import inference
+except ImportError:  # run as a script from backend/agents
+    import inference
+
+
+# ======================================================
+# CONFIG
+# ======================================================
+
+# Decode at low resolution / fps; enough for cut and snap detection
+LIVE_DECODE_FPS = 5
+LIVE_DECODE_SIZE = (320, 180)
+
+# Scene cut: most of the frame changes at once
+SCENE_CUT_RATIO = 0.45
+
+# Snap: a "set" period of near-stillness followed by a burst of motion
+SET_MAX_RATIO = inference.SET_MAX_RATIO
+SET_MIN_SEC = inference.SET_MIN_SEC
+SNAP_MIN_RATIO = inference.SNAP_MIN_RATIO
+MIN_PLAY_GAP_SEC = 12.0
+
+# Window sent to the analysis pipeline, relative to the detected snap
+PRE_SNAP_SEC = 5.0
+POST_SNAP_SEC = 1.0
+
+# Bounded queue between decoder and analysis workers (decoder blocks when full)
+LIVE_QUEUE_SIZE = 4
+LIVE_ANALYSIS_WORKERS = 2
+
+
+# ======================================================
+# Segmentation
+# ======================================================
+
+def detect_play_windows(video: str, stats: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields one pre-snap window per detected snap as soon as it is found.
+    `stats` is updated in place with decoded seconds and scene cut count.
+    """
+    tracker = inference.SnapTracker(SET_MAX_RATIO, SET_MIN_SEC, SNAP_MIN_RATIO)
+    prev = None
+    scratch = None
+    last_snap = -MIN_PLAY_GAP_SEC
+    play_idx = 0
+
+    for t, gray in inference.iter_gray_frames(video, LIVE_DECODE_FPS, LIVE_DECODE_SIZE):
+        stats["video_sec_decoded"] = t
+        gray = cv2.GaussianBlur(gray, inference.BLUR_KERNEL, 0)
+        if prev is None:
+            prev = gray
+            continue
+
+        scratch = np.empty_like(gray) if scratch is None else scratch
+        ratio = inference.motion_score_between(prev, gray, scratch)
+        prev = gray
+
+        if ratio >= SCENE_CUT_RATIO:
+            stats["scene_cuts"] += 1
+            tracker.reset()
+            continue
+
+        if tracker.update(t, ratio) and t - last_snap >= MIN_PLAY_GAP_SEC:
+            last_snap = t
+            play_idx += 1
+            start = max(0.0, t - PRE_SNAP_SEC)
+            yield {
+                "play_index": play_idx,
+                "snap_sec": round(t, 2),
+                "window_start_sec": round(start, 2),
+                "window_duration_sec": round(t + POST_SNAP_SEC - start, 2),
+                "snap_motion_ratio": round(ratio, 6),
+            }
+
+
+# ======================================================
+# Live pipeline
+# ======================================================
+
+def _analysis_worker(jobs: "queue.Queue", video: str, work_dir: str, results: List[Dict[str, Any]], lock: threading.Lock):
+    stem = Path(video).stem
+    while True:
+        window = jobs.get()
+        if window is None:
+            jobs.task_done()
+            return
+        clip = Path(work_dir) / f"{inference.safe_slug(stem)}_play{window['play_index']:03d}.mp4"
+        started = time.time()
+        try:
+            inference.cut_subclip(video, str(clip), window["window_start_sec"], window["window_duration_sec"])
+            # The clip already is the play's window; hand it over so the pipeline does not re-scan it
+            snap = {"method": "live_feed_snap", "start": 0.0, "duration": window["window_duration_sec"],
+                    "snap_sec": round(window["snap_sec"] - window["window_start_sec"], 2)}
+            combined = inference.analyze_video(str(clip), window=snap)
+            entry = {**window, "status": "success", "final_paragraph": combined["final_paragraph"],
+                     "run_id": combined["meta"]["run_id"]}
+        except Exception as e:
+            entry = {**window, "status": "error", "message": str(e)[:300]}
+        entry["analysis_sec"] = round(time.time() - started, 2)
+        with lock:
+            results.append(entry)
+        clip.unlink(missing_ok=True)
+        jobs.task_done()
+
+def run_live_feed(input_video_path: str, workers: int = LIVE_ANALYSIS_WORKERS) -> Dict[str, Any]:
+    inference.ensure_dirs()
+    inference.require_ffmpeg()
+
+    video = Path(input_video_path).expanduser().resolve()
+    if not video.exists():
+        raise RuntimeError(f"Video not found: {video}")
+
+    run_id = inference.new_run_id()
+    out_base = Path(inference.OUTPUT_DIR) / f"{inference.safe_slug(video.stem)}__live_{run_id}"
+    out_base.mkdir(parents=True, exist_ok=True)
+
+    stats = {"video_sec_decoded": 0.0, "scene_cuts": 0}
+    results: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    jobs: "queue.Queue" = queue.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    started = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        threads = [
+            threading.Thread(target=_analysis_worker, args=(jobs, str(video), tmp, results, lock), daemon=True)
+            for _ in range(workers)
+        ]
+        for th in threads:
+            th.start()
+
+        print(f"📡 Live feed: scanning {video.name}")
+        decode_error = None
+        try:
+            for window in detect_play_windows(str(video), stats):
+                print(f"🏈 Snap #{window['play_index']} at {window['snap_sec']:.1f}s → queued")
+                jobs.put(window)  # blocks while workers are behind (bounded memory)
+        except Exception as e:
+            # Plays already queued are still analyzed; the report says where decoding stopped
+            decode_error = str(e)[:300]
+            print(f"❌ Decoding stopped at {stats['video_sec_decoded']:.1f}s: {decode_error}")
+        finally:
+            decode_wall = time.time() - started
+            for _ in threads:
+                jobs.put(None)
+            for th in threads:
+                th.join()
+    total_wall = time.time() - started
+
+    video_min = stats["video_sec_decoded"] / 60.0
+    report = {
+        "input_video": str(video),
+        "run_id": run_id,
+        "plays_detected": len(results),
+        "scene_cuts": stats["scene_cuts"],
+        "video_sec_decoded": round(stats["video_sec_decoded"], 2),
+        "decode_error": decode_error,
+        "throughput": {
+            "decode_wall_sec": round(decode_wall, 2),
+            "total_wall_sec": round(total_wall, 2),
+            "decode_video_min_per_wall_min": round(video_min / (decode_wall / 60.0), 2) if decode_wall > 0 else None,
+            "end_to_end_video_min_per_wall_min": round(video_min / (total_wall / 60.0), 2) if total_wall > 0 else None,
+        },
+        "config": {
+            "decode_fps": LIVE_DECODE_FPS,
+            "decode_size": list(LIVE_DECODE_SIZE),
+            "scene_cut_ratio": SCENE_CUT_RATIO,
+            "set_max_ratio": SET_MAX_RATIO,
+            "set_min_sec": SET_MIN_SEC,
+            "snap_min_ratio": SNAP_MIN_RATIO,
+            "min_play_gap_sec": MIN_PLAY_GAP_SEC,
+            "window_sec": {"pre_snap": PRE_SNAP_SEC, "post_snap": POST_SNAP_SEC},
+            "workers": workers,
+        },
+        "plays": sorted(results, key=lambda r: r["play_index"]),
+    }
+    inference.write_json(out_base / "live_feed_report.json", report)
+
+    print(f"\n✅ {report['plays_detected']} plays from {video_min:.1f} video-min "
+          f"({report['throughput']['end_to_end_video_min_per_wall_min']} video-min / wall-min)")
+    print(f"✅ Saved to: {out_base}\n")
+    return report
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else None
+    if not video_path:
+        print("Usage: python live_feed.py <broadcast_video>")
+        sys.exit(1)
+    run_live_feed(video_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import json
+import threading
+from pathlib import Path
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.tools import FunctionTool, ToolContext
+from google.genai import types
+
+from ...inference import analyze_video_stream
+
+logger = logging.getLogger(__name__)
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent.parent
+UPLOADS_DIR = PROJECT_ROOT / "uploads"
+
+VIDEO_FILENAME_STATE_KEY = "video_filename"
+
+_DONE = object()
+
+
+def start_video_analysis(video_filename: str, tool_context: ToolContext) -> str:
+    """Start a streaming analysis of an uploaded football play video.
+
+    The analysis is handed to the video analysis agent, which pushes each
+    pipeline stage (motion, offense/defense, RAG examples) as soon as it is
+    ready and streams the final paragraph as it is generated.
+
+    Args:
+        video_filename: The filename of the uploaded video to analyze
+                       (e.g., "chiefs_vs_ravens.mp4")
+
+    Returns:
+        A JSON string confirming the hand-off or describing the error.
+    """
+    video_path = UPLOADS_DIR / video_filename
+    if not video_path.exists():
+        return json.dumps({
+            "status": "error",
+            "message": f"Video file not found: {video_filename}",
+            "searched_path": str(video_path)
+        })
+
+    tool_context.state[VIDEO_FILENAME_STATE_KEY] = video_filename
+    tool_context.actions.transfer_to_agent = "videoAnalysisAgent"
+    return json.dumps({"status": "started", "video_filename": video_filename})
+
+start_video_analysis_tool = FunctionTool(func=start_video_analysis)
+
+
+async def _next_event(gen):
+    # The pipeline is blocking (ffmpeg, uploads, model calls); pull each event in a worker thread
+    return await asyncio.to_thread(next, gen, _DONE)
+
+
+class VideoAnalysisAgent(BaseAgent):
+    """Runs the inference pipeline in-process and relays its events as ADK events.
+
+    Stage results become state deltas under `analysis_stages`; final paragraph
+    chunks become partial text events, which the AG-UI endpoint forwards as
+    TEXT_MESSAGE_CONTENT deltas.
+    """
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        video_filename = ctx.session.state.get(VIDEO_FILENAME_STATE_KEY)
+        if not video_filename:
+            yield self._text_event(ctx, "No video selected for analysis. Please upload a play video first.")
+            return
+
+        stages = {}
+        # Set when this invocation is cancelled (client disconnect); the pipeline stops once no caller is left
+        abandon = threading.Event()
+        gen = analyze_video_stream(str(UPLOADS_DIR / video_filename), abandon)
+        try:
+            while True:
+                event = await _next_event(gen)
+                if event is _DONE:
+                    break
+
+                if event["type"] == "stage":
+                    stages[event["stage"]] = event["data"]
+                    yield Event(
+                        author=self.name,
+                        invocation_id=ctx.invocation_id,
+                        actions=EventActions(state_delta={"analysis_stages": dict(stages)}),
+                    )
+                elif event["type"] == "final_delta":
+                    yield self._text_event(ctx, event["text"], partial=True)
+                elif event["type"] == "done":
+                    combined = event["result"]
+                    yield Event(
+                        author=self.name,
+                        invocation_id=ctx.invocation_id,
+                        content=types.Content(role="model", parts=[types.Part(text=combined["final_paragraph"])]),
+                        actions=EventActions(state_delta={"final_paragraph": combined["final_paragraph"]}),
+                    )
+        except Exception as e:
+            logger.error(f"Video analysis failed: {e}")
+            yield self._text_event(ctx, f"Video analysis failed: {str(e)}")
+        finally:
+            abandon.set()
+            try:
+                gen.close()
+            except ValueError:
+                # Still executing in the worker thread (cancelled mid-stage)
+                pass
+
+    def _text_event(self, ctx: InvocationContext, text: str, partial: bool = False) -> Event:
+        return Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+            partial=partial,
+        )
+
+
+videoAnalysisAgent = VideoAnalysisAgent(
+    name="videoAnalysisAgent",
+    description="Streams the video inference pipeline: stage results first, then the final paragraph token by token.",
+)
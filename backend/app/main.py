@@ -1,5 +1,7 @@
 import sys
 import os
+import asyncio
+import threading
 import warnings
 from pathlib import Path
 
@@ -10,7 +12,7 @@ warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
@@ -25,6 +27,7 @@ else:
 from ag_ui_adk import add_adk_fastapi_endpoint
 from ag_ui_adk.adk_agent import ADKAgent
 from backend.agents.agent import root_agent
+from backend.app.metrics import setup_metrics
 # from backend.app.config import get_settings
 # Wrap the agent in ADKAgent for AG-UI compatibility
 agent = ADKAgent(
@@ -34,6 +37,9 @@ agent = ADKAgent(
 
 app = FastAPI(title="FieldHouse API")
 
+# Prometheus /metrics (request rates, stage/Gemini latency, retries, in-flight analyses)
+setup_metrics(app)
+
 # Register AG-UI endpoint
 add_adk_fastapi_endpoint(app, agent, path="/agent-default")
 
@@ -64,17 +70,44 @@ async def upload_video(file: UploadFile = File(...)):
         f.write(content)
     return {"filename": file.filename, "path": str(file_path)}
 
-from backend.agents.inference import analyze_video
-from fastapi import HTTPException
+from backend.agents.inference import (
+    RAG_WRITEBACK_ENABLED, AnalysisCancelled, analyze_video, start_rag_indexer, start_upload_janitor,
+)
+from fastapi import HTTPException, Response
+
+# nginx's "client closed request": a cancelled analysis is not a server error
+CLIENT_CLOSED_REQUEST = 499
+
+@app.on_event("startup")
+def start_background_jobs():
+    # Reclaim expired/orphaned Gemini uploads; skipped when no API key is configured
+    if os.getenv("GEMINI_API_KEY"):
+        start_upload_janitor()
+        # Index runs a previous process queued but never wrote to Chroma
+        if RAG_WRITEBACK_ENABLED:
+            start_rag_indexer()
 
 @app.post("/analyze")
-async def run_analysis(video_filename: str):
+async def run_analysis(video_filename: str, request: Request):
     video_path = UPLOADS_DIR / video_filename
     if not video_path.exists():
         raise HTTPException(status_code=404, detail=f"Video {video_filename} not found in uploads")
     
+    # Off the event loop; concurrent requests for the same clip share one pipeline run.
+    # If the client disconnects we stop waiting, and the run is cancelled once nobody else needs it.
+    abandon = threading.Event()
     try:
-        result = analyze_video(str(video_path))
+        task = asyncio.ensure_future(asyncio.to_thread(analyze_video, str(video_path), abandon))
+        while not task.done():
+            await asyncio.wait({task}, timeout=1.0)
+            if not task.done() and await request.is_disconnected():
+                abandon.set()
+        result = task.result()
         return result
+    except asyncio.CancelledError:
+        abandon.set()
+        raise
+    except AnalysisCancelled:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
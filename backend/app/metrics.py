@@ -0,0 +1,136 @@
+"""
+Prometheus metrics for the FastAPI server, served at /metrics.
+
+Pipeline stages and Gemini calls are timed by the RunTrace spans that
+inference.py already records. A span observer turns each finished span into
+a histogram sample, so the hot path only pays for one function call per span.
+Counters (retries, 503s, parse fallbacks, in-flight analyses) stay in
+inference.get_counters() and are read at scrape time only.
+"""
+
+import time
+import asyncio
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from backend.agents import inference
+
+# Latency buckets spanning ~10 ms local CV up to multi-minute final calls
+_SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 40, 80, 160)
+_BYTES_BUCKETS = (1e4, 1e5, 5e5, 1e6, 5e6, 2e7, 1e8, 5e8)
+
+HTTP_REQUESTS = Counter(
+    "fieldhouse_http_requests_total", "HTTP requests", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "fieldhouse_http_request_seconds", "HTTP request latency", ["method", "route"], buckets=_SECONDS_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "fieldhouse_stage_seconds", "Pipeline stage wall time", ["stage"], buckets=_SECONDS_BUCKETS
+)
+GEMINI_LATENCY = Histogram(
+    "fieldhouse_gemini_call_seconds", "Gemini call wall time (per attempt)", ["model", "kind"],
+    buckets=_SECONDS_BUCKETS,
+)
+GEMINI_TOKENS = Counter(
+    "fieldhouse_gemini_tokens_total", "Gemini tokens", ["model", "direction"]
+)
+UPLOAD_BYTES = Histogram(
+    "fieldhouse_upload_bytes", "Bytes sent per Gemini file upload (registry hits excluded)", buckets=_BYTES_BUCKETS
+)
+
+# get_counters() name → (metric name, help); exported as counters at scrape time
+_PIPELINE_COUNTERS = {
+    "gemini_retries": ("fieldhouse_gemini_retries_total", "Gemini call retries (503 backoff or cache miss)"),
+    "gemini_503": ("fieldhouse_gemini_503_total", "Gemini 503 / overloaded responses"),
+    "structured_calls": ("fieldhouse_structured_calls_total", "Schema-constrained model calls"),
+    "structured_parse_failures": ("fieldhouse_structured_parse_failures_total", "Structured outputs that failed validation"),
+    "stage1_fallbacks": ("fieldhouse_stage1_fallbacks_total", "Offense/defense stage fell back to 'unknown'"),
+    "cascade_first_pass_failures": ("fieldhouse_cascade_first_pass_failures_total", "Cascade first passes that failed"),
+    "analyses_cancelled": ("fieldhouse_analyses_cancelled_total", "Analyses stopped because every caller went away"),
+    "analyses_deadline_exceeded": ("fieldhouse_analyses_deadline_exceeded_total", "Analyses stopped by their end-to-end deadline"),
+    "single_flight_coalesced": ("fieldhouse_single_flight_coalesced_total", "Analyses that joined an in-flight run of the same clip"),
+    "stage1_batches": ("fieldhouse_stage1_batches_total", "Batched stage-1 requests sent"),
+    "stage1_batch_fallbacks": ("fieldhouse_stage1_batch_fallbacks_total", "Batched stage-1 items that fell back to a per-item call"),
+    "breaker_opened": ("fieldhouse_breaker_opened_total", "Times a model's circuit breaker opened"),
+    "model_fallbacks": ("fieldhouse_model_fallbacks_total", "Model calls routed to a fallback because the primary's breaker was open"),
+    "rag_writeback_indexed": ("fieldhouse_rag_writeback_indexed_total", "Finished runs upserted into the RAG collection"),
+    "rag_writeback_failures": ("fieldhouse_rag_writeback_failures_total", "RAG write-back batches that failed (runs stay spooled)"),
+    "rag_writeback_overflow": ("fieldhouse_rag_writeback_overflow_total", "Runs spooled but not queued because the write-back queue was full"),
+}
+_BREAKER_STATE = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class PipelineCounterCollector:
+    """Reads inference counters when Prometheus scrapes, not when they change."""
+
+    def collect(self):
+        counters = inference.get_counters()
+        for key, (name, doc) in _PIPELINE_COUNTERS.items():
+            c = CounterMetricFamily(name.removesuffix("_total"), doc)
+            c.add_metric([], counters.get(key, 0))
+            yield c
+        g = GaugeMetricFamily("fieldhouse_analyses_in_flight", "Pipeline runs currently executing")
+        g.add_metric([], counters.get("analyses_in_flight", 0))
+        yield g
+        b = GaugeMetricFamily("fieldhouse_model_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+                              labels=["model"])
+        for model, state in inference.breaker_states().items():
+            b.add_metric([model], _BREAKER_STATE[state])
+        yield b
+        rag = inference.rag_indexer_stats()
+        q = GaugeMetricFamily("fieldhouse_rag_writeback_pending", "Finished runs queued for the RAG index")
+        q.add_metric([], rag["pending"])
+        yield q
+        if rag["last_freshness_sec"] is not None:
+            f = GaugeMetricFamily("fieldhouse_rag_index_freshness_seconds",
+                                  "Seconds from run completion until it was queryable, latest write-back batch")
+            f.add_metric([], rag["last_freshness_sec"])
+            yield f
+
+
+def observe_span(rec):
+    name = rec["name"]
+    seconds = rec["wall_ms"] / 1000.0
+    if name.startswith("gemini."):
+        model = rec.get("model", "unknown")
+        GEMINI_LATENCY.labels(model, name.split(".", 1)[1]).observe(seconds)
+        GEMINI_TOKENS.labels(model, "in").inc(rec.get("tokens_in", 0))
+        GEMINI_TOKENS.labels(model, "out").inc(rec.get("tokens_out", 0))
+        return
+    if name == "upload" and not rec.get("reused"):
+        UPLOAD_BYTES.observe(rec.get("bytes_sent", 0))
+    STAGE_LATENCY.labels(name).observe(seconds)
+
+
+_pipeline_hooks_installed = False
+
+def setup_metrics(app: FastAPI) -> None:
+    global _pipeline_hooks_installed
+    if not _pipeline_hooks_installed:  # the registry and observers are process-wide
+        REGISTRY.register(PipelineCounterCollector())
+        inference.add_span_observer(observe_span)
+        _pipeline_hooks_installed = True
+
+    @app.middleware("http")
+    async def record_http_metrics(request: Request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        except asyncio.CancelledError:
+            status = 499  # the client went away mid-request; not a server error
+            raise
+        finally:
+            # Route template (not the raw path) keeps label cardinality bounded
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.labels(request.method, route, str(status)).inc()
+            HTTP_LATENCY.labels(request.method, route).observe(time.perf_counter() - started)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
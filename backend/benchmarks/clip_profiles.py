@@ -0,0 +1,158 @@
+"""
+Benchmark: clip transcoding profiles vs upload cost and answer agreement.
+
+For each video, the pipeline context (offense/defense, CV motion, RAG
+examples) is computed once. Then the clip is cut with every profile in
+TRANSCODE_PROFILES, uploaded fresh (bypassing the upload registry) and sent
+to FINAL_MODEL with the production final-stage prompt (MASTER_PROMPT_WITH_RAG).
+The ranked top 3 is read back out of that paragraph by FAST_MODEL. Each
+profile reports:
+- upload bytes
+- upload + ACTIVE time
+- top-1 / top-3 agreement with the "source" profile
+
+Needs GEMINI_API_KEY and ffmpeg.
+
+Usage: python backend/benchmarks/clip_profiles.py <video> [<video> ...] [--profiles a,b,c]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+from pathlib import Path
+from statistics import mean
+from typing import List, Dict, Any
+
+from pydantic import BaseModel, Field
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from backend.agents import inference as inf
+
+REPORT_DIR = Path(__file__).resolve().parent / "results"
+
+
+PARAGRAPH_PLAYS_PROMPT = (
+    "You are given one coach-facing paragraph about an NFL pre-snap clip. "
+    "Return the play concepts it ranks as most likely, in the paragraph's order (most likely first), "
+    "using the paragraph's own names for them. Do not add concepts it does not name."
+)
+
+
+class ParagraphPlays(BaseModel):
+    ranked_plays: List[str] = Field(description="Top 3 play concepts named in the paragraph, most likely first")
+
+
+def upload_fresh(path: str):
+    f = inf.get_client().files.upload(file=path)
+    return inf.wait_until_active(f)
+
+def pipeline_context(video: str, window: Dict[str, Any], tmp: str) -> List[Any]:
+    frame_times = inf.frame_times_for_window(window["duration"])
+    frame_paths = inf.extract_frames_at_times(video, tmp, frame_times, offset_sec=window["start"])
+    motion_cv = inf.detect_motion_cv(frame_paths, frame_times)
+    frame0 = inf.upload_and_wait(str(frame_paths[0]))
+    off_def = inf.generate_structured(
+        inf.FAST_MODEL, [frame0], inf.OffDefAssignment, system_instruction=inf.OFF_DEF_PROMPT
+    ).model_dump()
+    examples = inf.retrieve_rag_examples(off_def, motion_cv, top_k=inf.TOP_K)
+    return [
+        "CLIP WINDOW JSON:\n" + json.dumps(inf._clip_window_context(window)),
+        "OFFENSE/DEFENSE ASSIGNMENT JSON (GROUND TRUTH):\n" + json.dumps(off_def),
+        "CV MOTION JSON (GROUND TRUTH):\n" + json.dumps(motion_cv),
+        "RAG EXAMPLES (stored JSON strings):\n" + json.dumps(examples),
+    ]
+
+def final_paragraph(video_file, context: List[Any]) -> str:
+    # Same call and prompt as the pipeline's final stage, so agreement reflects production output
+    text = inf.call_model_with_backoff(
+        inf.FINAL_MODEL, [video_file] + context, system_instruction=inf.MASTER_PROMPT_WITH_RAG,
+    )
+    return " ".join(text.split())
+
+def ranked_plays(paragraph: str) -> List[str]:
+    res = inf.generate_structured(
+        inf.FAST_MODEL, [paragraph], ParagraphPlays, system_instruction=PARAGRAPH_PLAYS_PROMPT,
+    )
+    return [inf.normalize_play_name(p).lower() for p in res.ranked_plays[:3]]
+
+def bench_video(video: str, profiles: List[str]) -> List[Dict[str, Any]]:
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        window = inf.select_clip_window(video)
+        context = pipeline_context(video, window, tmp)
+        reference = None
+        for name in ["source"] + [p for p in profiles if p != "source"]:
+            clip = Path(tmp) / f"clip_{name}.mp4"
+            t0 = time.time()
+            inf.cut_subclip(video, str(clip), window["start"], window["duration"], inf.TRANSCODE_PROFILES[name])
+            cut_sec = time.time() - t0
+
+            t0 = time.time()
+            video_file = upload_fresh(str(clip))
+            upload_sec = time.time() - t0
+
+            paragraph = final_paragraph(video_file, context)
+            plays = ranked_plays(paragraph)
+            if reference is None:
+                reference = plays
+            rows.append({
+                "video": Path(video).name,
+                "profile": name,
+                "bytes": clip.stat().st_size,
+                "cut_sec": round(cut_sec, 3),
+                "upload_active_sec": round(upload_sec, 3),
+                "top3": plays,
+                "paragraph": paragraph,
+                "top1_agrees": bool(plays and reference and plays[0] == reference[0]),
+                "top3_overlap": len(set(plays) & set(reference)) / 3.0,
+            })
+            print(f"  {name:>8}: {rows[-1]['bytes']:>10} B  upload+ACTIVE {upload_sec:6.2f}s  top3={plays}")
+            try:
+                inf.get_client().files.delete(name=video_file.name)
+            except Exception:
+                pass
+    return rows
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    out = {}
+    for name in dict.fromkeys(r["profile"] for r in rows):
+        rs = [r for r in rows if r["profile"] == name]
+        out[name] = {
+            "mean_bytes": int(mean(r["bytes"] for r in rs)),
+            "mean_upload_active_sec": round(mean(r["upload_active_sec"] for r in rs), 3),
+            "top1_agreement": round(mean(1.0 if r["top1_agrees"] else 0.0 for r in rs), 3),
+            "mean_top3_overlap": round(mean(r["top3_overlap"] for r in rs), 3),
+        }
+    return out
+
+def main():
+    args = sys.argv[1:]
+    profiles = list(inf.TRANSCODE_PROFILES)
+    if "--profiles" in args:
+        i = args.index("--profiles")
+        profiles = args[i + 1].split(",")
+        args = args[:i] + args[i + 2:]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+
+    inf.require_ffmpeg()
+    rows = []
+    for video in args:
+        print(f"🎬 {video}")
+        rows.extend(bench_video(str(Path(video).expanduser().resolve()), profiles))
+
+    summary = summarize(rows)
+    print(json.dumps(summary, indent=2))
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    out = REPORT_DIR / f"bench_clip_profiles_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    inf.write_json(out, {"summary": summary, "rows": rows})
+    print(f"✅ Saved to: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: video decoding backends, ffmpeg subprocesses vs in-process PyAV.
+
+Runs the decode-heavy part of one analysis on synthetic clips (or the videos
+you pass in) with each backend:
+- scan: low-res gray scan used by select_clip_window
+- cut: cut + transcode with CLIP_PROFILE (a packet-copy cut is timed separately)
+- frames: the three stills, decoded to memory
+
+Per clip and backend it reports:
+- wall time per operation
+- CPU seconds: this process (user+sys) and ffmpeg children
+- ffmpeg processes forked
+
+Usage: python backend/benchmarks/decode_backends.py [--iters N] [video ...]
+"""
+
+import os
+import sys
+import time
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+from statistics import median
+from typing import List, Dict, Any, Callable
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from backend.agents import inference as inf
+from backend.benchmarks.pipeline_bench import make_synthetic_clip
+
+WINDOW = {"start": 1.0, "duration": 6.0}
+
+_forks = 0
+_Popen = subprocess.Popen
+
+class _CountingPopen(_Popen):
+    def __init__(self, *args, **kwargs):
+        global _forks
+        _forks += 1
+        super().__init__(*args, **kwargs)
+
+
+def cpu_sec() -> Dict[str, float]:
+    s, c = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {"self": s.ru_utime + s.ru_stime, "children": c.ru_utime + c.ru_stime}
+
+
+def timed(fn: Callable[[], Any]) -> Dict[str, float]:
+    forks0, cpu0, t0 = _forks, cpu_sec(), time.perf_counter()
+    fn()
+    wall, cpu1 = time.perf_counter() - t0, cpu_sec()
+    return {
+        "wall_ms": wall * 1000.0,
+        "cpu_self_ms": (cpu1["self"] - cpu0["self"]) * 1000.0,
+        "cpu_children_ms": (cpu1["children"] - cpu0["children"]) * 1000.0,
+        "forks": _forks - forks0,
+    }
+
+
+def bench_backend(decoder: Any, videos: List[str], work: Path, iters: int) -> Dict[str, Dict[str, float]]:
+    profile = inf.TRANSCODE_PROFILES[inf.CLIP_PROFILE]
+    times = inf.frame_times_for_window(WINDOW["duration"])
+    ops = {
+        "scan": lambda v: sum(1 for _ in decoder.gray_frames(v, inf.SCAN_FPS, inf.SCAN_SIZE, inf.ADAPTIVE_SCAN_SEC)),
+        "cut": lambda v: decoder.cut(v, str(work / f"cut_{decoder.name}.mp4"), WINDOW["start"], WINDOW["duration"], profile),
+        "copy_cut": lambda v: decoder.cut(v, str(work / f"copy_{decoder.name}.mp4"), WINDOW["start"], WINDOW["duration"]),
+        "frames": lambda v: decoder.frames_at(v, times, offset_sec=WINDOW["start"]),
+    }
+    samples: Dict[str, List[Dict[str, float]]] = {op: [] for op in ops}
+    for v in videos:
+        for op, fn in ops.items():
+            fn(v)  # warm-up
+            for _ in range(iters):
+                samples[op].append(timed(lambda: fn(v)))
+    return {op: {k: round(median(s[k] for s in rows), 1) for k in rows[0]} for op, rows in samples.items()}
+
+
+def main():
+    args = sys.argv[1:]
+    iters = 5
+    if "--iters" in args:
+        i = args.index("--iters")
+        iters = int(args[i + 1])
+        args = args[:i] + args[i + 2:]
+    if inf.av is None:
+        print("PyAV is not installed (pip install av); only the ffmpeg backend can run")
+        sys.exit(1)
+
+    inf.require_ffmpeg()
+    subprocess.Popen = _CountingPopen
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        videos = args or [str(make_synthetic_clip(work / f"decode_{i}.mp4", snap_sec=3.0 + i, seed=i)) for i in range(2)]
+        results = {d.name: bench_backend(d, videos, work, iters) for d in (inf.FfmpegDecoder(), inf.PyAVDecoder())}
+
+    print(f"median per clip over {len(videos)} clip(s) x {iters} iters")
+    print(f"{'op':>9} {'backend':>8} {'wall ms':>9} {'cpu self ms':>12} {'cpu child ms':>13} {'forks':>6}")
+    for op in results["ffmpeg"]:
+        for name, r in results.items():
+            row = r[op]
+            print(f"{op:>9} {name:>8} {row['wall_ms']:>9.1f} {row['cpu_self_ms']:>12.1f} "
+                  f"{row['cpu_children_ms']:>13.1f} {row['forks']:>6.0f}")
+
+
+if __name__ == "__main__":
+    main()
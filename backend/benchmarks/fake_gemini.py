@@ -0,0 +1,235 @@
+"""
+Local stand-in for the google-genai client, for offline benchmarks.
+
+Implements the subset the pipeline uses:
+- files.upload / get / delete
+- models.generate_content / generate_content_stream
+- models.embed_content
+- caches.create
+
+Latency and failures are configurable and seeded for reproducibility.
+Failures are injected as 503 ServerErrors, which is what the pipeline's
+backoff path handles. Structured calls (including batched stage-1
+requests) get schema-valid JSON.
+Embeddings are deterministic hashes of the text, so a temporary Chroma store
+seeded through the same fake returns stable neighbours.
+
+    fake = FakeGeminiClient(latency_scale=0.5, failure_rate=0.05)
+    install(fake, work_dir)   # points inference at the fake + temp Chroma/output/registry
+"""
+
+import json
+import time
+import random
+import hashlib
+import itertools
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from google.genai import errors as genai_errors
+
+from backend.agents import inference as inf
+
+# Seconds per call at latency_scale=1.0, roughly what the real API shows for small requests
+DEFAULT_LATENCY = {
+    "upload": 0.25,
+    "get": 0.05,
+    "generate_fast": 0.8,
+    "generate_final": 2.5,
+    "stream_chunk": 0.05,
+    "embed": 0.15,
+    "cache_create": 0.3,
+}
+EMBED_DIM = 64
+
+PLAY_NAMES = [
+    "inside zone", "outside zone", "power", "counter", "play action", "quick game",
+    "screen", "four verticals", "mesh", "stick", "rpo glance", "qb draw",
+]
+
+OFF_DEF_JSON = {
+    "offense_side": "left", "defense_side": "right", "offense_team": "unknown", "defense_team": "unknown",
+    "offense_jersey_color": "white", "defense_jersey_color": "red", "confidence": "high",
+    "reasoning": "QB in shotgun on the left, linebackers stacked on the right",
+}
+
+
+def fake_embedding(text: str) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(EMBED_DIM)
+    return (v / np.linalg.norm(v)).round(6).tolist()
+
+
+def _overloaded() -> genai_errors.ServerError:
+    return genai_errors.ServerError(503, {"error": {"code": 503, "message": "The model is overloaded", "status": "UNAVAILABLE"}})
+
+
+class _File:
+    def __init__(self, name: str, size: int, state: str):
+        self.name = name
+        self.uri = f"https://fake.local/{name}"
+        self.mime_type = "video/mp4" if name.endswith("mp4") else "image/jpeg"
+        self.size_bytes = size
+        self.state = state
+        self.expiration_time = None
+
+
+class _Response:
+    def __init__(self, text: str, prompt_tokens: int, output_tokens: int):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens, cached_content_token_count=0, candidates_token_count=output_tokens
+        )
+
+
+class FakeGeminiClient:
+    def __init__(
+        self,
+        latency: Optional[Dict[str, float]] = None,
+        latency_scale: float = 1.0,
+        jitter: float = 0.2,
+        failure_rate: float = 0.0,
+        processing_polls: int = 0,
+        first_pass_confidence: float = 0.9,
+        seed: int = 7,
+    ):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.processing_polls = processing_polls
+        self.first_pass_confidence = first_pass_confidence
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._polls: Dict[str, int] = {}
+        self.calls: Dict[str, int] = {}
+        self.injected_failures = 0
+
+        self.files = SimpleNamespace(upload=self._upload, get=self._get, delete=self._delete, list=lambda **k: [])
+        self.models = SimpleNamespace(
+            generate_content=self._generate_content,
+            generate_content_stream=self._generate_content_stream,
+            embed_content=self._embed_content,
+        )
+        self.caches = SimpleNamespace(create=self._cache_create)
+
+    # ---- helpers ----
+
+    def _sleep(self, op: str) -> None:
+        with self._lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+            j = self._rng.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        time.sleep(self.latency[op] * self.latency_scale * j)
+
+    def _maybe_fail(self) -> None:
+        with self._lock:
+            fail = self._rng.random() < self.failure_rate
+            if fail:
+                self.injected_failures += 1
+        if fail:
+            raise _overloaded()
+
+    @staticmethod
+    def _prompt_tokens(contents: Any) -> int:
+        items = contents if isinstance(contents, list) else [contents]
+        # ~4 chars per token for text; a flat 258 tokens per image/video reference
+        return sum(len(c) // 4 if isinstance(c, str) else 258 for c in items)
+
+    # ---- files ----
+
+    def _upload(self, file: Any, config: Any = None, **kwargs) -> _File:
+        self._sleep("upload")
+        if hasattr(file, "read"):  # in-memory upload (io.BytesIO + config with display_name)
+            base, size = (config or {}).get("display_name", "upload"), len(file.getbuffer())
+        else:
+            base, size = Path(file).name, Path(file).stat().st_size
+        name = f"files/fake-{next(self._ids)}-{base}"
+        with self._lock:
+            self._polls[name] = self.processing_polls
+        return _File(name, size, "PROCESSING" if self.processing_polls else "ACTIVE")
+
+    def _get(self, name: str, **kwargs) -> _File:
+        self._sleep("get")
+        with self._lock:
+            left = self._polls.get(name, 0)
+            self._polls[name] = max(0, left - 1)
+        return _File(name, 0, "PROCESSING" if left > 0 else "ACTIVE")
+
+    def _delete(self, name: str, **kwargs) -> None:
+        with self._lock:
+            self._polls.pop(name, None)
+
+    def _cache_create(self, model: str, config: Any = None) -> Any:
+        self._sleep("cache_create")
+        return SimpleNamespace(name=f"cachedContents/fake-{next(self._ids)}", expire_time=None)
+
+    # ---- models ----
+
+    def _generate_content(self, model: str, contents: Any, config: Any = None) -> _Response:
+        self._sleep("generate_final" if model == inf.FINAL_MODEL else "generate_fast")
+        self._maybe_fail()
+        schema = getattr(config, "response_schema", None)
+        name = getattr(schema, "__name__", "")
+        if name == "CascadeFirstPass":
+            with self._lock:
+                plays = self._rng.sample(PLAY_NAMES, 3)
+                conf = min(1.0, max(0.0, self._rng.gauss(self.first_pass_confidence, 0.08)))
+            text = json.dumps({"ranked_plays": plays, "confidence": round(conf, 2),
+                               "paragraph": f"Likely {plays[0]}, then {plays[1]} or {plays[2]}."})
+        elif name == "OffDefBatch":
+            ids = [c.split(" ", 1)[1] for c in contents if isinstance(c, str) and c.startswith("ITEM ")]
+            text = json.dumps({"items": [{"item_id": i, **OFF_DEF_JSON} for i in ids]})
+        else:
+            text = json.dumps(OFF_DEF_JSON)
+        return _Response(text, self._prompt_tokens(contents), len(text) // 4)
+
+    def _generate_content_stream(self, model: str, contents: Any, config: Any = None):
+        self._maybe_fail()
+        with self._lock:
+            plays = self._rng.sample(PLAY_NAMES, 3)
+        words = (f"The offense shows a pre-snap look that most resembles {plays[0]}, with {plays[1]} "
+                 f"and {plays[2]} as the next most likely calls given the alignment and motion.").split(" ")
+        prompt = self._prompt_tokens(contents)
+        for i, w in enumerate(words):
+            self._sleep("stream_chunk")
+            yield _Response(w + " ", prompt, i + 1)
+
+    def _embed_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        self._sleep("embed")
+        texts = contents if isinstance(contents, list) else [contents]
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_embedding(t)) for t in texts])
+
+
+def seed_chroma(count: int = 40, seed: int = 11) -> None:
+    """Fills the (temporary) Chroma collection with fake past clips."""
+    rng = random.Random(seed)
+    col = inf.get_collection()
+    ids, docs, embs, metas = [], [], [], []
+    for i in range(count):
+        plays = rng.sample(PLAY_NAMES, 3)
+        doc = {"clip": f"seed_{i:03d}", "play_predictions": [{"play": p} for p in plays],
+               "formation": rng.choice(["shotgun", "pistol", "under center"])}
+        ids.append(f"seed_{i:03d}")
+        docs.append(json.dumps(doc))
+        embs.append(fake_embedding(json.dumps(doc)))
+        metas.append({"video": f"seed_{i:03d}.mp4"})
+    col.upsert(ids=ids, documents=docs, embeddings=embs, metadatas=metas)
+
+
+def install(fake: FakeGeminiClient, work_dir: str, chroma_docs: int = 40) -> None:
+    """Points inference at the fake client and keeps every on-disk side effect inside work_dir."""
+    work = Path(work_dir)
+    inf.client = fake
+    inf.CHROMA_DIR = str(work / "chroma")
+    inf.OUTPUT_DIR = work / "outputs"
+    inf.UPLOAD_REGISTRY_PATH = work / "upload_registry.json"
+    inf.OVERLAY_MASK_PATH = work / "overlay_model.npz"
+    inf.FINGERPRINT_INDEX_PATH = work / "fingerprint_index.npz"
+    inf.VISUAL_INDEX_PATH = work / "visual_index.npz"
+    inf.RAG_SPOOL_PATH = work / "rag_spool.jsonl"
+    inf.POLL_INTERVAL_SEC = min(inf.POLL_INTERVAL_SEC, 0.1)
+    seed_chroma(chroma_docs)
@@ -0,0 +1,119 @@
+"""
+Microbenchmark: frame hand-off from decode through CV to upload, JPEG files vs in-memory frames.
+
+Runs the frame stages of the pipeline on a synthetic 720p clip:
+- decode the three stills
+- CV motion, optical flow and the overlay-model read
+- prepare the frame(s) that get uploaded (hash + bytes)
+
+The two paths:
+- files: ffmpeg writes JPEGs to a temp dir. Each CV stage reads them back with
+  cv2.imread, and the upload hashes and reads the files again.
+- memory: ffmpeg pipes each JPEG back into memory and nothing touches disk. The
+  CV stages share one decoded gray buffer per frame and resolution. The upload
+  hashes and sends those same bytes.
+
+Per clip it reports:
+- wall time
+- bytes this process read or wrote (/proc/self/io rchar/wchar, Linux only)
+- bytes the decode wrote to disk
+- Python-visible allocations (tracemalloc: numpy and OpenCV output arrays)
+
+Usage: python backend/benchmarks/frames_microbench.py [--iters N] [--uploaded 1|3]
+"""
+
+import io
+import os
+import sys
+import time
+import hashlib
+import tempfile
+import tracemalloc
+from pathlib import Path
+from statistics import median
+from typing import Dict, Any, Callable
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from backend.agents import inference as inf
+from backend.benchmarks.pipeline_bench import make_synthetic_clip
+
+
+def proc_io() -> Dict[str, int]:
+    try:
+        fields = dict(line.split(": ") for line in Path("/proc/self/io").read_text().splitlines())
+        return {"rchar": int(fields["rchar"]), "wchar": int(fields["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return {"rchar": 0, "wchar": 0}
+
+
+def files_path(video: str, work: Path, uploaded: int) -> int:
+    paths = inf.extract_frames_at_times(video, str(work), inf.FRAME_TIMES_SEC)
+    inf.detect_motion_cv(paths, region_aware=False)
+    inf.optical_flow_summary(paths)
+    inf._read_gray(paths[0])  # update_overlay_model
+    for p in paths[:uploaded]:
+        inf.file_sha256(str(p))
+        io.BytesIO(Path(p).read_bytes())  # what files.upload(file=path) reads
+    return sum(p.stat().st_size for p in paths)
+
+
+def memory_path(video: str, work: Path, uploaded: int) -> int:
+    frames = inf.decode_frames_at_times(video, inf.FRAME_TIMES_SEC)
+    inf.detect_motion_cv(frames, region_aware=False)
+    inf.optical_flow_summary(frames)
+    inf._read_gray(frames[0])
+    for f in frames[:uploaded]:
+        hashlib.sha256(f.jpeg).hexdigest()
+        io.BytesIO(f.jpeg)
+    return 0
+
+
+def measure(fn: Callable[[str, Path, int], int], video: str, work: Path, uploaded: int, iters: int) -> Dict[str, Any]:
+    fn(video, work, uploaded)  # warm-up (codec init, page cache)
+    wall, rchar, wchar, peak = [], [], [], []
+    disk = 0
+    for _ in range(iters):
+        io0 = proc_io()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        disk = fn(video, work, uploaded)
+        wall.append((time.perf_counter() - t0) * 1000.0)
+        peak.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        io1 = proc_io()
+        rchar.append(io1["rchar"] - io0["rchar"])
+        wchar.append(io1["wchar"] - io0["wchar"])
+    return {
+        "wall_ms": round(median(wall), 1),
+        "read_mb": round(median(rchar) / 1e6, 2),
+        "written_mb": round(median(wchar) / 1e6, 2),
+        "disk_mb": round(disk / 1e6, 2),
+        "peak_alloc_mb": round(median(peak) / 1e6, 2),
+    }
+
+
+def main():
+    args = sys.argv[1:]
+    iters = int(args[args.index("--iters") + 1]) if "--iters" in args else 10
+    uploaded = int(args[args.index("--uploaded") + 1]) if "--uploaded" in args else 1
+
+    inf.require_ffmpeg()
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        video = str(make_synthetic_clip(work / "frames_clip.mp4", snap_sec=2.5))
+        results = {
+            "files": measure(files_path, video, work, uploaded, iters),
+            "memory": measure(memory_path, video, work, uploaded, iters),
+        }
+
+    print(f"{uploaded} uploaded frame(s), median of {iters} clips")
+    print(f"{'path':>8} {'wall ms':>9} {'read MB':>9} {'written MB':>11} {'disk MB':>9} {'peak alloc MB':>14}")
+    for name, r in results.items():
+        print(f"{name:>8} {r['wall_ms']:>9.1f} {r['read_mb']:>9.2f} {r['written_mb']:>11.2f} "
+              f"{r['disk_mb']:>9.2f} {r['peak_alloc_mb']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
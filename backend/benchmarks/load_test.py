@@ -0,0 +1,262 @@
+"""
+Load test: how many concurrent coaches can one FieldHouse API instance serve?
+
+Drives the FastAPI app with an async HTTP client (httpx), ramping the number
+of concurrent virtual users through each scenario:
+- upload: POST /upload with a synthetic clip
+- analyze: POST /upload, then POST /analyze
+- agent: POST /agent-default; the SSE stream is read to the end
+
+By default the app runs in-process (httpx ASGITransport) with Gemini stubbed:
+- FakeGeminiClient replaces the pipeline client.
+- A scripted LLM replaces the root agent's model; it only calls
+  start_video_analysis.
+- Uploads go to a temp dir.
+In-process mode also measures the server's own event-loop lag, which is what
+a blocking handler (e.g. analyze_video called directly from an async route)
+shows up as.
+
+With --url it targets a running server instead. Gemini is then whatever
+that server uses, and loop lag is measured on the client only.
+
+Each step of the ramp records:
+- throughput
+- latency p50/p90/p99
+- error rate
+- event-loop lag p50/p99/max
+- RSS
+
+The capacity report gives, per scenario, the highest concurrency that kept
+p90 under --slo-sec with under 1% errors. The JSON report goes to
+backend/benchmarks/results/ (gitignored).
+
+Usage: python backend/benchmarks/load_test.py [--scenarios upload,analyze,agent] [--ramp 1,2,4,8]
+                                              [--step-sec 20] [--slo-sec 30] [--latency-scale 0.2] [--url URL]
+"""
+
+import os
+import sys
+import time
+import uuid
+import json
+import asyncio
+import resource
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import httpx
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from backend.agents import inference as inf
+from backend.benchmarks.fake_gemini import FakeGeminiClient, install
+from backend.benchmarks.pipeline_bench import REPORT_DIR, make_synthetic_clip, percentiles
+
+LAG_INTERVAL_SEC = 0.05
+MAX_ERROR_RATE = 0.01
+
+
+# ======================================================
+# In-process app with Gemini stubbed
+# ======================================================
+
+def build_inprocess_app(work: Path, fake: FakeGeminiClient):
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+    from google.genai import types
+
+    from backend.app import main as app_main
+    from backend.agents import agent as root_module
+    from backend.agents.sub_agents.video_analysis import agent as video_module
+
+    class ScriptedLlm(BaseLlm):
+        """Stands in for the root agent's Gemini model: hands every request straight to the video agent."""
+
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            text = " ".join(p.text for c in llm_request.contents or [] for p in (c.parts or []) if p.text)
+            filename = next((w for w in reversed(text.split()) if w.endswith(".mp4")), "missing.mp4")
+            call = types.FunctionCall(name="start_video_analysis", args={"video_filename": filename})
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+
+    install(fake, str(work))
+    uploads = work / "uploads"
+    uploads.mkdir(exist_ok=True)
+    app_main.UPLOADS_DIR = uploads
+    video_module.UPLOADS_DIR = uploads
+    root_module.root_agent.model = ScriptedLlm(model="scripted")
+    return app_main.app
+
+
+# ======================================================
+# Measurements
+# ======================================================
+
+def current_rss_mb() -> float:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # No /proc (macOS): fall back to the peak so far, which never goes down between steps
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+async def measure_loop_lag(samples: List[float], stop: asyncio.Event) -> None:
+    """Oversleep of a periodic timer = how long the loop was blocked by someone else."""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL_SEC)
+        samples.append((time.perf_counter() - t0 - LAG_INTERVAL_SEC) * 1000.0)
+
+
+# ======================================================
+# Scenarios (one virtual user request each)
+# ======================================================
+
+async def do_upload(client: httpx.AsyncClient, clip_bytes: bytes) -> str:
+    name = f"load_{uuid.uuid4().hex[:10]}.mp4"
+    r = await client.post("/upload", files={"file": (name, clip_bytes, "video/mp4")})
+    r.raise_for_status()
+    return name
+
+async def do_analyze(client: httpx.AsyncClient, clip_bytes: bytes) -> None:
+    name = await do_upload(client, clip_bytes)
+    r = await client.post("/analyze", params={"video_filename": name})
+    r.raise_for_status()
+
+async def do_agent(client: httpx.AsyncClient, clip_bytes: bytes) -> None:
+    name = await do_upload(client, clip_bytes)
+    body = {
+        "thread_id": uuid.uuid4().hex, "run_id": uuid.uuid4().hex, "state": {}, "tools": [], "context": [],
+        "forwarded_props": {},
+        "messages": [{"id": uuid.uuid4().hex, "role": "user", "content": f"Analyze the play in {name}"}],
+    }
+    async with client.stream("POST", "/agent-default", json=body, headers={"accept": "text/event-stream"}) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if '"RUN_ERROR"' in line:
+                raise RuntimeError(line[:200])
+
+SCENARIOS = {"upload": do_upload, "analyze": do_analyze, "agent": do_agent}
+
+
+async def run_step(client: httpx.AsyncClient, scenario: str, users: int, step_sec: float,
+                   clip_bytes: bytes) -> Dict[str, Any]:
+    fn = SCENARIOS[scenario]
+    latencies: List[float] = []
+    errors: List[str] = []
+    lag: List[float] = []
+    stop = asyncio.Event()
+    deadline = time.perf_counter() + step_sec
+
+    async def user():
+        # Closed loop: each virtual user sends its next request when the previous one returns
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                await fn(client, clip_bytes)
+                latencies.append(time.perf_counter() - t0)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {str(e)[:160]}")
+
+    lag_task = asyncio.create_task(measure_loop_lag(lag, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(users)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await lag_task
+
+    total = len(latencies) + len(errors)
+    return {
+        "scenario": scenario,
+        "users": users,
+        "requests": total,
+        "errors": len(errors),
+        "error_rate": round(len(errors) / total, 4) if total else 0.0,
+        "error_samples": errors[:3],
+        "throughput_per_min": round(len(latencies) / wall * 60.0, 2) if wall > 0 else None,
+        "latency_sec": percentiles(latencies),
+        "loop_lag_ms": percentiles(lag),
+        "rss_mb": current_rss_mb(),
+    }
+
+
+def capacity(steps: List[Dict[str, Any]], slo_sec: float) -> Dict[str, Any]:
+    ok = [s for s in steps
+          if s["requests"] and s["error_rate"] < MAX_ERROR_RATE and s["latency_sec"].get("p90", 1e9) <= slo_sec]
+    best = max(ok, key=lambda s: s["users"]) if ok else None
+    return {
+        "max_concurrent_users_within_slo": best["users"] if best else 0,
+        "throughput_per_min_at_capacity": best["throughput_per_min"] if best else 0,
+        "peak_throughput_per_min": max((s["throughput_per_min"] or 0 for s in steps), default=0),
+        "worst_loop_lag_ms": max((s["loop_lag_ms"].get("max", 0) for s in steps), default=0),
+    }
+
+
+def _arg(args: List[str], flag: str, default: str) -> str:
+    if flag in args:
+        return args[args.index(flag) + 1]
+    return default
+
+
+async def run(scenarios: List[str], ramp: List[int], step_sec: float, slo_sec: float,
+              url: Optional[str], fake: FakeGeminiClient, work: Path) -> Dict[str, Any]:
+    clip = make_synthetic_clip(work / "load_clip.mp4", snap_sec=4.0)
+    clip_bytes = clip.read_bytes()
+
+    if url:
+        transport, base = None, url.rstrip("/")
+    else:
+        transport, base = httpx.ASGITransport(app=build_inprocess_app(work, fake)), "http://fieldhouse.local"
+
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(transport=transport, base_url=base, timeout=httpx.Timeout(600.0)) as client:
+        for scenario in scenarios:
+            steps = []
+            for users in ramp:
+                print(f"🏋️  {scenario}: {users} concurrent users for {step_sec:.0f}s")
+                step = await run_step(client, scenario, users, step_sec, clip_bytes)
+                steps.append(step)
+                print(f"   {step['throughput_per_min']} req/min, p90 {step['latency_sec'].get('p90')}s, "
+                      f"errors {step['error_rate']:.1%}, loop lag max {step['loop_lag_ms'].get('max')} ms, "
+                      f"RSS {step['rss_mb']} MB")
+            results[scenario] = {"steps": steps, "capacity": capacity(steps, slo_sec)}
+    return results
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__)
+        sys.exit(0)
+    scenarios = _arg(args, "--scenarios", "upload,analyze,agent").split(",")
+    ramp = [int(u) for u in _arg(args, "--ramp", "1,2,4,8").split(",")]
+    step_sec = float(_arg(args, "--step-sec", "20"))
+    slo_sec = float(_arg(args, "--slo-sec", "30"))
+    url = _arg(args, "--url", "") or None
+    fake = FakeGeminiClient(latency_scale=float(_arg(args, "--latency-scale", "0.2")))
+
+    inf.require_ffmpeg()
+    with tempfile.TemporaryDirectory() as tmp:
+        results = asyncio.run(run(scenarios, ramp, step_sec, slo_sec, url, fake, Path(tmp)))
+
+    report = {
+        "target": url or "in-process (Gemini stubbed)",
+        "config": {"scenarios": scenarios, "ramp": ramp, "step_sec": step_sec, "slo_sec": slo_sec,
+                   "latency_scale": None if url else fake.latency_scale},
+        "capacity": {name: r["capacity"] for name, r in results.items()},
+        "scenarios": results,
+    }
+    Path(REPORT_DIR).mkdir(parents=True, exist_ok=True)
+    out = Path(REPORT_DIR) / f"load_test_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    inf.write_json(out, report)
+    print(json.dumps(report["capacity"], indent=2))
+    print(f"✅ Saved to: {out}")
+
+
+if __name__ == "__main__":
+    main()
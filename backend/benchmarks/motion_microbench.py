@@ -0,0 +1,94 @@
+"""
+Microbenchmark: CV motion stage, full resolution vs downsampled fast path.
+
+Generates synthetic 1080p frame triples (or uses the JPEGs you pass in).
+Times the two paths:
+- detect_motion_cv: read + gray + blur + score
+- motion_score_between: scoring alone
+It also checks that both paths make the same motion_detected decision.
+
+Usage: python backend/benchmarks/motion_microbench.py [--iters N] [frame0.jpg frame1.jpg frame2.jpg ...]
+"""
+
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+from statistics import median
+from typing import List
+
+import cv2
+import numpy as np
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from backend.agents import inference as inf
+
+DOWNSAMPLES = [1, 2, 4, 8]
+
+
+def synthetic_triples(out_dir: str, count: int = 8) -> List[List[Path]]:
+    rng = np.random.default_rng(42)
+    triples = []
+    for c in range(count):
+        base = np.full((1080, 1920, 3), (40, 120, 40), np.uint8)
+        for x in range(0, 1920, 120):
+            cv2.line(base, (x, 0), (x, 1079), (230, 230, 230), 4)
+        base = cv2.add(base, rng.integers(0, 12, base.shape, dtype=np.uint8))
+        shift = c * 8
+        paths = []
+        for k in range(3):
+            img = base.copy()
+            for i in range(22):
+                x, y = 150 + i * 75 + shift * k, 450 + (i % 4) * 70
+                cv2.rectangle(img, (x, y), (x + 30, y + 70), (255, 255, 255) if i % 2 else (30, 30, 200), -1)
+            p = Path(out_dir) / f"syn_{c}_{k}.jpg"
+            cv2.imwrite(str(p), img)
+            paths.append(p)
+        triples.append(paths)
+    return triples
+
+def time_ms(fn, iters: int) -> float:
+    samples = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return median(samples)
+
+def main():
+    args = sys.argv[1:]
+    iters = 20
+    if "--iters" in args:
+        i = args.index("--iters")
+        iters = int(args[i + 1])
+        args = args[:i] + args[i + 2:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args:
+            paths = [Path(a) for a in args]
+            triples = [paths[i:i + 3] for i in range(0, len(paths) - 2, 3)]
+        else:
+            triples = synthetic_triples(tmp)
+
+        reference = [inf.detect_motion_cv(t, downsample=1)["motion_detected"] for t in triples]
+        base_ms = None
+        print(f"{'downsample':>10} {'stage ms/clip':>14} {'score ms/pair':>14} {'speedup':>8} {'decisions':>10}")
+        for ds in DOWNSAMPLES:
+            stage_ms = time_ms(lambda: [inf.detect_motion_cv(t, downsample=ds) for t in triples], iters) / len(triples)
+
+            g0 = inf._read_gray(triples[0][0], ds)
+            g1 = inf._read_gray(triples[0][1], ds)
+            scratch = np.empty_like(g0)
+            score_ms = time_ms(lambda: inf.motion_score_between(g0, g1, scratch), iters * 10)
+
+            decisions = [inf.detect_motion_cv(t, downsample=ds)["motion_detected"] for t in triples]
+            same = sum(a == b for a, b in zip(decisions, reference))
+            base_ms = base_ms or stage_ms
+            print(f"{ds:>10} {stage_ms:>14.2f} {score_ms:>14.3f} {base_ms / stage_ms:>7.1f}x {same:>4}/{len(triples)}")
+
+
+if __name__ == "__main__":
+    main()
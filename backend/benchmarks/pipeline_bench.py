@@ -0,0 +1,195 @@
+"""
+Offline end-to-end benchmark: analyze_video against synthetic clips and a fake Gemini.
+
+Nothing leaves the machine. Clips are generated with ffmpeg lavfi sources: a
+green field with yard lines and a few "players" that hold still and then
+move at a per-clip snap time. Gemini is replaced by FakeGeminiClient
+(configurable latency and 503 injection). Chroma, outputs, the upload
+registry and the overlay model all live in a temp dir. The JSON report goes
+to backend/benchmarks/results/ (gitignored).
+
+Reports:
+- per-stage latency percentiles, from meta.trace in every combined_run.json
+- end-to-end latency percentiles
+- throughput (runs/min) at each concurrency level
+- peak RSS for this process and for the largest ffmpeg child, as high-water marks since
+  start: a phase's value includes every phase before it
+- RAG write-back: runs indexed in the background and their index freshness (seconds)
+
+Repeat runs of a clip reuse its result through the fingerprint index unless
+--no-fingerprint is given. RAG write-back runs against the bench's temporary
+Chroma unless --no-writeback is given.
+
+Usage: python backend/benchmarks/pipeline_bench.py [--clips N] [--runs N] [--concurrency 1,2,4]
+                                                   [--latency-scale X] [--failure-rate P] [--seed S]
+                                                   [--no-fingerprint] [--no-writeback]
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+
+import numpy as np
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from backend.agents import inference as inf
+from backend.benchmarks.fake_gemini import FakeGeminiClient, install
+
+CLIP_SEC = 10
+REPORT_DIR = Path(__file__).resolve().parent / "results"
+
+
+def make_synthetic_clip(out: Path, snap_sec: float, players: int = 3, seed: int = 0) -> Path:
+    """Field + yard lines + `players` boxes that stay set until snap_sec, then move."""
+    inputs = ["-f", "lavfi", "-i", f"color=c=0x287828:s=1280x720:d={CLIP_SEC}:r=30"]
+    chain = [f"[0]drawgrid=w=128:h=720:t=4:c=white@0.9,noise=alls=6:allf=t+u:all_seed={seed}[bg0]"]
+    for i in range(players):
+        inputs += ["-f", "lavfi", "-i", f"color=c=white:s=36x84:d={CLIP_SEC}:r=30"]
+        x0, y0, speed = 420 + i * 140, 300 + (i % 2) * 90, 180 + 60 * i
+        chain.append(
+            f"[bg{i}][{i + 1}]overlay=x='if(lt(t,{snap_sec}),{x0},{x0}+(t-{snap_sec})*{speed})':y={y0}[bg{i + 1}]"
+        )
+    cmd = ["ffmpeg", "-y", "-v", "error", *inputs, "-filter_complex", ";".join(chain),
+           "-map", f"[bg{players}]", "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", str(out)]
+    subprocess.run(cmd, check=True)
+    return out
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is a high-water mark since process start (not per phase); KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"n": len(values), "p50": round(float(p50), 2), "p90": round(float(p90), 2),
+            "p99": round(float(p99), 2), "max": round(float(max(values)), 2)}
+
+
+def run_phase(clips: List[Path], runs: int, concurrency: int, work: Path) -> Dict[str, Any]:
+    # Fresh registry/fingerprint index per phase so every phase pays for its own uploads
+    inf.UPLOAD_REGISTRY_PATH = work / f"upload_registry_c{concurrency}.json"
+    inf.FINGERPRINT_INDEX_PATH = work / f"fingerprint_index_c{concurrency}.npz"
+    jobs = [clips[i % len(clips)] for i in range(runs)]
+    errors: List[str] = []
+
+    def one(clip: Path):
+        try:
+            return inf.analyze_video(str(clip))
+        except Exception as e:
+            errors.append(f"{clip.name}: {str(e)[:200]}")
+            return None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [r for r in pool.map(one, jobs) if r]
+    wall = time.perf_counter() - started
+
+    stages: Dict[str, List[float]] = {}
+    for r in results:
+        for span in r["meta"]["trace"]["spans"]:
+            stages.setdefault(span["name"], []).append(span["wall_ms"])
+
+    return {
+        "concurrency": concurrency,
+        "runs": len(jobs),
+        "succeeded": len(results),
+        "errors": errors,
+        "wall_sec": round(wall, 2),
+        "runs_per_min": round(len(results) / wall * 60.0, 2) if wall > 0 else None,
+        "end_to_end_ms": percentiles([r["meta"]["trace"]["total_wall_ms"] for r in results]),
+        "stage_ms": {name: percentiles(v) for name, v in stages.items()},
+        "escalated_to_final": sum(1 for r in results if r["meta"]["routing"]["use_final_model"]),
+        "fingerprint_reuses": sum(1 for r in results if "fingerprint_match" in r["meta"]),
+        "peak_rss_mb_cumulative": peak_rss_mb(),
+    }
+
+
+def _arg(args: List[str], flag: str, default: str) -> str:
+    if flag in args:
+        return args[args.index(flag) + 1]
+    return default
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__)
+        sys.exit(0)
+    n_clips = int(_arg(args, "--clips", "4"))
+    runs = int(_arg(args, "--runs", "8"))
+    levels = [int(c) for c in _arg(args, "--concurrency", "1,2,4").split(",")]
+    inf.FINGERPRINT_ENABLED = inf.FINGERPRINT_ENABLED and "--no-fingerprint" not in args
+    inf.RAG_WRITEBACK_ENABLED = inf.RAG_WRITEBACK_ENABLED and "--no-writeback" not in args
+    fake = FakeGeminiClient(
+        latency_scale=float(_arg(args, "--latency-scale", "0.2")),
+        failure_rate=float(_arg(args, "--failure-rate", "0.0")),
+        seed=int(_arg(args, "--seed", "7")),
+    )
+
+    inf.require_ffmpeg()
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        install(fake, tmp)
+        inf.ensure_dirs()
+
+        print(f"🎬 Generating {n_clips} synthetic clips")
+        clips = [make_synthetic_clip(work / f"synthetic_{i}.mp4", snap_sec=3.0 + 1.1 * i, seed=i)
+                 for i in range(n_clips)]
+
+        phases = []
+        for c in levels:
+            print(f"🏃 {runs} runs at concurrency {c}")
+            phase = run_phase(clips, runs, c, work)
+            phases.append(phase)
+            print(f"   {phase['runs_per_min']} runs/min, e2e p50 {phase['end_to_end_ms'].get('p50')} ms, "
+                  f"p90 {phase['end_to_end_ms'].get('p90')} ms, {len(phase['errors'])} errors")
+
+        # Let the background RAG write-back drain before the temp Chroma goes away
+        drain_until = time.monotonic() + 30
+        while inf.rag_indexer_stats()["pending"] and time.monotonic() < drain_until:
+            time.sleep(0.1)
+        rag_writeback = inf.rag_indexer_stats()
+
+    report = {
+        "config": {
+            "clips": n_clips, "runs_per_phase": runs, "concurrency": levels,
+            "latency": fake.latency, "latency_scale": fake.latency_scale, "failure_rate": fake.failure_rate,
+            "clip_profile": inf.CLIP_PROFILE, "cascade": inf.CASCADE_ENABLED, "fingerprint": inf.FINGERPRINT_ENABLED,
+        },
+        "fake_calls": fake.calls,
+        "injected_failures": fake.injected_failures,
+        "phases": phases,
+        "rag_writeback": rag_writeback,
+        "peak_rss_mb_cumulative": peak_rss_mb(),
+    }
+    Path(REPORT_DIR).mkdir(parents=True, exist_ok=True)
+    out = Path(REPORT_DIR) / f"bench_pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    inf.write_json(out, report)
+    print(f"\n{'stage':>20} " + " ".join(f"{'c=' + str(p['concurrency']) + ' p50/p90 ms':>22}" for p in phases))
+    for name in phases[0]["stage_ms"]:
+        cells = [p["stage_ms"].get(name, {}) for p in phases]
+        print(f"{name:>20} " + " ".join(f"{c.get('p50', 0):>10.1f} / {c.get('p90', 0):>9.1f}" for c in cells))
+    print(f"\nRAG write-back: {rag_writeback['indexed']} runs indexed, freshness last "
+          f"{rag_writeback['last_freshness_sec']}s / max {rag_writeback['max_freshness_sec']}s")
+    print(f"Peak RSS (whole bench): {json.dumps(report['peak_rss_mb_cumulative'])} MB")
+    print(f"✅ Saved to: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import sys
+import os
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents.inference import CascadeFirstPass, route_final_stage
+
+OFF_DEF = {"offense_side": "left", "defense_side": "right"}
+CANDIDATES = ["Inside Zone", "play action", "quick game"]
+
+
+def first_pass(confidence, plays=("inside zone", "play action", "quick game")):
+    return CascadeFirstPass(ranked_plays=list(plays), confidence=confidence, paragraph="p")
+
+
+def test_confident_and_agreeing_skips_final_model():
+    decision = route_final_stage(first_pass(0.9), CANDIDATES, OFF_DEF)
+    assert decision["use_final_model"] is False
+    assert decision["reasons"] == []
+
+
+def test_low_confidence_escalates():
+    decision = route_final_stage(first_pass(0.4), CANDIDATES, OFF_DEF)
+    assert decision["use_final_model"] is True
+
+
+def test_disagreement_with_rag_candidates_escalates():
+    decision = route_final_stage(first_pass(0.95, ("hail mary", "play action", "quick game")), CANDIDATES, OFF_DEF)
+    assert decision["use_final_model"] is True
+    assert any("RAG" in r for r in decision["reasons"])
+
+
+def test_unknown_sides_escalate():
+    decision = route_final_stage(first_pass(0.95), CANDIDATES, {"offense_side": "unknown", "defense_side": "unknown"})
+    assert decision["use_final_model"] is True
+
+
+def test_generic_fallback_candidates_escalate():
+    decision = route_final_stage(first_pass(0.95), CANDIDATES, OFF_DEF, rag_fallback=True)
+    assert decision["use_final_model"] is True
+    assert any("fallback" in r for r in decision["reasons"])
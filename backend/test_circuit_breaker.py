@@ -0,0 +1,100 @@
+import sys
+import os
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors as genai_errors
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+
+def _overloaded():
+    return genai_errors.ServerError(503, {"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}})
+
+
+@pytest.fixture
+def breakers(monkeypatch):
+    monkeypatch.setattr(inference, "_breakers", {})
+    monkeypatch.setattr(inference, "MODEL_FALLBACKS", {"primary": ["backup"]})
+    monkeypatch.setattr(inference, "CONTEXT_CACHE_ENABLED", False)
+    monkeypatch.setattr(inference, "BREAKER_MIN_CALLS", 2)
+    monkeypatch.setattr(inference, "_backoff_sleep", lambda model, attempt, delay, deadline=None: delay)
+
+
+def test_breaker_opens_then_probes_once(breakers, monkeypatch):
+    b = inference.get_breaker("primary")
+    b.record(False)
+    b.record(False)
+    assert b.state == "open" and not b.allow()
+
+    monkeypatch.setattr(inference, "BREAKER_OPEN_SEC", 0.0)
+    assert b.allow()          # the single half-open probe
+    assert not b.allow()      # everyone else waits for its outcome
+    b.record(True)
+    assert b.state == "closed" and b.allow()
+
+
+def test_open_primary_fails_over_and_records_the_serving_model(breakers, monkeypatch):
+    calls = []
+
+    class Models:
+        def generate_content(self, model, contents, config=None):
+            calls.append(model)
+            if model == "primary":
+                raise _overloaded()
+            return SimpleNamespace(text="ok", usage_metadata=None)
+
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(models=Models()))
+    usage = inference.new_usage_report()
+    assert inference.call_model_with_backoff("primary", ["x"], usage=usage) == "ok"
+    # Breaker is now open: the next call goes straight to the fallback
+    assert inference.call_model_with_backoff("primary", ["x"], usage=usage) == "ok"
+
+    assert calls == ["primary", "primary", "backup", "backup"]
+    assert inference.served_model(usage, "primary") == "backup"
+    assert inference.breaker_states() == {"primary": "open", "backup": "closed"}
+
+
+def test_cancelled_stream_gives_the_half_open_probe_back(breakers, monkeypatch):
+    deadline = inference.Deadline(60.0)
+
+    class Models:
+        def generate_content_stream(self, model, contents, config=None):
+            deadline.cancel.set()  # caller goes away before the first text chunk
+            yield SimpleNamespace(text=None, usage_metadata=None)
+
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(models=Models()))
+    b = inference.get_breaker("primary")
+    b.record(False)
+    b.record(False)
+    monkeypatch.setattr(inference, "BREAKER_OPEN_SEC", 0.0)
+
+    with pytest.raises(inference.AnalysisCancelled):
+        list(inference.call_model_stream_with_backoff("primary", ["x"], deadline=deadline))
+    assert b.state == "half_open" and not b.probing
+    assert inference.pick_model("primary") == "primary"
+
+
+def test_internal_server_errors_count_against_the_model(breakers, monkeypatch):
+    def internal():
+        return genai_errors.ServerError(500, {"error": {"code": 500, "message": "internal", "status": "INTERNAL"}})
+
+    class Models:
+        def generate_content(self, model, contents, config=None):
+            raise internal()
+
+        def generate_content_stream(self, model, contents, config=None):
+            raise internal()
+            yield
+
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(models=Models()))
+    with pytest.raises(genai_errors.ServerError):
+        inference.call_model_with_backoff("primary", ["x"])
+    with pytest.raises(genai_errors.ServerError):
+        list(inference.call_model_stream_with_backoff("primary", ["x"]))
+    assert inference.breaker_states() == {"primary": "open"}
@@ -0,0 +1,90 @@
+import sys
+import os
+
+import cv2
+import numpy as np
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+
+def _scan(snap_sec=None, total_sec=6.0):
+    """(t, gray) at SCAN_FPS: a box that holds still, then slides right from snap_sec on."""
+    w, h = inference.SCAN_SIZE
+    step = 1.0 / inference.SCAN_FPS
+    for i in range(int(total_sec * inference.SCAN_FPS)):
+        t = i * step
+        x = 40 + (0 if snap_sec is None or t < snap_sec else int(round((t - snap_sec) / step + 1)) * 30)
+        img = np.full((h, w), 60, np.uint8)
+        cv2.rectangle(img, (x, 50), (x + 60, 130), 230, -1)
+        yield round(t, 2), img
+
+
+def test_snap_needs_a_long_enough_set_phase_and_a_real_burst():
+    tracker = inference.SnapTracker(set_max_ratio=0.01, set_min_sec=1.0, snap_min_ratio=0.035)
+    assert not any(tracker.update(t / 5, 0.0) for t in range(1, 7))   # set from 0.2s to 1.2s
+    assert tracker.update(1.4, 0.05)
+    assert tracker.set_start == 0.2
+
+    tracker = inference.SnapTracker(set_max_ratio=0.01, set_min_sec=1.0, snap_min_ratio=0.035)
+    for t in (0.2, 0.4, 0.6):
+        tracker.update(t, 0.0)
+    assert not tracker.update(0.8, 0.05)       # set for only 0.4s
+    for t in (1.0, 1.2, 1.4, 1.6, 1.8, 2.0, 2.2):
+        tracker.update(t, 0.0)
+    assert not tracker.update(2.4, 0.02)       # drift, not a snap; the set phase restarts
+    assert tracker.still_since is None
+
+
+def test_frames_without_the_field_do_not_count_as_set():
+    tracker = inference.SnapTracker(set_max_ratio=0.01, set_min_sec=1.0, snap_min_ratio=0.035)
+    for i in range(1, 10):
+        tracker.update(i / 5, 0.0, field_visible=False)   # still crowd shot / graphics
+    assert not tracker.update(2.0, 0.05)
+
+
+def test_window_is_cut_around_the_set_and_snap(monkeypatch):
+    monkeypatch.setattr(inference, "iter_gray_frames", lambda video, max_sec=None, deadline=None: _scan(snap_sec=3.0))
+    window = inference.select_clip_window("clip.mp4")
+    assert window["method"] == "adaptive_set_snap"
+    assert (window["set_start_sec"], window["snap_sec"]) == (0.2, 3.0)
+    end = 3.0 + inference.ADAPTIVE_POST_SNAP_SEC
+    assert window["start"] == 0.0 and window["duration"] == end
+    assert window["field_gate"] is False        # no yard lines anywhere, so the gate is off
+
+    monkeypatch.setattr(inference, "iter_gray_frames", lambda video, max_sec=None, deadline=None: _scan())
+    fixed = inference.select_clip_window("clip.mp4")
+    assert fixed["method"] == "fixed" and fixed["duration"] == inference.CLIP_DURATION_SEC
+
+
+def test_ratios_are_scaled_to_the_same_gap_for_short_windows():
+    frames = []
+    for x in (40, 70, 100):
+        img = np.full((360, 640, 3), 60, np.uint8)
+        cv2.rectangle(img, (x, 100), (x + 60, 220), (230, 230, 230), -1)
+        frames.append(inference.InMemoryFrame(0, bgr=img))
+
+    assert inference.frame_times_for_window(3.0) == [0, 1.0, 2.0]
+    wide = inference.detect_motion_cv(frames, [0, 2, 4], region_aware=False)["pairwise_motion_ratio"]
+    short = inference.detect_motion_cv(frames, [0, 1.0, 2.0], region_aware=False)["pairwise_motion_ratio"]
+    assert wide["t0_to_t2"] > 0
+    for key in ("t0_to_t2", "t2_to_t4"):
+        assert abs(short[key] - 2 * wide[key]) < 1e-5
+
+
+def test_a_given_window_gets_its_own_single_flight_key(tmp_path):
+    clip = tmp_path / "play.mp4"
+    clip.write_bytes(b"clip")
+    window = {"method": "live_feed_snap", "start": 0.0, "duration": 6.0}
+    assert inference.analysis_key(str(clip), window=window) == inference.analysis_key(str(clip)) + ":0+6"
+
+
+def test_final_prompt_context_describes_the_selected_window():
+    window = {"method": "adaptive_set_snap", "start": 7.5, "duration": 5.5, "set_start_sec": 8.0, "snap_sec": 11.0}
+    assert inference._clip_window_context(window) == {
+        "start_sec": 7.5, "duration_sec": 5.5, "method": "adaptive_set_snap", "snap_sec_in_clip": 3.5}
+    assert "first 6 seconds" not in inference.MASTER_PROMPT_WITH_RAG
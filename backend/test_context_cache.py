@@ -0,0 +1,81 @@
+import sys
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+
+class Caches:
+    """Records caches.create calls; `gates` can hold a model's create until released."""
+
+    def __init__(self):
+        self.created = []
+        self.gates = {}
+        self.fail = set()
+
+    def create(self, model, config=None):
+        if model in self.gates:
+            self.gates[model].wait(5)
+        if model in self.fail:
+            raise RuntimeError("below minimum cacheable size")
+        self.created.append(model)
+        return SimpleNamespace(name=f"cachedContents/{model}-{len(self.created)}", expire_time=None)
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    c = Caches()
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(caches=c))
+    monkeypatch.setattr(inference, "CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(inference, "_context_caches", {})
+    monkeypatch.setattr(inference, "_context_cache_key_locks", {})
+    return c
+
+
+def test_hit_miss_and_invalidation(caches, monkeypatch):
+    first = inference.get_context_cache("m", "prompt")
+    assert inference.get_context_cache("m", "prompt") == first       # hit
+    assert caches.created == ["m"]
+
+    inference.invalidate_context_cache("m", "prompt")
+    assert inference.get_context_cache("m", "prompt") != first       # recreated after invalidation
+    assert inference.get_context_cache("m", "other prompt") is not None
+    assert caches.created == ["m", "m", "m"]
+
+    # Inside the refresh margin counts as a miss
+    key = ("m", inference._prompt_key("prompt"))
+    inference._context_caches[key]["expires_at"] = inference.time.time() + inference.CONTEXT_CACHE_REFRESH_MARGIN_SEC / 2
+    inference.get_context_cache("m", "prompt")
+    assert len(caches.created) == 4
+
+
+def test_failed_create_is_not_retried_until_the_retry_window(caches):
+    caches.fail.add("m")
+    assert inference.get_context_cache("m", "prompt") is None
+    caches.fail.clear()
+    assert inference.get_context_cache("m", "prompt") is None
+    assert caches.created == []
+
+
+def test_slow_create_only_blocks_callers_for_the_same_prompt(caches):
+    caches.gates["slow"] = threading.Event()
+    names = []
+    waiters = [threading.Thread(target=lambda: names.append(inference.get_context_cache("slow", "prompt")))
+               for _ in range(3)]
+    for t in waiters:
+        t.start()
+
+    assert inference.get_context_cache("fast", "prompt") is not None   # not stuck behind "slow"
+    caches.gates["slow"].set()
+    for t in waiters:
+        t.join(5)
+    assert caches.created == ["fast", "slow"]                          # one create for the three callers
+    assert len(set(names)) == 1
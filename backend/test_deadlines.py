@@ -0,0 +1,70 @@
+import sys
+import os
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors as genai_errors
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+
+def test_cancel_kills_the_child_process():
+    deadline = inference.Deadline(60)
+    threading.Timer(0.2, deadline.cancel.set).start()
+    started = time.monotonic()
+    with pytest.raises(inference.AnalysisCancelled):
+        inference.run_ffmpeg([sys.executable, "-c", "import time; time.sleep(30)"], deadline, "cut")
+    assert time.monotonic() - started < 3
+
+
+def test_stage_budget_is_capped_by_the_overall_deadline():
+    deadline = inference.Deadline(5)
+    assert deadline.stage_budget("final_stream") <= 5
+    with pytest.raises(inference.DeadlineExceeded):
+        deadline.sleep(10)
+
+
+def test_backoff_stops_at_the_deadline(monkeypatch):
+    class Overloaded:
+        def generate_content(self, model, contents, config=None):
+            raise genai_errors.ServerError(503, {"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}})
+
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(models=Overloaded()))
+    monkeypatch.setattr(inference, "CONTEXT_CACHE_ENABLED", False)
+    started = time.monotonic()
+    with pytest.raises(inference.DeadlineExceeded):
+        inference.call_model_with_backoff("m", ["x"], deadline=inference.Deadline(1.5))
+    assert time.monotonic() - started < 3
+
+
+def test_abandoned_run_deletes_only_uploads_nobody_else_can_reuse(monkeypatch, tmp_path):
+    deleted = []
+
+    def wait_until_active(f, deadline=None):
+        if f.name == "files/slow":
+            raise inference.AnalysisCancelled("cancelled while processing")
+        return f
+
+    files = SimpleNamespace(upload=lambda file, config: SimpleNamespace(name="files/" + file.getvalue().decode(),
+                                                                         expiration_time=None),
+                            delete=lambda name: deleted.append(name))
+    monkeypatch.setattr(inference, "UPLOAD_REGISTRY_PATH", tmp_path / "registry.json")
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(files=files))
+    monkeypatch.setattr(inference, "wait_until_active", wait_until_active)
+
+    deadline = inference.Deadline(10)
+    inference.upload_and_wait(inference.InMemoryFrame(0, jpeg=b"ready"), deadline=deadline)
+    with pytest.raises(inference.AnalysisCancelled):
+        inference.upload_and_wait(inference.InMemoryFrame(2, jpeg=b"slow"), deadline=deadline)
+    assert inference.discard_fresh_uploads(deadline) == 1
+
+    # The registered upload may already be serving another run; only the unregistered one goes
+    assert deleted == ["files/slow"]
+    assert [e["name"] for e in inference._load_registry().values()] == ["files/ready"]
@@ -0,0 +1,91 @@
+import sys
+import os
+import shutil
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+pytest.importorskip("av")
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg backend needs the ffmpeg binary")
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    """8s 30fps clip: a white box that holds still for 3s, then slides right."""
+    path = tmp_path_factory.mktemp("decode") / "clip.mp4"
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30, (640, 360))
+    for i in range(240):
+        img = np.full((360, 640, 3), (40, 120, 40), np.uint8)
+        x = 100 + max(0, i - 90) * 3
+        cv2.rectangle(img, (x, 150), (x + 30, 220), (255, 255, 255), -1)
+        out.write(img)
+    out.release()
+    return str(path)
+
+
+def test_backends_decode_the_same_stills(clip):
+    times = [0, 2, 4]
+    ffmpeg = inference.FfmpegDecoder().frames_at(clip, times, offset_sec=1.0)
+    pyav = inference.PyAVDecoder().frames_at(clip, times, offset_sec=1.0)
+    a = inference.detect_motion_cv(ffmpeg, times, region_aware=False)
+    b = inference.detect_motion_cv(pyav, times, region_aware=False)
+    assert a["motion_detected"] == b["motion_detected"] and a["timing_guess"] == b["timing_guess"]
+    for f, g in zip(ffmpeg, pyav):
+        assert np.abs(f.gray(2).astype(int) - g.gray(2).astype(int)).mean() < 3
+
+
+def test_pyav_cut_matches_the_profile_and_scan_rate(clip, tmp_path):
+    decoder = inference.PyAVDecoder()
+    out = tmp_path / "cut.mp4"
+    decoder.cut(clip, str(out), 1.0, 4.0, inference.TRANSCODE_PROFILES["480p10"])
+    cap = cv2.VideoCapture(str(out))
+    assert cap.get(cv2.CAP_PROP_FRAME_HEIGHT) == 360  # never upscaled past the source
+    assert cap.get(cv2.CAP_PROP_FRAME_COUNT) == 40
+    cap.release()
+
+    scanned = list(decoder.gray_frames(clip, 5, (320, 180)))
+    assert len(scanned) == 40 and scanned[0][1].shape == (180, 320)
+
+
+def test_pyav_falls_back_to_ffmpeg_on_any_error(clip, monkeypatch, tmp_path):
+    def broken_open(*args, **kwargs):
+        raise ValueError("unexpected stream layout")
+
+    monkeypatch.setattr(inference.av, "open", broken_open)
+    decoder = inference.PyAVDecoder()
+    frames = decoder.frames_at(clip, [0, 2], offset_sec=1.0)
+    assert [f.t_sec for f in frames] == [0, 2]
+
+    out = tmp_path / "cut.mp4"
+    decoder.cut(clip, str(out), 1.0, 4.0, inference.TRANSCODE_PROFILES["480p10"])
+    assert out.stat().st_size > 0
+    assert len(list(decoder.gray_frames(clip, 5, (320, 180), max_sec=2))) == 10
+
+
+def test_pyav_scan_stops_at_the_deadline_between_skipped_frames(clip):
+    class CancelAfter(threading.Event):
+        """Reads as set from the `n`th check on."""
+        def __init__(self, n):
+            super().__init__()
+            self.checks, self.n = 0, n
+
+        def is_set(self):
+            self.checks += 1
+            return self.checks >= self.n
+
+    cancel = CancelAfter(4)
+    frames = inference.PyAVDecoder().gray_frames(clip, 1, (320, 180), deadline=inference.Deadline(60, cancel=cancel))
+    assert next(frames)[0] == 0
+    # 1 fps over 30 fps input: the next yield is 30 decoded frames away
+    with pytest.raises(inference.AnalysisCancelled):
+        next(frames)
+    assert cancel.checks == 4
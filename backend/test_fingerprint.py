@@ -0,0 +1,104 @@
+import sys
+import os
+import json
+import time
+
+import cv2
+import numpy as np
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+
+def _frames(seed, shift=0):
+    rng = np.random.default_rng(seed)
+    base = np.full((720, 1280, 3), (40, 120, 40), np.uint8)
+    for x in range(0, 1280, 128):
+        cv2.line(base, (x, 0), (x, 719), (230, 230, 230), 4)
+    boxes = rng.integers(100, 1100, (11, 2))
+    out = []
+    for k in range(3):
+        img = base.copy()
+        for x, y in boxes:
+            x = int(x) + shift * k
+            cv2.rectangle(img, (x, int(y) % 600), (x + 30, int(y) % 600 + 70), (255, 255, 255), -1)
+        out.append(img)
+    return out
+
+
+def _reencode(img):
+    small = cv2.resize(img, (854, 480), interpolation=cv2.INTER_AREA)
+    return cv2.imdecode(cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, 35])[1], cv2.IMREAD_COLOR)
+
+
+def _fingerprint(images):
+    return inference.video_fingerprint([inference.InMemoryFrame(t, bgr=img) for t, img in enumerate(images)])
+
+
+def test_reencoded_copy_matches_and_other_play_does_not():
+    play = _frames(1, shift=40)
+    index = inference.FingerprintIndex()
+    index.add(_fingerprint(play), {"config": "cfg", "result": "play.json", "added_at": time.time()})
+
+    hit = index.search(_fingerprint([_reencode(img) for img in play]), "cfg")
+    assert hit is not None and hit[0]["result"] == "play.json"
+    assert index.search(_fingerprint(_frames(2, shift=40)), "cfg") is None
+    # Results from another prompt/model config are never reused
+    assert index.search(_fingerprint(play), "other-cfg") is None
+
+
+def test_lookup_reads_the_stored_result_and_skips_missing_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference, "FINGERPRINT_INDEX_PATH", tmp_path / "fp.npz")
+    fp = _fingerprint(_frames(3))
+    result = tmp_path / "combined_run.json"
+    result.write_text(json.dumps({"final_paragraph": "Inside zone."}))
+    inference.add_fingerprint(fp, result, tmp_path / "a.mp4")
+
+    match = inference.lookup_fingerprint(fp)
+    assert match["max_hamming_bits"] == 0 and match["result"]["final_paragraph"] == "Inside zone."
+
+    result.unlink()
+    assert inference.lookup_fingerprint(fp) is None
+
+
+def test_expired_and_degraded_results_are_not_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference, "FINGERPRINT_INDEX_PATH", tmp_path / "fp.npz")
+    fp = _fingerprint(_frames(4))
+    result = tmp_path / "combined_run.json"
+    result.write_text(json.dumps({"meta": {"degraded": []}, "final_paragraph": "Inside zone."}))
+    inference.add_fingerprint(fp, result, tmp_path / "a.mp4")
+    assert inference.lookup_fingerprint(fp) is not None
+
+    monkeypatch.setattr(inference, "FINGERPRINT_TTL_SEC", 0.0)
+    assert inference.lookup_fingerprint(fp) is None
+    monkeypatch.setattr(inference, "FINGERPRINT_TTL_SEC", 3600.0)
+
+    result.write_text(json.dumps({"meta": {"degraded": ["stage1 fallback"]}, "final_paragraph": "Inside zone."}))
+    assert inference.lookup_fingerprint(fp) is None
+
+
+def test_replayed_result_describes_this_clip_and_names_the_matched_run(tmp_path):
+    stored = {
+        "meta": {"run_id": "src_run", "video_sha256": "source-digest", "clip_window_sec": {"start": 0, "duration": 6},
+                 "clip_selection": {"window": {"method": "fixed"}}, "routing": {"use_final_model": True}},
+        "final_paragraph": "Inside zone.", "rag_play_candidates": {},
+        "stage2_motion_cv": {}, "stage1_offense_defense": {}, "rag_examples": [],
+    }
+    match = {"entry": {"result": "src/combined_run.json", "video": "src.mp4"}, "max_hamming_bits": 3, "result": stored}
+    video, clip = tmp_path / "copy.mp4", tmp_path / "clip.mp4"
+    video.write_bytes(b"phone capture")
+    clip.write_bytes(b"cut")
+    window = {"method": "adaptive_set_snap", "start": 1.5, "duration": 4.5, "snap_sec": 5.0}
+
+    events = list(inference._reuse_matched_result(match, video, clip, window, tmp_path, "this_run",
+                                                  inference.RunTrace(), inference.Deadline(60)))
+    meta = events[-1]["result"]["meta"]
+    assert meta["video_sha256"] == inference.file_digest_cached(str(video))
+    assert meta["clip_selection"]["window"] == window and meta["clip_selection"]["sent"]["bytes"] == 0
+    assert meta["clip_window_sec"] == {"start": 1.5, "duration": 4.5}
+    assert (meta["run_id"], meta["matched_run_id"]) == ("this_run", "src_run")
+    assert events[-1]["result"]["final_paragraph"] == "Inside zone."
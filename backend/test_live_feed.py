@@ -0,0 +1,113 @@
+import sys
+import os
+import time
+import threading
+
+import numpy as np
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference, live_feed
+
+SNAPS = [2.0, 5.0, 16.0, 30.0]    # 5.0 is inside MIN_PLAY_GAP_SEC of the first play
+SCENE_CUT = 8.0
+TOTAL_SEC = 34.0
+
+
+def _broadcast(decoded):
+    """(t, gray) at LIVE_DECODE_FPS: a set box that shakes for 1s after each snap; the shot cuts once."""
+    def frames(video, fps, size, max_sec=None, deadline=None):
+        w, h = size
+        for i in range(int(TOTAL_SEC * fps)):
+            t = round(i / fps, 2)
+            since = [round((t - s) * fps) for s in SNAPS if s <= t < s + 1.0]
+            x = 100 if since and since[0] % 2 == 0 else 40
+            img = np.full((h, w), 200 if t >= SCENE_CUT else 60, np.uint8)
+            img[50:130, x:x + 60] = 250
+            decoded.append(t)
+            yield t, img
+    return frames
+
+
+def test_snaps_become_windows_after_a_set_phase_with_a_gap_between_plays(monkeypatch):
+    monkeypatch.setattr(inference, "iter_gray_frames", _broadcast([]))
+    stats = {"video_sec_decoded": 0.0, "scene_cuts": 0}
+    windows = list(live_feed.detect_play_windows("broadcast.mp4", stats))
+
+    assert [w["snap_sec"] for w in windows] == [2.0, 16.0, 30.0]
+    assert [w["play_index"] for w in windows] == [1, 2, 3]
+    assert windows[0]["window_start_sec"] == 0.0
+    assert windows[1]["window_start_sec"] == 16.0 - live_feed.PRE_SNAP_SEC
+    assert windows[1]["window_duration_sec"] == live_feed.PRE_SNAP_SEC + live_feed.POST_SNAP_SEC
+    assert stats["scene_cuts"] == 1 and stats["video_sec_decoded"] == TOTAL_SEC - 0.2
+
+
+def test_decoding_waits_for_a_full_queue_and_no_play_is_dropped(tmp_path, monkeypatch):
+    decoded, analyzed, windows, gate = [], [], [], threading.Event()
+
+    def analyze_video(clip, window=None):
+        analyzed.append(clip)
+        windows.append(window)
+        gate.wait(5)
+        if "play002" in clip:
+            raise RuntimeError("model overloaded")
+        return {"final_paragraph": "Likely mesh.", "meta": {"run_id": "r"}}
+
+    video = tmp_path / "broadcast.mp4"
+    video.write_bytes(b"")
+    monkeypatch.setattr(inference, "iter_gray_frames", _broadcast(decoded))
+    monkeypatch.setattr(inference, "analyze_video", analyze_video)
+    monkeypatch.setattr(inference, "cut_subclip", lambda video, out, start, dur: open(out, "wb").close())
+    monkeypatch.setattr(inference, "require_ffmpeg", lambda: None)
+    monkeypatch.setattr(inference, "ensure_dirs", lambda: None)
+    monkeypatch.setattr(inference, "OUTPUT_DIR", tmp_path / "outputs")
+    monkeypatch.setattr(live_feed, "LIVE_QUEUE_SIZE", 1)
+
+    reports = []
+    runner = threading.Thread(target=lambda: reports.append(live_feed.run_live_feed(str(video), workers=1)))
+    runner.start()
+    time.sleep(0.5)
+    # One play in the worker, one in the queue; the decoder is parked on the third
+    assert len(analyzed) == 1 and decoded[-1] == 30.0
+
+    gate.set()
+    runner.join(5)
+    report = reports[0]
+    assert report["plays_detected"] == 3 and decoded[-1] == TOTAL_SEC - 0.2
+    assert [p["status"] for p in report["plays"]] == ["success", "error", "success"]
+    assert report["decode_error"] is None
+    # The pipeline gets the snapped window as-is instead of re-scanning the clip
+    assert sorted((w["start"], w["duration"], w["snap_sec"]) for w in windows) == [
+        (0.0, 3.0, 2.0), (0.0, 6.0, 5.0), (0.0, 6.0, 5.0)]
+    assert len(list((tmp_path / "outputs").glob("*__live_*/live_feed_report.json"))) == 1
+
+
+def test_a_decode_failure_still_finishes_the_queued_plays(tmp_path, monkeypatch):
+    def frames(video, fps, size, max_sec=None, deadline=None):
+        for t, img in _broadcast([])(video, fps, size):
+            if t >= 20.0:
+                raise RuntimeError("ffmpeg exited with code 1")
+            yield t, img
+
+    video = tmp_path / "broadcast.mp4"
+    video.write_bytes(b"")
+    monkeypatch.setattr(inference, "iter_gray_frames", frames)
+    monkeypatch.setattr(inference, "analyze_video",
+                        lambda clip, window=None: {"final_paragraph": "Likely mesh.", "meta": {"run_id": "r"}})
+    monkeypatch.setattr(inference, "cut_subclip", lambda video, out, start, dur: open(out, "wb").close())
+    monkeypatch.setattr(inference, "require_ffmpeg", lambda: None)
+    monkeypatch.setattr(inference, "ensure_dirs", lambda: None)
+    monkeypatch.setattr(inference, "OUTPUT_DIR", tmp_path / "outputs")
+
+    reports = []
+    runner = threading.Thread(target=lambda: reports.append(live_feed.run_live_feed(str(video), workers=2)))
+    runner.start()
+    runner.join(5)
+    assert not runner.is_alive()
+    report = reports[0]
+    assert report["decode_error"] == "ffmpeg exited with code 1"
+    assert [p["snap_sec"] for p in report["plays"]] == [2.0, 16.0]
+    assert all(p["status"] == "success" for p in report["plays"])
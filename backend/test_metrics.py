@@ -0,0 +1,59 @@
+import sys
+import os
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Ensure project root is in path so we can import 'backend.app.metrics'
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.agents import inference
+from backend.app import metrics
+
+
+def test_metrics_endpoint_exposes_stage_and_counter_metrics():
+    app = FastAPI()
+    metrics.setup_metrics(app)
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    trace = inference.RunTrace()
+    with trace.span("cut"):
+        pass
+    with trace.span("gemini.generate", model="m") as sp:
+        sp["tokens_in"], sp["tokens_out"] = 10, 2
+    inference.incr_counter("gemini_503")
+
+    client = TestClient(app)
+    client.get("/ping")
+    body = client.get("/metrics").text
+
+    assert 'fieldhouse_stage_seconds_count{stage="cut"}' in body
+    assert 'fieldhouse_gemini_call_seconds_count{kind="generate",model="m"}' in body
+    assert "fieldhouse_gemini_503_total" in body
+    assert "fieldhouse_analyses_in_flight" in body
+    assert 'route="/ping"' in body
+
+
+def test_cancelled_analysis_is_counted_as_499_not_500(tmp_path, monkeypatch):
+    from backend.app import main
+
+    def cancelled(video_path, abandon):
+        raise inference.AnalysisCancelled("caller went away")
+
+    (tmp_path / "clip.mp4").write_bytes(b"")
+    monkeypatch.setattr(main, "UPLOADS_DIR", tmp_path)
+    monkeypatch.setattr(main, "analyze_video", cancelled)
+
+    client = TestClient(main.app)
+    assert client.post("/analyze", params={"video_filename": "clip.mp4"}).status_code == 499
+    body = client.get("/metrics").text
+    assert 'fieldhouse_http_requests_total{method="POST",route="/analyze",status="499"} 1.0' in body
+    assert 'route="/analyze",status="500"' not in body
@@ -0,0 +1,157 @@
+import sys
+import os
+import subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+# (players, pixels moved per frame) — static, jitter, small motion, clear motion
+REGRESSION_SET = [(11, 0), (11, 2), (11, 6), (4, 10), (11, 20), (11, 40), (11, 80)]
+
+
+def _field(rng):
+    img = np.full((720, 1280, 3), (40, 120, 40), np.uint8)
+    for x in range(0, 1280, 80):
+        cv2.line(img, (x, 0), (x, 719), (230, 230, 230), 3)
+    return cv2.add(img, rng.integers(0, 12, img.shape, dtype=np.uint8))
+
+
+def _with_players(img, n, shift):
+    out = img.copy()
+    for i in range(n):
+        x, y = 100 + i * 100 + shift, 300 + (i % 3) * 60
+        cv2.rectangle(out, (x, y), (x + 24, y + 50), (255, 255, 255) if i % 2 else (30, 30, 200), -1)
+    return out
+
+
+def _clip_frames(tmp_path, n, shift):
+    base = _field(np.random.default_rng(n * 1000 + shift))
+    paths = []
+    for k in range(3):
+        p = tmp_path / f"f_{n}_{shift}_{k}.jpg"
+        cv2.imwrite(str(p), _with_players(base, n, shift * k))
+        paths.append(p)
+    return paths
+
+
+@pytest.mark.parametrize("downsample", [2, 4])
+@pytest.mark.parametrize("players,shift", REGRESSION_SET)
+def test_downsampled_path_matches_full_resolution(tmp_path, downsample, players, shift):
+    frames = _clip_frames(tmp_path, players, shift)
+    full = inference.detect_motion_cv(frames, downsample=1, region_aware=False)
+    fast = inference.detect_motion_cv(frames, downsample=downsample, region_aware=False)
+    assert fast["motion_detected"] == full["motion_detected"]
+    assert fast["timing_guess"] == full["timing_guess"]
+
+
+@pytest.mark.parametrize("players,shift", REGRESSION_SET)
+def test_in_memory_frames_match_jpeg_files(tmp_path, players, shift):
+    paths = _clip_frames(tmp_path, players, shift)
+    frames = [inference.InMemoryFrame(t, p.read_bytes()) for t, p in zip(inference.FRAME_TIMES_SEC, paths)]
+    on_disk = inference.detect_motion_cv(paths, region_aware=False)
+    in_memory = inference.detect_motion_cv(frames, region_aware=False)
+    assert in_memory["pairwise_motion_ratio"] == on_disk["pairwise_motion_ratio"]
+    assert in_memory["timing_guess"] == on_disk["timing_guess"]
+
+
+def test_fused_score_matches_reference():
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 255, (180, 320), dtype=np.uint8)
+    b = rng.integers(0, 255, (180, 320), dtype=np.uint8)
+    diff = cv2.absdiff(a, b)
+    expected = np.count_nonzero(diff > inference.DIFF_THRESHOLD) / diff.size
+    assert inference.motion_score_between(a, b) == pytest.approx(expected)
+    assert inference.motion_score_between(a, b, np.empty_like(a)) == pytest.approx(expected)
+
+
+def test_camera_pan_is_compensated(tmp_path):
+    base = _with_players(_field(np.random.default_rng(5)), 11, 0)
+    paths = []
+    for k in range(3):
+        # Whole frame slides 12px per step: a pan, not player motion
+        panned = cv2.warpAffine(base, np.float32([[1, 0, 12 * k], [0, 1, 0]]), (1280, 720), borderMode=cv2.BORDER_REFLECT)
+        p = tmp_path / f"pan_{k}.jpg"
+        cv2.imwrite(str(p), panned)
+        paths.append(p)
+
+    raw = inference.detect_motion_cv(paths, region_aware=False)
+    aware = inference.detect_motion_cv(paths, region_aware=True)
+    assert raw["motion_detected"] is True
+    assert aware["motion_detected"] is False
+    assert abs(aware["camera_shift_px"]["t0_to_t2"][0]) > 1.0
+
+
+def test_overlay_mask_ignores_changing_score_bug(tmp_path):
+    base = _with_players(_field(np.random.default_rng(9)), 11, 0)
+    paths = []
+    for k in range(3):
+        img = base.copy()
+        # Game clock box changes every frame
+        cv2.rectangle(img, (1000, 20), (1260, 120), (0, 0, 0), -1)
+        cv2.putText(img, f"0:{40 - 7 * k:02d}", (1010, 100), cv2.FONT_HERSHEY_SIMPLEX, 2.5, (255, 255, 255), 6)
+        p = tmp_path / f"bug_{k}.jpg"
+        cv2.imwrite(str(p), img)
+        paths.append(p)
+
+    shape = inference._read_gray(paths[0]).shape
+    mask = np.zeros(shape, np.uint8)
+    mask[: shape[0] // 5, int(shape[1] * 0.75):] = 255
+
+    unmasked = inference.detect_motion_cv(paths, region_aware=True, overlay_mask=np.zeros(shape, np.uint8))
+    masked = inference.detect_motion_cv(paths, region_aware=True, overlay_mask=mask)
+    assert masked["pairwise_motion_ratio"]["t0_to_t2"] < unmasked["pairwise_motion_ratio"]["t0_to_t2"]
+    assert masked["pairwise_motion_ratio"]["t0_to_t2"] == 0.0
+
+
+def test_overlay_learner_finds_static_region(tmp_path):
+    rng = np.random.default_rng(1)
+    learner = inference.OverlayMaskLearner()
+    for _ in range(inference.OVERLAY_MIN_CLIPS):
+        frame = rng.integers(0, 255, (180, 320), dtype=np.uint8)
+        frame[:30, 260:] = 200  # logo that never changes
+        learner.add(frame)
+    mask = learner.mask()
+    assert mask is not None
+    assert mask[10, 300] == 255
+    assert mask[120, 100] == 0
+
+    learner.save(tmp_path / "overlay_model.npz")
+    assert [p.name for p in tmp_path.iterdir()] == ["overlay_model.npz"]
+    assert np.array_equal(inference.OverlayMaskLearner.load(tmp_path / "overlay_model.npz").mask(), mask)
+
+
+def test_optical_flow_names_the_moving_side(tmp_path):
+    base = _field(np.random.default_rng(7))
+    paths = []
+    for k in range(3):
+        img = base.copy()
+        for i in range(5):
+            # Left group holds still, right group moves right
+            cv2.rectangle(img, (100 + i * 60, 300), (124 + i * 60, 350), (255, 255, 255), -1)
+            cv2.rectangle(img, (760 + i * 60 + 12 * k, 300), (784 + i * 60 + 12 * k, 350), (255, 255, 255), -1)
+        p = tmp_path / f"flow_{k}.jpg"
+        cv2.imwrite(str(p), img)
+        paths.append(p)
+
+    flow = inference.optical_flow_summary(paths)
+    assert flow["dominant"]["side"] == "right"
+    assert flow["dominant"]["direction"] == "right"
+    assert flow["pairs"]["t0_to_t2"]["sides"]["left"]["moving"] == 0
+    assert "defense moved right" in inference.describe_flow(flow, {"offense_side": "left", "defense_side": "right"})
+
+
+@pytest.mark.parametrize("value", ["3", "0", "two"])
+def test_unsupported_downsample_fails_at_import(value):
+    env = {**os.environ, "FIELDHOUSE_MOTION_DOWNSAMPLE": value}
+    proc = subprocess.run([sys.executable, "-c", "from agents import inference"], cwd=current_dir, env=env,
+                          capture_output=True, text=True)
+    assert proc.returncode != 0
+    assert "FIELDHOUSE_MOTION_DOWNSAMPLE must be 1, 2, 4 or 8" in proc.stderr
@@ -0,0 +1,77 @@
+import sys
+import os
+import json
+
+import numpy as np
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+QUERY = np.array([1.0, 0.0, 0.0])
+# Three near-duplicates from one drive, then two different concepts slightly further away
+EMBEDDINGS = np.array([
+    [0.95, 0.30, 0.01],
+    [0.95, 0.31, 0.0],
+    [0.94, 0.32, 0.0],
+    [0.90, -0.30, 0.3],
+    [0.85, 0.0, -0.5],
+])
+PLAYS = ["mesh", "mesh", "mesh", "inside zone", "play action"]
+
+
+class Collection:
+    def __init__(self):
+        self.asked = []
+
+    def query(self, query_embeddings, n_results, include):
+        self.asked.append((n_results, include))
+        n = min(n_results, len(PLAYS))
+        return {
+            "ids": [[f"clip_{i}" for i in range(n)]],
+            "documents": [[json.dumps({"play_predictions": [{"play": p}]}) for p in PLAYS[:n]]],
+            "metadatas": [[{"video_sha256": f"sha{i % 2}"} for i in range(n)]],
+            "distances": [[float(np.linalg.norm(e - QUERY)) for e in EMBEDDINGS[:n]]],
+            "embeddings": [list(EMBEDDINGS[:n])],
+        }
+
+
+class EmptyCollection:
+    def query(self, query_embeddings, n_results, include):
+        return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]], "embeddings": [[]]}
+
+
+def test_mmr_skips_near_duplicates_that_raw_distance_keeps():
+    assert inference.rank_rag_results(QUERY, EMBEDDINGS, 3, policy="distance") == [0, 1, 2]
+    assert inference.mmr_select(QUERY, EMBEDDINGS, 3, lam=1.0) == [0, 1, 2]
+    assert sorted(inference.rank_rag_results(QUERY, EMBEDDINGS, 3, policy="mmr")) == [0, 3, 4]
+
+
+def test_policy_changes_candidate_coverage(monkeypatch):
+    col = Collection()
+    monkeypatch.setattr(inference, "get_collection", lambda name=None: col if name is None else EmptyCollection())
+    monkeypatch.setattr(inference, "embed_query_text", lambda text, timeout_sec=None: list(QUERY))
+
+    def candidates(policy):
+        monkeypatch.setattr(inference, "RAG_RERANK", policy)
+        examples = inference.retrieve_rag_examples({}, {}, top_k=3)
+        return inference.extract_play_candidates_from_rag(examples)["unique_play_candidates"]
+
+    assert candidates("distance") == ["mesh"]
+    assert col.asked[-1] == (3, ["documents", "metadatas", "distances"])
+    assert sorted(candidates("mmr")) == ["inside zone", "mesh", "play action"]
+    assert col.asked[-1][0] == 3 * inference.RAG_FETCH_MULTIPLIER and "embeddings" in col.asked[-1][1]
+
+
+def test_hits_from_the_same_clip_are_dropped(monkeypatch):
+    col = Collection()
+    monkeypatch.setattr(inference, "get_collection", lambda name=None: col if name is None else EmptyCollection())
+    monkeypatch.setattr(inference, "embed_query_text", lambda text, timeout_sec=None: list(QUERY))
+    monkeypatch.setattr(inference, "RAG_RERANK", "distance")
+
+    examples = inference.retrieve_rag_examples({}, {}, top_k=3, exclude_digest="sha0")
+    assert [ex["id"] for ex in examples] == ["clip_1", "clip_3"]
+    assert col.asked[-1][0] == 3 * inference.RAG_FETCH_MULTIPLIER
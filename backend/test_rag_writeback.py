@@ -0,0 +1,127 @@
+import sys
+import os
+import json
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+
+def _combined(i):
+    return {
+        "meta": {"video_name": f"clip{i}", "run_id": "20260101_000000", "input_video": f"/clips/clip{i}.mp4",
+                 "video_sha256": f"sha{i}", "degraded": [],
+                 "routing": {"use_final_model": False, "first_pass_ranked_plays": ["mesh"]}},
+        "stage1_offense_defense": {"offense_side": "left", "defense_side": "right"},
+        "stage2_motion_cv": {"motion_detected": True, "pairwise_motion_ratio": {"t0_to_t2": 0.02}},
+        "final_paragraph": "Likely mesh.",
+    }
+
+
+@pytest.fixture
+def chroma(tmp_path, monkeypatch):
+    """Records embed batches and upserts; `gate` holds the embed call until set."""
+    state = SimpleNamespace(embeds=[], upserts=[], collections=set(), gate=threading.Event())
+    state.gate.set()
+
+    def embed_content(model, contents, config=None):
+        state.gate.wait(5)
+        state.embeds.append(len(contents))
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=[1.0, 0.0]) for _ in contents])
+
+    class Collection:
+        def __init__(self):
+            self.rows = {}
+
+        def upsert(self, ids, documents, metadatas, embeddings):
+            state.upserts.append(ids)
+            self.rows.update(zip(ids, zip(documents, metadatas)))
+
+        def query(self, query_embeddings, n_results, include):
+            ids = list(self.rows)[:n_results]
+            return {"ids": [ids], "documents": [[self.rows[i][0] for i in ids]],
+                    "metadatas": [[self.rows[i][1] for i in ids]], "distances": [[0.1] * len(ids)]}
+
+    monkeypatch.setattr(inference, "RAG_SPOOL_PATH", tmp_path / "spool.jsonl")
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(models=SimpleNamespace(embed_content=embed_content)))
+    collections = {}
+
+    def get_collection(name=None):
+        state.collections.add(name)
+        return collections.setdefault(name, Collection())
+
+    monkeypatch.setattr(inference, "get_collection", get_collection)
+    monkeypatch.setattr(inference, "embed_query_text", lambda text, timeout_sec=None: [1.0, 0.0])
+    monkeypatch.setattr(inference, "RAG_RERANK", "distance")
+    return state
+
+
+def _wait_indexed(indexer, n):
+    stop = time.monotonic() + 5
+    while indexer.stats["indexed"] < n and time.monotonic() < stop:
+        time.sleep(0.01)
+    return indexer.stats["indexed"]
+
+
+def _spooled():
+    return inference.Path(inference.RAG_SPOOL_PATH).read_text().splitlines()
+
+
+def test_runs_are_indexed_in_one_batch_and_leave_the_spool(chroma):
+    indexer = inference.RagIndexer(batch_size=8, linger_sec=0.2)
+    for i in range(3):
+        indexer.submit(_combined(i))
+
+    assert _wait_indexed(indexer, 3) == 3
+    assert chroma.embeds == [3]
+    assert chroma.upserts == [[f"clip{i}__20260101_000000" for i in range(3)]]
+    assert chroma.collections == {inference.RAG_WRITEBACK_COLLECTION}   # never the curated collection
+    assert _spooled() == []
+    assert 0 <= indexer.stats["last_freshness_sec"] < 5
+
+
+def test_spool_left_by_a_crash_is_replayed_on_start(chroma):
+    item = {**inference.run_rag_document(_combined(7)), "embed_text": "q", "queued_at": time.time()}
+    inference.Path(inference.RAG_SPOOL_PATH).write_text(json.dumps(item) + "\n" + '{"id": "torn')
+
+    indexer = inference.RagIndexer(linger_sec=0.05)
+    indexer.start()
+    assert _wait_indexed(indexer, 1) == 1
+    assert chroma.upserts == [["clip7__20260101_000000"]]
+
+
+def test_full_queue_keeps_runs_in_the_spool_until_the_worker_catches_up(chroma):
+    chroma.gate.clear()
+    indexer = inference.RagIndexer(max_queue=1, batch_size=1, linger_sec=0.0)
+    before = inference.get_counters().get("rag_writeback_overflow", 0)
+    indexer.submit(_combined(0))
+    time.sleep(0.1)                      # the worker holds clip0 in the blocked embed call
+    for i in range(1, 4):
+        indexer.submit(_combined(i))     # clip1 fills the queue, clip2/clip3 only reach the spool
+    assert inference.get_counters()["rag_writeback_overflow"] - before == 2
+
+    chroma.gate.set()
+    assert _wait_indexed(indexer, 4) == 4
+    assert sorted(ids[0] for ids in chroma.upserts) == [f"clip{i}__20260101_000000" for i in range(4)]
+    assert _spooled() == []
+
+
+def test_written_back_runs_come_back_as_examples_for_other_clips(chroma):
+    indexer = inference.RagIndexer(linger_sec=0.05)
+    indexer.submit(_combined(1))
+    assert _wait_indexed(indexer, 1) == 1
+
+    examples = inference.retrieve_rag_examples({}, {}, top_k=3, exclude_digest="sha2")
+    assert [(ex["id"], ex["source"]) for ex in examples] == [("clip1__20260101_000000", "run")]
+    bundle = inference.extract_play_candidates_from_rag(examples)
+    assert bundle["unique_play_candidates"] == ["mesh"] and bundle["verified_play_candidates"] == []
+
+    assert inference.retrieve_rag_examples({}, {}, top_k=3, exclude_digest="sha1") == []   # its own clip
@@ -0,0 +1,108 @@
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+
+def test_concurrent_callers_share_one_run():
+    flights = inference.SingleFlight()
+    started = []
+    release = threading.Event()
+
+    def work(cancel):
+        started.append(1)
+        release.wait(5)
+        yield {"type": "stage", "stage": "s", "data": 1}
+        yield {"type": "done", "result": {"answer": 42}}
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flights.run, "k", work) for _ in range(4)]
+        while flights.in_flight() == 0:
+            pass
+        release.set()
+        results = [f.result(timeout=5) for f in futures]
+
+    assert len(started) == 1
+    assert all(r == {"answer": 42} for r in results)
+    assert flights.in_flight() == 0
+
+
+def test_last_subscriber_leaving_cancels_the_run():
+    flights = inference.SingleFlight()
+    cancelled = threading.Event()
+    first_event = threading.Event()
+
+    def work(cancel):
+        yield {"type": "stage", "stage": "s", "data": 1}
+        first_event.set()
+        cancel.wait(5)
+        if cancel.is_set():
+            cancelled.set()
+            return
+        yield {"type": "done", "result": None}
+
+    a = flights.subscribe("k", work)
+    b = flights.subscribe("k", work)
+    next(a)
+    next(b)
+    first_event.wait(5)
+
+    a.close()
+    assert not cancelled.wait(0.2)  # b still holds a reference
+    b.close()
+    assert cancelled.wait(5)
+
+
+def test_errors_reach_every_subscriber():
+    flights = inference.SingleFlight()
+
+    def work(cancel):
+        raise RuntimeError("pipeline failed")
+        yield
+
+    with pytest.raises(RuntimeError, match="pipeline failed"):
+        flights.run("k", work)
+
+
+def test_agent_tool_joins_the_analyze_run_for_the_same_clip(tmp_path, monkeypatch):
+    from agents import agent
+
+    clip = tmp_path / "play.mp4"
+    clip.write_bytes(b"same bytes")
+    flights = inference.SingleFlight()
+    runs, release = [], threading.Event()
+
+    def pipeline(path, cancel, window=None):
+        runs.append(path)
+        release.wait(5)
+        yield {"type": "done", "result": {"final_paragraph": "Likely mesh.", "meta": {"video_name": "play", "run_id": "r1"}}}
+
+    monkeypatch.setattr(agent, "UPLOADS_DIR", tmp_path)
+    monkeypatch.setattr(inference, "_pipeline_flights", flights)
+    monkeypatch.setattr(inference, "_counted_pipeline", pipeline)
+
+    with ThreadPoolExecutor(2) as pool:
+        api = pool.submit(inference.analyze_video, str(clip))
+        tool = pool.submit(asyncio.run, agent.run_video_inference("play.mp4"))
+        deadline = time.monotonic() + 5
+        while not any(fl.refs == 2 for fl in list(flights._flights.values())) and time.monotonic() < deadline:
+            pass
+        release.set()
+        assert api.result(timeout=5)["final_paragraph"] == "Likely mesh."
+        reply = json.loads(tool.result(timeout=5))
+
+    assert len(runs) == 1
+    assert reply["status"] == "success" and reply["final_paragraph"] == "Likely mesh."
+    assert reply["output_directory"].endswith("play__r1")
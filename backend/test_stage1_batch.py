@@ -0,0 +1,95 @@
+import sys
+import os
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+OFF_DEF = {
+    "offense_side": "left", "defense_side": "right", "offense_team": "unknown", "defense_team": "unknown",
+    "offense_jersey_color": "white", "defense_jersey_color": "red", "confidence": "high", "reasoning": "r",
+}
+
+
+class Models:
+    """Answers batches with one entry per ITEM, except ids listed in `drop`."""
+
+    def __init__(self, drop=()):
+        self.calls = []
+        self.drop = set(drop)
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append(config.response_schema.__name__)
+        if config.response_schema is inference.OffDefBatch:
+            frames = {c: contents[i + 1] for i, c in enumerate(contents) if isinstance(c, str) and c.startswith("ITEM ")}
+            items = [{"item_id": k.split(" ", 1)[1], **OFF_DEF, "reasoning": v}
+                     for k, v in frames.items() if v not in self.drop]
+            text = json.dumps({"items": items})
+        else:
+            text = json.dumps({**OFF_DEF, "reasoning": f"single {contents[0]}"})
+        return SimpleNamespace(text=text, usage_metadata=None)
+
+
+def _run_concurrently(batcher, frames):
+    results = {}
+
+    def one(frame):
+        results[frame] = batcher.submit(frame).reasoning
+
+    threads = [threading.Thread(target=one, args=(f,)) for f in frames]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results
+
+
+@pytest.fixture
+def models(monkeypatch):
+    m = Models(drop={"frame-2"})
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(models=m))
+    monkeypatch.setattr(inference, "CONTEXT_CACHE_ENABLED", False)
+    return m
+
+
+def test_concurrent_frames_share_one_request_and_get_their_own_answer(models):
+    batcher = inference.Stage1Batcher(window_sec=5.0, max_items=3)
+    results = _run_concurrently(batcher, ["frame-0", "frame-1", "frame-2"])
+
+    assert results["frame-0"] == "frame-0" and results["frame-1"] == "frame-1"
+    # Missing from the batch answer → that run falls back to its own per-item call
+    assert results["frame-2"] == "single frame-2"
+    assert models.calls == ["OffDefBatch", "OffDefAssignment"]
+
+
+def test_lone_frame_is_sent_on_its_own_after_the_window(models):
+    batcher = inference.Stage1Batcher(window_sec=0.05, max_items=8)
+    assert batcher.submit("frame-0").reasoning == "single frame-0"
+    assert models.calls == ["OffDefAssignment"]
+
+
+def test_nearly_expired_run_is_left_out_of_the_batch(models, monkeypatch):
+    sent = []
+    real_deadline = inference.Deadline
+
+    def recording_deadline(budget_sec, *args, **kwargs):
+        sent.append(budget_sec)
+        return real_deadline(budget_sec, *args, **kwargs)
+
+    monkeypatch.setattr(inference, "Deadline", recording_deadline)
+    batcher = inference.Stage1Batcher(window_sec=5.0, max_items=3)
+    items = [inference._Stage1Item(f"i{n}", f"frame-{n}", None, real_deadline(b))
+             for n, b in enumerate([60, 120, inference.STAGE1_BATCH_MIN_REMAINING_SEC / 2])]
+    batcher._send(items)
+
+    assert [it.batch_size for it in items] == [2, 2, 1]
+    assert [it.result.reasoning if it.result else None for it in items] == ["frame-0", "frame-1", None]
+    assert len(sent) == 1 and 110 < sent[0] <= 120   # the batch gets the roomiest budget, not the tightest
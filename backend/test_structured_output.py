@@ -0,0 +1,51 @@
+import sys
+import os
+
+import pytest
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+from agents.inference import OffDefAssignment
+
+VALID = (
+    '{"offense_side": "left", "defense_side": "right", "offense_team": "unknown", '
+    '"defense_team": "unknown", "offense_jersey_color": "white", "defense_jersey_color": "red", '
+    '"confidence": "high", "reasoning": "QB in shotgun on the left"}'
+)
+
+
+def test_structured_valid_output(monkeypatch):
+    calls = []
+
+    def fake_call(model_name, contents, *args, **kwargs):
+        calls.append(kwargs.get("extra_config"))
+        return VALID
+
+    monkeypatch.setattr(inference, "call_model_with_backoff", fake_call)
+    result = inference.generate_structured("m", ["frame"], OffDefAssignment)
+
+    assert result.offense_side == "left"
+    assert calls[0]["response_mime_type"] == "application/json"
+    assert calls[0]["response_schema"] is OffDefAssignment
+
+
+def test_structured_invalid_output_makes_no_retry(monkeypatch):
+    calls = []
+
+    def fake_call(model_name, contents, *args, **kwargs):
+        calls.append(1)
+        return '{"offense_side": "top"}'
+
+    monkeypatch.setattr(inference, "call_model_with_backoff", fake_call)
+    before = inference.get_counters().get("structured_parse_failures", 0)
+
+    with pytest.raises(ValueError):
+        inference.generate_structured("m", ["frame"], OffDefAssignment)
+
+    assert len(calls) == 1
+    assert inference.get_counters()["structured_parse_failures"] == before + 1
+    assert 0.0 < inference.parse_failure_rate() <= 1.0
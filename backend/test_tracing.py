@@ -0,0 +1,63 @@
+import sys
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+
+class _FakeModels:
+    def generate_content(self, model, contents, config=None):
+        meta = SimpleNamespace(prompt_token_count=120, cached_content_token_count=80, candidates_token_count=15)
+        return SimpleNamespace(text='{"ok": true}', usage_metadata=meta)
+
+
+def test_span_records_time_and_errors():
+    trace = inference.RunTrace()
+    with trace.span("cut", profile="720p10") as sp:
+        sp["bytes_out"] = 1234
+    with pytest.raises(RuntimeError):
+        with trace.span("upload"):
+            raise RuntimeError("boom")
+
+    report = trace.finish()
+    cut, upload = report["spans"]
+    assert cut["profile"] == "720p10" and cut["bytes_out"] == 1234
+    assert cut["wall_ms"] >= 0 and "cpu_ms" in cut
+    assert upload["error"] == "RuntimeError"
+    assert report["by_stage"]["cut"]["count"] == 1
+    assert report["otel_exported"] is False
+
+
+def test_model_call_span_has_tokens_and_bytes(monkeypatch):
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(models=_FakeModels()))
+    monkeypatch.setattr(inference, "CONTEXT_CACHE_ENABLED", False)
+    trace = inference.RunTrace()
+
+    inference.call_model_with_backoff("m", ["hello"], trace=trace)
+
+    agg = trace.finish()["by_stage"]["gemini.generate"]
+    assert agg["tokens_in"] == 120 and agg["tokens_out"] == 15
+    assert agg["bytes_sent"] == len("hello")
+
+
+def test_child_cpu_is_the_span_threads_own_children():
+    busy = [sys.executable, "-c", "import time\nt = time.process_time()\nwhile time.process_time() - t < 0.3: pass"]
+    other = threading.Thread(target=inference.run_ffmpeg, args=(busy,))   # a concurrent run's child
+    trace = inference.RunTrace()
+    with trace.span("cut") as sp:
+        other.start()
+        assert inference.run_ffmpeg([sys.executable, "-c", "print('ok')"], capture=True).strip() == b"ok"
+        other.join()
+    assert sp.get("child_cpu_ms", 0.0) < 200
+
+    with trace.span("cut") as sp:
+        inference.run_ffmpeg(busy)
+    assert sp["child_cpu_ms"] >= 250
@@ -0,0 +1,79 @@
+import sys
+import os
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+OLD = datetime.fromtimestamp(time.time() - 2 * inference.ORPHAN_GRACE_SEC, tz=timezone.utc)
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """A fake Files API: `files` maps name -> display_name; gets and deletes are recorded."""
+    state = SimpleNamespace(files={}, gets=[], deleted=[])
+
+    def get(name):
+        state.gets.append(name)
+        if name not in state.files:
+            raise FileNotFoundError(name)
+        return SimpleNamespace(name=name, state="ACTIVE")
+
+    def delete(name):
+        state.deleted.append(name)
+        state.files.pop(name, None)
+
+    def listing():
+        return [SimpleNamespace(name=n, display_name=d, create_time=OLD) for n, d in state.files.items()]
+
+    files = SimpleNamespace(get=get, delete=delete, list=listing)
+    monkeypatch.setattr(inference, "UPLOAD_REGISTRY_PATH", tmp_path / "upload_registry.json")
+    monkeypatch.setattr(inference, "get_client", lambda: SimpleNamespace(files=files))
+    return state
+
+
+def _register(state, digest, name, expires_in):
+    state.files[name] = inference.UPLOAD_DISPLAY_PREFIX + name
+    inference.register_upload(digest, SimpleNamespace(name=name, expiration_time=None), f"/clips/{digest}.mp4")
+    reg = inference._load_registry()
+    reg[digest]["expires_at"] = time.time() + expires_in
+    inference._save_registry(reg)
+
+
+def test_lookup_reuses_a_live_upload_and_drops_a_missing_one(remote):
+    _register(remote, "a", "files/a", 3600)
+    _register(remote, "b", "files/b", 3600)
+    remote.files.pop("files/b")           # deleted server-side behind our back
+
+    assert inference.lookup_registered_upload("a").name == "files/a"
+    assert inference.lookup_registered_upload("b") is None
+    assert set(inference._load_registry()) == {"a"}
+    assert inference.lookup_registered_upload("missing") is None
+
+
+def test_entries_inside_the_expiry_margin_are_not_reused(remote):
+    _register(remote, "a", "files/a", inference.UPLOAD_EXPIRY_MARGIN_SEC - 5)
+    assert inference.lookup_registered_upload("a") is None
+    assert remote.gets == []              # expired locally, no round trip
+
+
+def test_cleanup_removes_expired_entries_and_only_our_orphans(remote):
+    _register(remote, "live", "files/live", 3600)
+    _register(remote, "old", "files/old", -60)
+    remote.files["files/ours"] = inference.UPLOAD_DISPLAY_PREFIX + "frame.jpg"
+    remote.files["files/theirs"] = "someone-elses-dataset.csv"
+
+    assert inference.cleanup_uploads() == {"expired": 1, "orphans": 0}
+    assert set(inference._load_registry()) == {"live"}
+    assert remote.deleted == ["files/old"]
+
+    assert inference.cleanup_uploads(delete_orphans=True) == {"expired": 0, "orphans": 1}
+    assert set(remote.files) == {"files/live", "files/theirs"}
@@ -0,0 +1,95 @@
+import sys
+import os
+import json
+
+import cv2
+import numpy as np
+
+# Ensure backend/ dir is in path so we can import 'agents'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from agents import inference
+
+LINE = [(500 + i * 30, 330) for i in range(5)]
+SHOTGUN = LINE + [(620, 420), (560, 430), (900, 330), (300, 330), (650, 470), (380, 360)]
+TRIPS = LINE + [(620, 380), (950, 330), (1010, 340), (1070, 335), (300, 330), (650, 420)]
+
+
+def _field(seed, players, pan=0):
+    rng = np.random.default_rng(seed)
+    img = np.full((720, 1280, 3), (40, 120, 40), np.uint8)
+    for x in range(pan % 128, 1280, 128):
+        cv2.line(img, (x, 0), (x, 719), (230, 230, 230), 4)
+    img = cv2.add(img, rng.integers(0, 12, img.shape, dtype=np.uint8))
+    for x, y in players:
+        x, y = x + int(rng.integers(-8, 9)) + pan, y + int(rng.integers(-8, 9))
+        cv2.rectangle(img, (x, y), (x + 24, y + 50), (255, 255, 255), -1)
+    return inference.InMemoryFrame(0, bgr=img)
+
+
+def _combined(name, plays, degraded=()):
+    return {
+        "meta": {"video_name": name, "run_id": "20260101_000000", "input_video": f"/clips/{name}.mp4",
+                 "video_sha256": f"sha-{name}", "degraded": list(degraded),
+                 "routing": {"use_final_model": False, "first_pass_ranked_plays": plays}},
+        "stage1_offense_defense": {"offense_side": "left", "defense_side": "right"},
+        "stage2_motion_cv": {"motion_detected": False, "pairwise_motion_ratio": {"t0_to_t2": 0.01}},
+        "final_paragraph": f"Likely {plays[0]}.",
+    }
+
+
+def test_descriptor_matches_same_formation_through_a_camera_pan():
+    shotgun = inference.formation_descriptor(_field(1, SHOTGUN))
+    assert shotgun.dtype == np.float32 and abs(float(np.linalg.norm(shotgun)) - 1.0) < 1e-5
+
+    same = float(shotgun @ inference.formation_descriptor(_field(2, SHOTGUN)))
+    panned = float(shotgun @ inference.formation_descriptor(_field(3, SHOTGUN, pan=60)))
+    trips = float(shotgun @ inference.formation_descriptor(_field(4, TRIPS)))
+    assert same > 0.9 and panned >= inference.VISUAL_MIN_SIMILARITY > trips
+
+
+def test_visual_hits_are_merged_after_chroma_results(tmp_path, monkeypatch):
+    class Collection:
+        def query(self, query_embeddings, n_results, include):
+            return {"ids": [["seed_000"]], "documents": [["{}"]], "metadatas": [[{}]], "distances": [[0.3]]}
+
+    monkeypatch.setattr(inference, "get_collection", lambda name=None: Collection())
+    monkeypatch.setattr(inference, "embed_query_text", lambda text, timeout_sec=None: [0.0])
+    monkeypatch.setattr(inference, "VISUAL_INDEX_PATH", tmp_path / "visual.npz")
+    inference.add_visual_example(inference.formation_descriptor(_field(1, SHOTGUN)), _combined("shotgun", ["mesh", "stick"]))
+    inference.add_visual_example(inference.formation_descriptor(_field(4, TRIPS)), _combined("trips", ["screen"]))
+
+    examples = inference.retrieve_rag_examples({}, {}, top_k=1, descriptor=inference.formation_descriptor(_field(2, SHOTGUN)))
+    assert [(ex["id"], ex["source"]) for ex in examples] == [("seed_000", "text"), ("shotgun__20260101_000000", "visual")]
+    assert json.loads(examples[1]["document"])["play_predictions"] == [{"play": "mesh"}, {"play": "stick"}]
+    bundle = inference.extract_play_candidates_from_rag(examples)
+    assert bundle["unique_play_candidates"] == ["mesh", "stick"]
+
+
+def test_past_runs_cannot_confirm_a_first_pass():
+    curated = {"id": "seed_000", "source": "text", "document": json.dumps({"play_predictions": [{"play": "stick"}]})}
+    visual = {**inference.run_rag_document(_combined("shotgun", ["mesh"])), "source": "visual"}
+    bundle = inference.extract_play_candidates_from_rag([curated, visual])
+    assert bundle["unique_play_candidates"] == ["stick", "mesh"]
+    assert bundle["verified_play_candidates"] == ["stick"]
+
+    # The fast model said "mesh" before; that must not let it skip FINAL_MODEL now
+    first_pass = inference.CascadeFirstPass(ranked_plays=["mesh", "stick", "screen"], confidence=0.95, paragraph="p")
+    route = inference.route_final_stage(first_pass, bundle["verified_play_candidates"], {"offense_side": "left", "defense_side": "right"})
+    assert route["use_final_model"] and route["reasons"] == ["top play not among verified RAG candidates"]
+
+
+def test_own_clip_and_unlabeled_or_degraded_runs_are_not_examples():
+    assert inference.indexable_run(_combined("ok", ["mesh"]))
+    assert not inference.indexable_run(_combined("bad", ["mesh"], degraded=["stage1 fallback"]))
+    escalated = _combined("escalated", ["mesh"])
+    escalated["meta"]["routing"]["use_final_model"] = True
+    assert not inference.indexable_run(escalated)
+
+    index = inference.VisualIndex()
+    shotgun = inference.formation_descriptor(_field(1, SHOTGUN))
+    index.add(shotgun, inference.run_rag_document(_combined("shotgun", ["mesh"])))
+    assert len(index.search(shotgun)) == 1
+    assert index.search(shotgun, exclude_digest="sha-shotgun") == []